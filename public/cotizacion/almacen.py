@@ -0,0 +1,223 @@
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from detalles import LineaDetalle, TablaDetalles
+from motor_cotizacion import CAMPOS_CABECERA, Cotizacion, leer_fecha
+
+
+# Almacén local de cotizaciones emitidas (SQLite en modo WAL).
+# Las tablas siguen la forma de Cotizacion / CotizacionDetalle /
+# CotizacionDescripcion de prisma/schema.prisma, con índices por folio,
+# empresa, fecha de evento y última modificación para reabrir cotizaciones
+# antiguas en la app.
+# La ruta se puede cambiar con la variable de entorno COTIZACIONES_DB.
+
+RUTA_POR_DEFECTO = os.environ.get(
+    "COTIZACIONES_DB", os.path.join(os.path.expanduser("~"), ".carpas_guajardo", "cotizaciones.db")
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cotizacion (
+    id               INTEGER PRIMARY KEY,
+    folio            TEXT NOT NULL UNIQUE,
+    atencion         TEXT NOT NULL DEFAULT '',
+    empresa          TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    fecha_evento     TEXT NOT NULL DEFAULT '',
+    fecha_evento_iso TEXT,
+    fecha_montaje    TEXT NOT NULL DEFAULT '',
+    fecha_desarme    TEXT NOT NULL DEFAULT '',
+    lugar_evento     TEXT NOT NULL DEFAULT '',
+    forma_pago       TEXT NOT NULL DEFAULT '',
+    fecha            TEXT NOT NULL DEFAULT '',
+    tasa_iva         TEXT NOT NULL,
+    neto             INTEGER NOT NULL,
+    iva              INTEGER NOT NULL,
+    bruto            INTEGER NOT NULL,
+    creado           TEXT NOT NULL,
+    actualizado      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cotizacion_empresa ON cotizacion (empresa);
+CREATE INDEX IF NOT EXISTS cotizacion_fecha_evento ON cotizacion (fecha_evento_iso);
+-- Listado sin filtros de buscar (más recientes primero): recorre el índice hasta el LIMIT
+CREATE INDEX IF NOT EXISTS cotizacion_actualizado ON cotizacion (actualizado DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS cotizacion_detalle (
+    id            INTEGER PRIMARY KEY,
+    cotizacion_id INTEGER NOT NULL REFERENCES cotizacion (id) ON DELETE CASCADE,
+    detalle       TEXT NOT NULL,
+    largo         TEXT NOT NULL,
+    alto          TEXT NOT NULL,
+    total_mts     TEXT NOT NULL,
+    valor_m2      INTEGER NOT NULL,
+    total         INTEGER NOT NULL,
+    orden         INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cotizacion_detalle_cotizacion ON cotizacion_detalle (cotizacion_id, orden);
+
+CREATE TABLE IF NOT EXISTS cotizacion_descripcion (
+    id            INTEGER PRIMARY KEY,
+    cotizacion_id INTEGER NOT NULL REFERENCES cotizacion (id) ON DELETE CASCADE,
+    descripcion   TEXT NOT NULL,
+    orden         INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cotizacion_descripcion_cotizacion ON cotizacion_descripcion (cotizacion_id, orden);
+"""
+
+COLUMNAS_CABECERA = [campo for campo in CAMPOS_CABECERA if campo != "folio"]
+
+
+@dataclass
+class ResumenCotizacion:
+    # Fila liviana para listados de búsqueda (sin detalles)
+    folio: str
+    empresa: str
+    atencion: str
+    fecha_evento: str
+    bruto: int
+
+
+class AlmacenCotizaciones:
+    def __init__(self, ruta=RUTA_POR_DEFECTO):
+        if ruta != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self.ruta = ruta
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("PRAGMA foreign_keys=ON")
+        self.conexion.executescript(ESQUEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def guardar(self, cotizacion):
+        self.guardar_lote([cotizacion])
+
+    def guardar_lote(self, cotizaciones):
+        # Una sola transacción; si el folio ya existe se reemplaza su contenido
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self.conexion:
+            for cotizacion in cotizaciones:
+                self._guardar(cotizacion, ahora)
+
+    def _guardar(self, cotizacion, ahora):
+        folio = cotizacion.folio.strip()
+        if not folio:
+            raise ValueError("No se puede guardar una cotización sin folio.")
+        neto, iva, bruto = cotizacion.totales()
+        fecha_evento = leer_fecha(cotizacion.fecha_evento)
+        valores = [getattr(cotizacion, campo) for campo in COLUMNAS_CABECERA] + [
+            fecha_evento.isoformat() if fecha_evento else None,
+            str(cotizacion.tabla_datos.tasa_iva), neto, iva, bruto,
+        ]
+        columnas = COLUMNAS_CABECERA + ["fecha_evento_iso", "tasa_iva", "neto", "iva", "bruto"]
+        cotizacion_id = self.conexion.execute(
+            f"INSERT INTO cotizacion (folio, {', '.join(columnas)}, creado, actualizado) "
+            f"VALUES (?, {', '.join('?' * len(columnas))}, ?, ?) "
+            f"ON CONFLICT (folio) DO UPDATE SET "
+            f"{', '.join(f'{columna} = excluded.{columna}' for columna in columnas)}, actualizado = excluded.actualizado "
+            f"RETURNING id",
+            [folio] + valores + [ahora, ahora],
+        ).fetchone()[0]
+
+        self.conexion.execute("DELETE FROM cotizacion_detalle WHERE cotizacion_id = ?", (cotizacion_id,))
+        self.conexion.execute("DELETE FROM cotizacion_descripcion WHERE cotizacion_id = ?", (cotizacion_id,))
+        self.conexion.executemany(
+            "INSERT INTO cotizacion_detalle (cotizacion_id, detalle, largo, alto, total_mts, valor_m2, total, orden) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(cotizacion_id, linea.detalle, str(linea.largo), str(linea.alto), str(linea.total_mts),
+              linea.valor_m2, linea.total, orden)
+             for orden, linea in enumerate(cotizacion.tabla_datos)],
+        )
+        self.conexion.executemany(
+            "INSERT INTO cotizacion_descripcion (cotizacion_id, descripcion, orden) VALUES (?, ?, ?)",
+            [(cotizacion_id, descripcion, orden) for orden, descripcion in enumerate(cotizacion.descripcion_datos)],
+        )
+
+    def obtener(self, folio):
+        fila = self.conexion.execute(
+            f"SELECT id, folio, {', '.join(COLUMNAS_CABECERA)}, tasa_iva FROM cotizacion WHERE folio = ?",
+            (folio.strip(),),
+        ).fetchone()
+        if fila is None:
+            return None
+        cotizacion_id, folio, *cabecera, tasa_iva = fila
+        detalles = self.conexion.execute(
+            "SELECT detalle, largo, alto, total_mts, valor_m2, total FROM cotizacion_detalle "
+            "WHERE cotizacion_id = ? ORDER BY orden",
+            (cotizacion_id,),
+        )
+        descripciones = self.conexion.execute(
+            "SELECT descripcion FROM cotizacion_descripcion WHERE cotizacion_id = ? ORDER BY orden",
+            (cotizacion_id,),
+        )
+        return Cotizacion(
+            folio=folio,
+            tabla_datos=TablaDetalles(
+                (LineaDetalle(detalle, Decimal(largo), Decimal(alto), Decimal(total_mts), valor_m2, total)
+                 for detalle, largo, alto, total_mts, valor_m2, total in detalles),
+                tasa_iva=Decimal(tasa_iva),
+            ),
+            descripcion_datos=[descripcion for descripcion, in descripciones],
+            **dict(zip(COLUMNAS_CABECERA, cabecera)),
+        )
+
+    def iterar(self):
+        # Todas las cotizaciones en orden de creación, cargadas de a una
+        folios = [folio for folio, in self.conexion.execute("SELECT folio FROM cotizacion ORDER BY id")]
+        for folio in folios:
+            cotizacion = self.obtener(folio)
+            if cotizacion is not None:
+                yield cotizacion
+
+    def buscar(self, folio=None, empresa=None, desde=None, hasta=None, limite=50):
+        # folio y empresa buscan por prefijo (empresa sin distinguir
+        # mayúsculas); desde/hasta son fechas (date) del evento, inclusive.
+        condiciones = []
+        parametros = []
+        if folio:
+            condiciones.append("folio >= ? AND folio < ?")
+            parametros += [folio, folio + "\U0010ffff"]
+        if empresa:
+            condiciones.append("empresa LIKE ? ESCAPE '\\'")
+            parametros.append(_escapar_like(empresa) + "%")
+        if desde:
+            condiciones.append("fecha_evento_iso >= ?")
+            parametros.append(desde.isoformat())
+        if hasta:
+            condiciones.append("fecha_evento_iso <= ?")
+            parametros.append(hasta.isoformat())
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        filas = self.conexion.execute(
+            f"SELECT folio, empresa, atencion, fecha_evento, bruto FROM cotizacion {donde} "
+            f"ORDER BY actualizado DESC, id DESC LIMIT ?",
+            parametros + [limite],
+        )
+        return [ResumenCotizacion(*fila) for fila in filas]
+
+    def nombres_cotizados(self):
+        # (tipo, nombre, valor_m2) de los detalles y descripciones usados; para
+        # cada detalle, el valor por m² de su uso más reciente
+        for detalle, valor_m2, _ in self.conexion.execute(
+            "SELECT detalle, valor_m2, max(id) FROM cotizacion_detalle GROUP BY detalle"
+        ):
+            yield "detalle", detalle, valor_m2
+        for descripcion, in self.conexion.execute("SELECT DISTINCT descripcion FROM cotizacion_descripcion"):
+            yield "descripcion", descripcion, None
+
+    def eliminar(self, folio):
+        with self.conexion:
+            return self.conexion.execute("DELETE FROM cotizacion WHERE folio = ?", (folio.strip(),)).rowcount > 0
+
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
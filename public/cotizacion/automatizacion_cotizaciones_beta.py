@@ -1,15 +1,20 @@
-import os
+import threading
 import tkinter as tk
-from tkinter import Tk, Label, messagebox, Entry, Button, Text, END, filedialog, Frame, Scrollbar, Listbox, MULTIPLE, ttk, PhotoImage,Scrollbar,Canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from datetime import datetime
-from reportlab.platypus import Table, TableStyle
-import base64
-from PIL import Image
-from io import BytesIO
-from tkcalendar import Calendar, DateEntry
+from tkinter import Tk, Label, messagebox, Entry, Button, END, filedialog, Frame, Listbox, ttk
+# motor_cotizacion no importa reportlab hasta el primer PDF (ver precargar)
+from motor_cotizacion import Cotizacion, formatear_dinero, nombre_archivo, precargar
+from detalles import LineaDetalle, TablaDetalles, formatear_numero
+from precios import calcular_linea
+from almacen import AlmacenCotizaciones
+from cola_pdf import ColaGeneracion
+from folios import AsignadorFolios, FolioDuplicado, folio_numerico
+from catalogo import Catalogo
+from metricas import METRICAS, volcar_al_cerrar
+import sqlite3
+
+
+# Teclas que recorren la lista de sugerencias sin cambiar el texto
+TECLAS_NAVEGACION = {"Up", "Down", "Return", "Escape", "Tab", "Left", "Right"}
 
 
 class CotizacionApp:
@@ -46,7 +51,7 @@ class CotizacionApp:
         self.folio = ttk.Entry(root)
         self.atencion = ttk.Entry(root)
         self.empresa = ttk.Entry(root)
-        self.tabla_datos = []
+        self.tabla_datos = TablaDetalles()
         self.descripcion_datos = []
 
         # Nuevas variables para fechas y lugar
@@ -82,7 +87,7 @@ class CotizacionApp:
             ttk.Label(self.tabla_frame, text=header, anchor="center").grid(row=0, column=i, sticky="ew")
 
         # Campos de entrada para los detalles
-        self.detalle_entry = Entry(self.tabla_frame, width=15)
+        self.detalle_entry = ttk.Combobox(self.tabla_frame, width=15)  # Sugerencias del catálogo
         self.detalle_entry.grid(row=1, column=0)
         self.largo_entry = Entry(self.tabla_frame, width=5)
         self.largo_entry.grid(row=1, column=1)
@@ -100,6 +105,12 @@ class CotizacionApp:
         self.alto_entry.bind("<KeyRelease>", self.calcular_total_mts)
         self.valor_m2_entry.bind("<KeyRelease>", self.calcular_total_mts)
 
+        # Autocompletar el detalle y su valor M2 desde el catálogo
+        self.detalle_entry.bind("<KeyRelease>", self.sugerir_detalles)
+        self.detalle_entry.bind("<<ComboboxSelected>>", self.completar_valor_m2)
+        self.detalle_entry.bind("<FocusOut>", self.completar_valor_m2)
+        self.valor_m2_autocompletado = None
+
         # Botón Añadir con estilo
         ttk.Button(self.tabla_frame, text="Añadir", command=self.agregar_detalle).grid(row=2, column=0, columnspan=3, sticky="ew", padx=10, pady=5)
 
@@ -155,6 +166,7 @@ class CotizacionApp:
         # Combobox para descripciones predefinidas
         self.descripcion_combobox = ttk.Combobox(self.descripcion_frame, values=self.descripciones_predefinidas, width=50)
         self.descripcion_combobox.grid(row=1, column=1, padx=5)
+        self.descripcion_combobox.bind("<KeyRelease>", self.sugerir_descripciones)
 
         # Botón para añadir la descripción seleccionada del Combobox
         ttk.Button(self.descripcion_frame, text="Añadir Predefinida", command=self.agregar_descripcion_predefinida).grid(row=2, column=1, sticky="ew", padx=10, pady=5)
@@ -193,6 +205,58 @@ class CotizacionApp:
         # Botón para limpiar datos
         Button(self.botones_frame, text="Limpiar Datos", command=self.limpiar_datos).grid(row=0, column=1, padx=10)
 
+        # Botón para reabrir una cotización guardada
+        Button(self.botones_frame, text="Abrir Cotización", command=self.abrir_cotizacion).grid(row=0, column=2, padx=10)
+
+        # Estado de la generación en segundo plano
+        self.estado_frame = Frame(root)
+        self.estado_frame.grid(row=14, column=0, columnspan=2, sticky="ew", padx=10, pady=5)
+        self.estado_frame.grid_columnconfigure(1, weight=1)
+        self.progreso_pdf = ttk.Progressbar(self.estado_frame, mode="indeterminate", length=200)
+        self.progreso_pdf.grid(row=0, column=0, padx=10)
+        self.estado_pdf = ttk.Label(self.estado_frame, text="")
+        self.estado_pdf.grid(row=0, column=1, sticky="w")
+        self.cancelar_boton = Button(self.estado_frame, text="Cancelar", command=self.cancelar_generacion, state="disabled")
+        self.cancelar_boton.grid(row=0, column=2, padx=10)
+
+        self.cola_pdf = ColaGeneracion()
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        self.root.after(100, self.revisar_generacion)
+
+        # Con la ventana ya visible, cargar reportlab en segundo plano para que
+        # el primer "Generar PDF" no espere el import
+        self.root.after_idle(lambda: threading.Thread(target=precargar, name="precarga", daemon=True).start())
+
+        # Almacén local de cotizaciones emitidas
+        try:
+            self.almacen = AlmacenCotizaciones()
+        except (OSError, sqlite3.Error) as error:
+            print(f"No se pudo abrir el almacén de cotizaciones: {error}")
+            self.almacen = None
+
+        # Numeración compartida de folios (se propone el siguiente libre)
+        self.folio_reservado = None
+        # Folios reservados cuyo PDF está en cola: se confirman al terminar o
+        # se liberan si falla o se cancela
+        self.folios_en_cola = set()
+        try:
+            self.folios = AsignadorFolios()
+        except (OSError, sqlite3.Error) as error:
+            print(f"No se pudo abrir la base de folios: {error}")
+            self.folios = None
+        self.autocompletar_folio()
+
+        # Catálogo de detalles y descripciones (con las predefinidas como
+        # respaldo si no hay archivo); se revisa cada 2 s por cambios
+        self.catalogo = Catalogo(predefinidas=self.descripciones_predefinidas)
+        if self.almacen is not None:
+            try:
+                self.catalogo.agregar_desde_almacen(self.almacen)
+            except sqlite3.Error as error:
+                print(f"No se pudieron leer los detalles del almacén: {error}")
+        self.descripcion_combobox.config(values=self.catalogo.sugerir_descripciones(""))
+        self.revisar_catalogo()
+
     def agregar_descripcion_predefinida(self):
         descripcion = self.descripcion_combobox.get()
         if descripcion:
@@ -200,6 +264,36 @@ class CotizacionApp:
             self.descripcion_listbox.insert(END, descripcion)
             self.descripcion_combobox.set("")  # Limpiar selección después de añadir
 
+    def revisar_catalogo(self):
+        try:
+            if self.catalogo.recargar_si_cambio() and not self.descripcion_combobox.get():
+                self.descripcion_combobox.config(values=self.catalogo.sugerir_descripciones(""))
+        except (OSError, ValueError) as error:
+            print(f"No se pudo leer el catálogo: {error}")
+        self.root.after(2000, self.revisar_catalogo)
+
+    def sugerir_detalles(self, event=None):
+        if event is not None and event.keysym in TECLAS_NAVEGACION:
+            return
+        self.detalle_entry.config(values=self.catalogo.sugerir_detalles(self.detalle_entry.get()))
+
+    def sugerir_descripciones(self, event=None):
+        if event is not None and event.keysym in TECLAS_NAVEGACION:
+            return
+        self.descripcion_combobox.config(values=self.catalogo.sugerir_descripciones(self.descripcion_combobox.get()))
+
+    # Completa el valor M2 del detalle elegido si el campo está vacío o aún
+    # tiene el valor que puso el catálogo (no pisa un precio escrito a mano)
+    def completar_valor_m2(self, event=None):
+        valor_m2 = self.catalogo.valor_m2(self.detalle_entry.get())
+        actual = self.valor_m2_entry.get().strip()
+        if valor_m2 is None or (actual and actual != self.valor_m2_autocompletado):
+            return
+        self.valor_m2_entry.delete(0, END)
+        self.valor_m2_entry.insert(0, str(valor_m2))
+        self.valor_m2_autocompletado = str(valor_m2)
+        self.calcular_total_mts()
+
     def eliminar_detalle(self):
         # Obtener el índice del detalle seleccionado
         seleccionado = self.tabla_listbox.curselection()
@@ -210,7 +304,7 @@ class CotizacionApp:
         
         # Eliminar el detalle de la lista de datos
         indice = seleccionado[0]
-        self.tabla_datos.pop(indice)
+        self.tabla_datos.eliminar(indice)
 
         # Eliminar el detalle de la lista mostrada en el Listbox
         self.tabla_listbox.delete(indice)
@@ -246,17 +340,14 @@ class CotizacionApp:
 
     def calcular_total_mts(self, event=None):
         try:
-            largo = float(self.largo_entry.get() or 0)
-            alto = float(self.alto_entry.get() or 0)
-            valor_m2 = float(self.valor_m2_entry.get() or 0)
-            
-            total_mts = largo * alto
+            # Mismas reglas de redondeo que el PDF y el recálculo por lotes (precios.py)
+            total_mts, total = calcular_linea(self.largo_entry.get(), self.alto_entry.get(), self.valor_m2_entry.get())
+
             self.total_mts_entry.delete(0, END)
-            self.total_mts_entry.insert(0, str(total_mts))
-            
-            total = total_mts * valor_m2
+            self.total_mts_entry.insert(0, formatear_numero(total_mts))
+
             self.total_entry.delete(0, END)
-            self.total_entry.insert(0, str(int(total)))
+            self.total_entry.insert(0, str(total))
         except ValueError:
             self.total_mts_entry.delete(0, END)
             self.total_entry.delete(0, END)
@@ -270,8 +361,13 @@ class CotizacionApp:
         total = self.total_entry.get()
 
         if detalle and largo and alto and total_mts and valor_m2 and total:
-            self.tabla_datos.append((detalle, largo, alto, total_mts, valor_m2, total))
-            self.tabla_listbox.insert(END, f"{detalle} - {largo}x{alto}, {total_mts} mts, Valor M2: ${self.formatear_dinero(valor_m2)}, Total: ${self.formatear_dinero(total)}")
+            try:
+                linea = LineaDetalle.desde_textos(detalle, largo, alto, total_mts, valor_m2, total)
+            except ValueError:
+                messagebox.showerror("Error", "Largo, alto, total mts, valor M2 y total deben ser números")
+                return
+            self.tabla_datos.agregar(linea)
+            self.tabla_listbox.insert(END, self.texto_detalle(linea))
 
             self.detalle_entry.delete(0, END)
             self.largo_entry.delete(0, END)
@@ -282,15 +378,14 @@ class CotizacionApp:
 
             self.calcular_totales()
 
+    def texto_detalle(self, linea):
+        detalle, largo, alto, total_mts, valor_m2, total = linea.como_textos()
+        return f"{detalle} - {largo}x{alto}, {total_mts} mts, Valor M2: ${self.formatear_dinero(valor_m2)}, Total: ${self.formatear_dinero(total)}"
+
     def calcular_totales(self):
-        # Calcular el total neto sumando todos los totales de los detalles
-        neto = sum(int(total.replace('.', '')) for _, _, _, _, _, total in self.tabla_datos)
-        
-        # Calcular el IVA como 19% del total neto
-        iva = int(neto * 0.19)
-        
-        # Calcular el total bruto sumando neto e IVA
-        bruto = neto + iva
+        # TablaDetalles mantiene el neto al día al agregar o eliminar, así que
+        # aquí solo se leen neto, IVA (19%) y bruto sin recorrer los detalles
+        neto, iva, bruto = self.tabla_datos.totales()
 
         # Limpiar y mostrar los campos de neto, IVA y bruto
         self.neto.delete(0, END)
@@ -310,10 +405,23 @@ class CotizacionApp:
             self.descripcion_entry.delete(0, END)
 
     def formatear_dinero(self, valor):
-        return "{:,}".format(int(valor)).replace(",", ".")
+        return formatear_dinero(valor)
     
+    # Propone el siguiente folio si el campo está vacío. El número queda
+    # reservado hasta que se emita, así no se pierde al limpiar o abrir otra.
+    def autocompletar_folio(self):
+        if self.folios is None or self.folio.get().strip():
+            return
+        if self.folio_reservado is None:
+            try:
+                self.folio_reservado = self.folios.siguiente()
+            except sqlite3.Error as error:
+                print(f"No se pudo reservar un folio: {error}")
+                return
+        self.folio.insert(0, str(self.folio_reservado))
+
     # Limpia todos los campos y listas de la aplicación.
-    def limpiar_datos(self):
+    def limpiar_datos(self, autocompletar=True):
        
         # Limpiar campos de entrada
         self.folio.delete(0, END)
@@ -334,11 +442,89 @@ class CotizacionApp:
         self.forma_pago.delete(0, END)
 
         # Limpiar listas
-        self.tabla_datos.clear()
+        self.tabla_datos.limpiar()
         self.descripcion_datos.clear()
         self.tabla_listbox.delete(0, END)
         self.descripcion_listbox.delete(0, END)
 
+        if autocompletar:
+            self.autocompletar_folio()
+
+    # Construye el registro de la cotización a partir de los campos del formulario
+    def cotizacion_actual(self):
+        return Cotizacion(
+            folio=self.folio.get(),
+            atencion=self.atencion.get(),
+            empresa=self.empresa.get(),
+            tabla_datos=TablaDetalles(self.tabla_datos),
+            descripcion_datos=list(self.descripcion_datos),
+            fecha_evento=self.fecha_evento.get(),
+            fecha_montaje=self.fecha_montaje.get(),
+            fecha_desarme=self.fecha_desarme.get(),
+            lugar_evento=self.lugar_evento.get(),
+            forma_pago=self.forma_pago.get(),
+        )
+
+    # Carga una cotización guardada en el formulario para reemitirla
+    def cargar_cotizacion(self, cotizacion):
+        self.limpiar_datos(autocompletar=False)
+        for entry, valor in ((self.folio, cotizacion.folio), (self.atencion, cotizacion.atencion),
+                             (self.empresa, cotizacion.empresa), (self.fecha_evento, cotizacion.fecha_evento),
+                             (self.fecha_montaje, cotizacion.fecha_montaje), (self.fecha_desarme, cotizacion.fecha_desarme),
+                             (self.lugar_evento, cotizacion.lugar_evento), (self.forma_pago, cotizacion.forma_pago)):
+            entry.insert(0, valor)
+        for linea in cotizacion.tabla_datos:
+            self.tabla_datos.agregar(linea)
+            self.tabla_listbox.insert(END, self.texto_detalle(linea))
+        for descripcion in cotizacion.descripcion_datos:
+            self.descripcion_datos.append(descripcion)
+            self.descripcion_listbox.insert(END, descripcion)
+        self.calcular_totales()
+
+    # Ventana de búsqueda por folio o empresa en el almacén local
+    def abrir_cotizacion(self):
+        if self.almacen is None:
+            messagebox.showerror("Error", "El almacén de cotizaciones no está disponible.")
+            return
+
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Abrir Cotización")
+        ventana.transient(self.root)
+
+        ttk.Label(ventana, text="Folio o empresa:").grid(row=0, column=0, sticky="e", padx=10, pady=5)
+        busqueda = ttk.Entry(ventana, width=40)
+        busqueda.grid(row=0, column=1, sticky="ew", padx=10, pady=5)
+        resultados_listbox = Listbox(ventana, width=80, height=15)
+        resultados_listbox.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=10, pady=5)
+        resultados = []
+
+        def actualizar(event=None):
+            texto = busqueda.get().strip()
+            encontrados = {r.folio: r for r in self.almacen.buscar(folio=texto)}
+            if texto:
+                for resumen in self.almacen.buscar(empresa=texto):
+                    encontrados.setdefault(resumen.folio, resumen)
+            resultados[:] = list(encontrados.values())
+            resultados_listbox.delete(0, END)
+            for r in resultados:
+                resultados_listbox.insert(END, f"N° {r.folio} - {r.empresa} ({r.atencion}) - Evento: {r.fecha_evento} - ${self.formatear_dinero(r.bruto)}")
+
+        def abrir(event=None):
+            seleccionado = resultados_listbox.curselection()
+            if not seleccionado:
+                messagebox.showerror("Error", "Selecciona una cotización para abrir", parent=ventana)
+                return
+            cotizacion = self.almacen.obtener(resultados[seleccionado[0]].folio)
+            if cotizacion is not None:
+                self.cargar_cotizacion(cotizacion)
+            ventana.destroy()
+
+        busqueda.bind("<KeyRelease>", actualizar)
+        resultados_listbox.bind("<Double-Button-1>", abrir)
+        ttk.Button(ventana, text="Abrir", command=abrir).grid(row=2, column=0, columnspan=2, pady=10)
+        actualizar()
+        busqueda.focus_set()
+
     def generar_pdf(self):
         
         # Validar que el folio esté completo
@@ -348,155 +534,136 @@ class CotizacionApp:
             return
 
         # Obtener datos del formulario
-        folio = self.folio.get()
-        atencion = self.atencion.get()
-        empresa = self.empresa.get()
-        neto = self.neto.get()
-        iva = self.iva.get()
-        bruto = self.bruto.get()
-        fecha_evento = self.fecha_evento.get()
-        fecha_montaje = self.fecha_montaje.get()
-        fecha_desarme = self.fecha_desarme.get()
-        lugar_evento = self.lugar_evento.get()
-        forma_pago = self.forma_pago.get()
-        fecha_actual = datetime.now().strftime("%d / %m / %Y")
+        with METRICAS.etapa("gui.datos"):
+            cotizacion = self.cotizacion_actual()
 
         # Seleccionar ubicación para guardar el PDF
-        file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
+        file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")],
+                                                 initialfile=nombre_archivo(cotizacion))
         if not file_path:
             return
 
-        # Crear el PDF
-        c = canvas.Canvas(file_path, pagesize=letter)
-        c.setFont("Times-Roman", 20)
-
-        # Encabezado
-        c.drawString(70, 750, "CARPAS GUAJARDO PROD. SPA")
-        c.setFont("Times-Roman", 11)
-        c.drawString(70, 735, "Rut: 77.011.105-6")
-        c.drawString(70, 720, "Isla Deceit N°8774")
-        c.drawString(70, 705, "Pudahuel")
-        c.drawString(70, 690, "cel: +569 45121257")
-
-        # Fecha y Folio
-        c.drawString(460, 690, f"FECHA: {fecha_actual}")
-        c.drawString(460, 675, f"FOLIO : N° {self.formatear_dinero(folio)}")
-
-        # Título
-        c.setFont("Times-Roman", 18)
-        c.drawString(250, 650, "COTIZACIÓN")
-        c.setLineWidth(0.3)
-        c.line(250, 645, 360, 645)  # Subrayar el título
-
-        # Información del cliente
-        c.setFont("Times-Roman", 12)
-        c.drawString(70, 630, "CLIENTE:")
-        c.line(70, 628, 125, 628)  # Subrayar la palabra CLIENTE
-        c.drawString(70, 615, "ATENCION:")
-        c.setFont("Times-Roman", 12)
-        c.drawString(170, 615, atencion)
-        c.line(170, 613, 360, 613)  # Subrayar la palabra ATENCION
-        c.drawString(70, 600, "EMPRESA:")
-        c.drawString(170, 600, empresa)
-        c.line(170, 598, 360, 598)  # Subrayar la palabra EMPRESA
-        
-        # Título de la tabla
-        c.setFont("Times-Bold", 12)
-        c.drawString(70, 570, "CUADRO DETALLE ARRIENDO CARPA ESCENARIO:")
-        c.line(70, 568, 370, 568)  # Subrayar el título
-        
-        # Formatear los totales con el símbolo de dinero
-        formatted_tabla_datos = [(detalle, largo, alto, total_mts, f"${self.formatear_dinero(valor_m2)}", f"${self.formatear_dinero(total)}") 
-                                  for detalle, largo, alto, total_mts, valor_m2, total in self.tabla_datos]
-
-        # Tabla de detalles
-        table_data = [["Detalle", "Largo", "Alto", "Total Mts", "Valor M2", "Total"]] + formatted_tabla_datos + [
-            ["Total Neto", "", "", "", "", neto],
-            ["IVA", "", "", "", "", iva],
-            ["Total Bruto", "", "", "", "", bruto]
-        ]
-
-        # Crear la tabla con los datos
-        table = Table(table_data, colWidths=[70, 40, 40, 50, 50, 70])
-
-        # Configuración del estilo de la tabla
-        table.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),              # Alinear los números a la derecha
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),            # Centrar verticalmente dentro de las celdas
-            ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),       # Fuente en negrita para el encabezado
-            ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),     # Fuente normal para los datos
-            ('FONTNAME', (0, -3), (-1, -1), 'Times-Bold'),     # Fuente en negrita para Neto, IVA y Bruto
-            ('SPAN', (0, -3), (-2, -3)),                       # Combinar celdas de Neto
-            ('SPAN', (0, -2), (-2, -2)),                       # Combinar celdas de IVA
-            ('SPAN', (0, -1), (-2, -1)),                       # Combinar celdas de Bruto
-            ('ALIGN', (0, -3), (0, -1), 'LEFT'),               # Alinear títulos Neto, IVA, Bruto a la izquierda
-            ('ALIGN', (-1, -3), (-1, -1), 'RIGHT')             # Mantener los valores del Total a la derecha
-        ]))
-
-        # Altura estimada de la tabla
-        table_height = 15 * len(table_data)  # Estimar altura (15 unidades por fila)
-
-        # Ajustar posición y dibujar la tabla en el lienzo
-        table.wrapOn(c, 70, 550 - table_height - 20)  # Ajustar posición
-        table.drawOn(c, 70, 550 - table_height - 20)  # Dibujar la tabla
-
-        # Descripción de la carpa
-        y = 550 - table_height - 40  # Adjust y position based on table height with additional margin
-        c.setFont("Times-Bold", 12)
-        c.drawString(70, y, "Descripción Carpa:")
-        c.setFont("Times-Roman", 12)
-        y -= 15
-        for descripcion in self.descripcion_datos:
-            c.drawString(80, y, f"• {descripcion}")
-            y -= 15
-
-        # Adjust the y position for the following sections based on the number of descriptions
-        y -= 5
-
-        # Fechas y lugar
-        c.setFont("Times-Roman", 12)
-        c.drawString(70, y - 10, "Fecha Evento:")
-        c.drawString(170, y - 10, fecha_evento)
-        c.drawString(70, y - 25, "Fecha Montaje:")
-        c.drawString(170, y - 25, fecha_montaje)
-        c.drawString(70, y - 40, "Fecha Desarme:")
-        c.drawString(170, y - 40, fecha_desarme)
-        c.drawString(70, y - 55, "Lugar Evento:")
-        c.drawString(170, y - 55, lugar_evento)
-        c.drawString(70, y - 70, "Forma de Pago:")
-        c.drawString(170, y - 70, forma_pago)
-
-        # Título de la tabla
-        c.setFont("Times-Roman", 12)
-
-        # Título de la tabla de fechas y lugar
-        c.drawString(70, y - 90, "Esperando que este servicio sea de su interés, le saluda atentamente,")
-        
-        # Firma y pie de página
-        firma_y = 150
-        pie_y = 50
-
-        if y - 80 < firma_y + 20:  # Check if there's enough space for the signature and footer
-            c.showPage()  # Create a new page
-            y = 750  # Reset y position for the new page
-
-        # Firma
-        c.setFont("Times-Roman", 12)
-        c.drawCentredString(300, firma_y, "Ariel Guajardo V.")
-        c.line(255, firma_y - 2, 343, firma_y - 2)  # Subrayar el nombre
-        c.setFont("Times-Italic", 12)
-        c.drawCentredString(300, firma_y - 15, "Carpas Guajardo Prod. Spa")
-        c.drawCentredString(300, firma_y - 30, "Fono: +56963436322 - +56945121257")
-
-        # Pie de página
-        c.setFont("Times-Roman", 10)
-        c.drawCentredString(300, pie_y, "Carpas Guajardo")
-        c.drawCentredString(300, pie_y - 15, "Fono: +56945121257 - Cel. +56963436322")
-
-        c.save()
-        print(f"PDF generado correctamente en {file_path}")
-        messagebox.showinfo("Cotización Generada", "La cotización se generó exitosamente.")
+        # Avisar ya si otro puesto usó el folio para otra empresa. Se confirma
+        # recién cuando el PDF está generado (ver confirmar_folio).
+        numero = folio_numerico(folio)
+        if self.folios is not None and numero is not None:
+            try:
+                self.folios.verificar(numero, cotizacion.empresa)
+            except FolioDuplicado as error:
+                messagebox.showerror("Folio duplicado", str(error))
+                return
+            except sqlite3.Error as error:
+                messagebox.showerror("Error", f"No se pudo consultar el folio: {error}")
+                return
+            # El folio reservado pasa a la cola; el formulario siguiente
+            # recibe uno nuevo
+            if numero == self.folio_reservado:
+                self.folios_en_cola.add(numero)
+                self.folio_reservado = None
+
+        # Encolar el PDF: se genera en segundo plano mientras se sigue editando
+        self.cola_pdf.encolar(cotizacion, file_path)
+        self.actualizar_estado_generacion(f"Cotización N° {folio} en cola")
+
+    def actualizar_estado_generacion(self, texto):
+        pendientes = self.cola_pdf.pendientes
+        if pendientes > 1:
+            texto += f" ({pendientes - 1} más en cola)"
+        self.estado_pdf.config(text=texto)
+        if pendientes and self.cancelar_boton["state"] == "disabled":
+            self.progreso_pdf.start(15)
+            self.cancelar_boton.config(state="normal")
+        elif not pendientes:
+            self.progreso_pdf.stop()
+            self.cancelar_boton.config(state="disabled")
+
+    # Procesa en el hilo de Tk los eventos que dejó el hilo trabajador. Se
+    # reprograma siempre, aunque un evento falle, para no dejar de atender la cola.
+    def revisar_generacion(self):
+        try:
+            for evento in self.cola_pdf.eventos_pendientes():
+                self.procesar_evento_generacion(evento)
+        finally:
+            self.root.after(100, self.revisar_generacion)
+
+    def procesar_evento_generacion(self, evento):
+        trabajo = evento.trabajo
+        folio = trabajo.cotizacion.folio
+        if evento.tipo == "inicio":
+            self.actualizar_estado_generacion(f"Generando cotización N° {folio}...")
+        elif evento.tipo == "progreso":
+            self.actualizar_estado_generacion(f"Generando cotización N° {folio}... página {evento.pagina}")
+        elif evento.tipo == "listo":
+            print(f"PDF generado correctamente en {trabajo.ruta}")
+            self.confirmar_folio(trabajo.cotizacion)
+            # Guardar la cotización emitida para poder reabrirla después
+            if self.almacen is not None:
+                try:
+                    self.almacen.guardar(trabajo.cotizacion)
+                except sqlite3.Error as error:
+                    messagebox.showerror("Error", f"El PDF se generó, pero no se pudo guardar la cotización N° {folio}:\n{error}")
+            self.actualizar_estado_generacion(f"Cotización N° {folio} generada en {trabajo.ruta}")
+        elif evento.tipo == "cancelado":
+            self.liberar_folio(folio)
+            self.actualizar_estado_generacion(f"Cotización N° {folio} cancelada")
+        else:
+            self.liberar_folio(folio)
+            self.actualizar_estado_generacion(f"Error en cotización N° {folio}")
+            messagebox.showerror("Error", f"No se pudo generar la cotización N° {folio}:\n{evento.error}")
+
+    # Registra el folio de un PDF ya generado en la numeración compartida;
+    # otro puesto pudo haberlo usado mientras estaba en cola
+    def confirmar_folio(self, cotizacion):
+        numero = folio_numerico(cotizacion.folio)
+        if self.folios is None or numero is None:
+            return
+        self.folios_en_cola.discard(numero)
+        try:
+            self.folios.confirmar(numero, cotizacion.empresa)
+        except FolioDuplicado as error:
+            messagebox.showerror("Folio duplicado", f"El PDF se generó, pero {error}")
+        except sqlite3.Error as error:
+            messagebox.showerror("Error", f"No se pudo registrar el folio {numero}: {error}")
+
+    # Devuelve un folio reservado cuyo PDF no se llegó a generar. Los folios
+    # escritos a mano no se tocan: no son de este puesto.
+    def liberar_folio(self, folio):
+        numero = folio_numerico(folio)
+        if self.folios is None or numero not in self.folios_en_cola:
+            return
+        self.folios_en_cola.discard(numero)
+        try:
+            self.folios.liberar(numero)
+        except sqlite3.Error as error:
+            print(f"No se pudo liberar el folio {numero}: {error}")
+
+    def cancelar_generacion(self):
+        self.cola_pdf.cancelar_todo()
+        self.estado_pdf.config(text="Cancelando...")
+
+    def cerrar(self):
+        if self.cola_pdf.pendientes and not messagebox.askyesno(
+                "Salir", "Hay cotizaciones generándose. ¿Cancelarlas y salir?"):
+            return
+        self.cola_pdf.detener()
+        # La ventana se cierra aunque la base de folios no responda (por
+        # ejemplo si está en una carpeta de red no disponible)
+        try:
+            if self.folios is not None:
+                # Los trabajos en cola quedaron cancelados: sus folios se devuelven
+                pendientes = set(self.folios_en_cola)
+                if self.folio_reservado is not None:
+                    pendientes.add(self.folio_reservado)
+                try:
+                    for numero in pendientes:
+                        self.folios.liberar(numero)
+                    self.folios.cerrar()
+                except sqlite3.Error as error:
+                    print(f"No se pudieron liberar los folios reservados: {error}")
+            # Con COTIZACIONES_METRICAS definida se guardan los tiempos medidos
+            volcar_al_cerrar()
+        finally:
+            self.root.destroy()
 
 # Ejecutar la aplicación
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import reportlab
+
+from detalles import LineaDetalle, TablaDetalles
+from motor_cotizacion import Cotizacion, calcular_totales, formatear_dinero, renderizar_pdf
+from precios import importar_numpy, recalcular_lote
+
+
+# Benchmark reproducible del generador de cotizaciones.
+# Uso: python benchmark_cotizaciones.py -o reporte.json [--comparar anterior.json]
+#
+# Las cotizaciones se sintetizan de forma determinista, así dos reportes de
+# commits distintos miden exactamente el mismo trabajo y se pueden comparar.
+
+# Con --importtime se mide el arranque en frío de estos módulos con
+# python -X importtime (un proceso nuevo por repetición)
+MODULOS_ARRANQUE = ["motor_cotizacion", "automatizacion_cotizaciones_beta", "plantilla_pdf"]
+
+TAMANOS_FILAS = [1, 10, 100, 1000]
+TAMANOS_DESCRIPCIONES = [5, 50]
+DETALLES = ["Carpa Árabe", "Escenario", "Pista de baile", "Toldo", "Cubrepiso"]
+
+
+def sintetizar_cotizacion(filas, descripciones, folio="1000"):
+    tabla_datos = []
+    for i in range(filas):
+        largo = 3 + i % 12
+        alto = 2 + i % 7
+        valor_m2 = 4500 + (i % 9) * 250
+        tabla_datos.append({"detalle": DETALLES[i % len(DETALLES)], "largo": largo, "alto": alto, "valor_m2": valor_m2})
+    return Cotizacion.desde_dict({
+        "folio": folio,
+        "atencion": "Contacto Benchmark",
+        "empresa": "Eventos de Prueba SpA",
+        "tabla_datos": tabla_datos,
+        "descripcion_datos": [f"Descripción {i + 1} de la carpa" for i in range(descripciones)],
+        "fecha_evento": "15/12/2026",
+        "fecha_montaje": "14/12/2026",
+        "fecha_desarme": "16/12/2026",
+        "lugar_evento": "Santiago",
+        "forma_pago": "50% anticipo, 50% contra entrega",
+        "fecha": "01 / 01 / 2026",
+    })
+
+
+def _cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {
+        "min_s": min(tiempos),
+        "mediana_s": statistics.median(tiempos),
+        "max_s": max(tiempos),
+        "repeticiones": repeticiones,
+    }
+
+
+def medir_renderizado(filas, descripciones, repeticiones):
+    cotizacion = sintetizar_cotizacion(filas, descripciones)
+
+    def renderizar():
+        buffer = BytesIO()
+        renderizar_pdf(cotizacion, buffer)
+        return buffer
+
+    resultado = _cronometrar(renderizar, repeticiones)
+    resultado["bytes"] = len(renderizar().getvalue())
+
+    tracemalloc.start()
+    renderizar()
+    resultado["memoria_pico_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado
+
+
+def medir_totales(filas, repeticiones):
+    tabla_datos = sintetizar_cotizacion(filas, 0).tabla_datos
+    resultado = _cronometrar(lambda: calcular_totales(tabla_datos), repeticiones)
+    resultado["filas_por_s"] = filas / resultado["mediana_s"] if resultado["mediana_s"] else None
+    return resultado
+
+
+def medir_edicion(filas, repeticiones, ediciones=1000):
+    # Editar una línea y leer los totales, como hace la app en cada cambio;
+    # debe costar lo mismo con 10 o con 1000 filas
+    tabla_datos = sintetizar_cotizacion(filas, 0).tabla_datos
+    linea = tabla_datos[0]
+
+    def editar():
+        for i in range(ediciones):
+            tabla_datos.reemplazar(i % filas, linea)
+            tabla_datos.totales()
+
+    resultado = _cronometrar(editar, repeticiones)
+    resultado["ediciones_por_s"] = ediciones / resultado["mediana_s"] if resultado["mediana_s"] else None
+    return resultado
+
+
+def medir_memoria_tablas(cotizaciones, filas):
+    # Memoria retenida por las tablas de detalle de un lote grande en memoria
+    datos = [linea.como_textos() for linea in sintetizar_cotizacion(filas, 0).tabla_datos]
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    tablas = [TablaDetalles(LineaDetalle.desde_textos(*textos) for textos in datos) for _ in range(cotizaciones)]
+    segundos = time.perf_counter() - inicio
+    retenida = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "min_s": segundos, "mediana_s": segundos, "max_s": segundos, "repeticiones": 1,
+        "memoria_bytes": retenida, "bytes_por_linea": retenida / (len(tablas) * filas),
+    }
+
+
+def medir_recalculo_lote(lineas, repeticiones):
+    # Pasada vectorizada de precios.recalcular_lote sobre columnas ya armadas
+    largos = [300 + i % 1200 for i in range(lineas)]
+    altos = [200 + i % 700 for i in range(lineas)]
+    valores = [4500 + (i % 9) * 250 for i in range(lineas)]
+    indices = [i // 10 for i in range(lineas)]
+    resultado = _cronometrar(lambda: recalcular_lote(largos, altos, valores, indices, lineas // 10 + 1), repeticiones)
+    resultado["lineas_por_s"] = lineas / resultado["mediana_s"] if resultado["mediana_s"] else None
+    return resultado
+
+
+def medir_formatear_dinero(cantidad, repeticiones):
+    valores = [str(i * 1379) for i in range(cantidad)]
+
+    def formatear():
+        for valor in valores:
+            formatear_dinero(valor)
+
+    resultado = _cronometrar(formatear, repeticiones)
+    resultado["operaciones_por_s"] = cantidad / resultado["mediana_s"] if resultado["mediana_s"] else None
+    return resultado
+
+
+def _leer_importtime(salida):
+    # Líneas "import time: propio | acumulado | módulo" (microsegundos); la
+    # sangría del nombre indica la profundidad del import
+    tiempos = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        if acumulado.strip().isdigit():
+            tiempos.append((nombre[1:].rstrip(), int(acumulado) / 1e6))
+    return tiempos
+
+
+def medir_importacion(modulo, repeticiones, mas_pesados=5):
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    tiempos = []
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+            cwd=directorio, capture_output=True, text=True,
+        )
+        if proceso.returncode != 0:
+            return {"error": proceso.stderr.strip().splitlines()[-1]}
+        tiempos.append(_leer_importtime(proceso.stderr))
+    totales = [sum(segundos for nombre, segundos in corrida if nombre == modulo) for corrida in tiempos]
+    # Dependencias directas más costosas de la última corrida
+    directas = [(nombre.strip(), segundos) for nombre, segundos in tiempos[-1] if nombre.startswith("  ") and not nombre.startswith("   ")]
+    return {
+        "min_s": min(totales),
+        "mediana_s": statistics.median(totales),
+        "max_s": max(totales),
+        "repeticiones": repeticiones,
+        "mas_pesados": sorted(directas, key=lambda par: par[1], reverse=True)[:mas_pesados],
+    }
+
+
+def ejecutar_importacion(repeticiones=5):
+    return {
+        "commit": _commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "casos": {f"importar/{modulo}": medir_importacion(modulo, repeticiones) for modulo in MODULOS_ARRANQUE},
+    }
+
+
+def resumir_importacion(reporte):
+    for nombre, caso in reporte["casos"].items():
+        if "error" in caso:
+            print(f"{nombre:45} error: {caso['error']}")
+            continue
+        print(f"{nombre:45} {caso['mediana_s'] * 1000:10.1f}ms (min {caso['min_s'] * 1000:.1f}ms)")
+        for dependencia, segundos in caso["mas_pesados"]:
+            print(f"    {dependencia:41} {segundos * 1000:10.1f}ms")
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(repeticiones=5):
+    casos = {}
+    for filas in TAMANOS_FILAS:
+        for descripciones in TAMANOS_DESCRIPCIONES:
+            # Las tablas grandes son lentas; basta con menos repeticiones
+            veces = max(1, repeticiones // 5) if filas >= 1000 else repeticiones
+            casos[f"renderizar/filas={filas}/descripciones={descripciones}"] = medir_renderizado(filas, descripciones, veces)
+        casos[f"calcular_totales/filas={filas}"] = medir_totales(filas, repeticiones * 20)
+        casos[f"editar_detalle/filas={filas}"] = medir_edicion(filas, repeticiones)
+    casos["memoria_tablas/cotizaciones=2000/filas=10"] = medir_memoria_tablas(2000, 10)
+    if importar_numpy() is not None:
+        casos["recalcular_lote/lineas=100000"] = medir_recalculo_lote(100000, repeticiones)
+    casos["formatear_dinero/valores=10000"] = medir_formatear_dinero(10000, repeticiones)
+    return {
+        "commit": _commit_actual(),
+        "python": platform.python_version(),
+        "reportlab": reportlab.Version,
+        "plataforma": platform.platform(),
+        "casos": casos,
+    }
+
+
+def comparar(actual, anterior):
+    # Razón mediana actual / anterior por caso: < 1 es más rápido
+    print(f"{'caso':60} {'anterior':>12} {'actual':>12} {'razón':>8}")
+    for nombre, caso in actual["casos"].items():
+        previo = anterior.get("casos", {}).get(nombre)
+        if not previo:
+            continue
+        razon = caso["mediana_s"] / previo["mediana_s"] if previo["mediana_s"] else float("nan")
+        print(f"{nombre:60} {previo['mediana_s'] * 1000:10.3f}ms {caso['mediana_s'] * 1000:10.3f}ms {razon:8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del renderizado de cotizaciones y el cálculo de totales.")
+    parser.add_argument("-o", "--salida", help="Archivo JSON donde guardar el reporte (por defecto, salida estándar)")
+    parser.add_argument("-r", "--repeticiones", type=int, default=5, help="Repeticiones por caso")
+    parser.add_argument("--comparar", help="Reporte JSON anterior contra el cual comparar")
+    parser.add_argument("--importtime", action="store_true", help="Medir solo el tiempo de importación (arranque) de los módulos")
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        reporte = ejecutar_importacion(args.repeticiones)
+        if not args.salida and not args.comparar:
+            resumir_importacion(reporte)
+    else:
+        reporte = ejecutar(args.repeticiones)
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False, sort_keys=True)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    elif not args.comparar and not args.importtime:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            comparar(reporte, json.load(archivo))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
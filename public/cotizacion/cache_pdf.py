@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from io import BytesIO
+
+from motor_cotizacion import VERSION_PLANTILLA, renderizar_pdf
+from recursos_pdf import firma_recursos
+
+
+# Caché de PDFs direccionada por contenido.
+# La clave es un hash SHA-256 de todos los datos que usa renderizar_pdf más
+# VERSION_PLANTILLA (y los archivos de fuente y logo en uso), así una
+# cotización que no cambió devuelve los bytes ya renderizados. Los archivos
+# viven en disco (<directorio>/<ab>/<clave>.pdf) y se desalojan por LRU cuando
+# el total supera tamano_maximo; la fecha de modificación de cada archivo
+# guarda el último uso entre ejecuciones.
+#
+# Ojo: la fecha de emisión (Cotizacion.fecha) forma parte de la clave, ya
+# que se imprime en el PDF. Para aprovechar la caché al regenerar, la entrada
+# debe traer la fecha original.
+
+TAMANO_MAXIMO = 512 * 1024 * 1024
+
+
+def clave_cotizacion(cotizacion):
+    neto, iva, bruto = cotizacion.totales()
+    contenido = {
+        "version_plantilla": VERSION_PLANTILLA,
+        "cotizacion": cotizacion.a_dict(),
+        "tasa_iva": str(cotizacion.tabla_datos.tasa_iva),
+        "totales": [neto, iva, bruto],
+    }
+    # Solo con fuente o logo configurados, así las claves existentes siguen valiendo
+    recursos = firma_recursos()
+    if recursos:
+        contenido["recursos"] = recursos
+    canonico = json.dumps(contenido, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class CachePDF:
+    def __init__(self, directorio, tamano_maximo=TAMANO_MAXIMO):
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._entradas = OrderedDict()  # clave -> tamaño, de la menos a la más usada
+        self.tamano = 0
+        os.makedirs(directorio, exist_ok=True)
+        # Sin tamaño máximo no se indexa ni se desaloja: así la usan los
+        # workers de un lote, y el proceso principal lleva la cuenta con
+        # registrar (cada worker solo vería lo que escribió él)
+        if tamano_maximo is not None:
+            self._cargar_indice()
+            self._desalojar()
+
+    def _cargar_indice(self):
+        encontrados = []
+        for carpeta in os.scandir(self.directorio):
+            if not carpeta.is_dir():
+                continue
+            for archivo in os.scandir(carpeta.path):
+                if archivo.name.endswith(".pdf"):
+                    estado = archivo.stat()
+                    encontrados.append((estado.st_mtime, archivo.name[:-4], estado.st_size))
+        for _, clave, tamano in sorted(encontrados):
+            self._entradas[clave] = tamano
+            self.tamano += tamano
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave + ".pdf")
+
+    def obtener(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as archivo:
+                datos = archivo.read()
+            os.utime(ruta)
+        except FileNotFoundError:
+            # Otro proceso pudo haberla desalojado
+            self._olvidar(clave)
+            self.fallos += 1
+            return None
+        if clave in self._entradas:
+            self._entradas.move_to_end(clave)
+        else:
+            self._entradas[clave] = len(datos)
+            self.tamano += len(datos)
+        self.aciertos += 1
+        return datos
+
+    def guardar(self, clave, datos):
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: nadie lee un PDF a medio escribir
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as archivo:
+            archivo.write(datos)
+        os.replace(temporal, ruta)
+        self._olvidar(clave)
+        self._entradas[clave] = len(datos)
+        self.tamano += len(datos)
+        self._desalojar()
+
+    def registrar(self, clave, tamano):
+        # Anota un uso hecho por otro proceso sobre el mismo directorio
+        self._olvidar(clave)
+        self._entradas[clave] = tamano
+        self.tamano += tamano
+        self._desalojar()
+
+    def _olvidar(self, clave):
+        tamano = self._entradas.pop(clave, None)
+        if tamano is not None:
+            self.tamano -= tamano
+
+    def _desalojar(self):
+        if self.tamano_maximo is None:
+            return
+        while self.tamano > self.tamano_maximo and len(self._entradas) > 1:
+            clave, tamano = self._entradas.popitem(last=False)
+            self.tamano -= tamano
+            self.desalojos += 1
+            try:
+                os.remove(self._ruta(clave))
+            except FileNotFoundError:
+                pass
+
+    def renderizar(self, cotizacion, clave=None):
+        # Devuelve (bytes del PDF, True si vinieron de la caché)
+        clave = clave or clave_cotizacion(cotizacion)
+        datos = self.obtener(clave)
+        if datos is not None:
+            return datos, True
+        buffer = BytesIO()
+        renderizar_pdf(cotizacion, buffer)
+        datos = buffer.getvalue()
+        self.guardar(clave, datos)
+        return datos, False
+
+    def estadisticas(self):
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+            "entradas": len(self._entradas),
+            "bytes": self.tamano,
+        }
@@ -0,0 +1,188 @@
+import csv
+import os
+import unicodedata
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+
+from almacen import RUTA_POR_DEFECTO as RUTA_ALMACEN
+from precios import a_pesos
+
+
+# Catálogo de detalles (con su valor por m²) y descripciones para el
+# autocompletado del formulario.
+# Se lee de un CSV con columnas tipo ("detalle" o "descripcion"), nombre y
+# valor_m2 (por defecto catalogo.csv junto al almacén, o COTIZACIONES_CATALOGO)
+# y se puede completar con lo ya cotizado en el almacén. El archivo se lee con
+# recargar_si_cambio (la primera vez y cada vez que cambie).
+#
+# Cada tipo tiene un índice ordenado de claves normalizadas (sin tildes ni
+# mayúsculas), una por cada palabra del nombre, así "blanco" encuentra
+# "Techo Blanco". Una búsqueda es un bisect más el recorrido de las
+# coincidencias: unos microsegundos incluso con decenas de miles de entradas.
+# recargar_si_cambio revisa la fecha del archivo y aplica solo las altas,
+# bajas y cambios de precio.
+
+RUTA_POR_DEFECTO = os.environ.get(
+    "COTIZACIONES_CATALOGO", os.path.join(os.path.dirname(RUTA_ALMACEN), "catalogo.csv")
+)
+TIPOS = ("detalle", "descripcion")
+SUGERENCIAS = 15
+
+
+def normalizar(texto):
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(letra for letra in descompuesto if not unicodedata.combining(letra)).strip()
+
+
+@dataclass
+class EntradaCatalogo:
+    tipo: str
+    nombre: str
+    valor_m2: int = None
+
+
+class IndicePrefijos:
+    # Lista ordenada de (clave, palabra, nombre): cada nombre aparece una vez
+    # por palabra, con la clave desde esa palabra hasta el final
+
+    def __init__(self):
+        self._claves = []
+
+    @staticmethod
+    def _claves_de(nombre):
+        palabras = normalizar(nombre).split()
+        return [(" ".join(palabras[i:]), i, nombre) for i in range(len(palabras))]
+
+    def agregar(self, nombre):
+        for clave in self._claves_de(nombre):
+            insort(self._claves, clave)
+
+    def quitar(self, nombre):
+        for clave in self._claves_de(nombre):
+            posicion = bisect_left(self._claves, clave)
+            if posicion < len(self._claves) and self._claves[posicion] == clave:
+                del self._claves[posicion]
+
+    def reconstruir(self, nombres):
+        self._claves = sorted(clave for nombre in nombres for clave in self._claves_de(nombre))
+
+    def buscar(self, prefijo, limite=SUGERENCIAS):
+        # Nombres cuya frase completa o alguna palabra empieza con el prefijo;
+        # primero los que coinciden desde el inicio del nombre. Se revisa un
+        # número acotado de claves para que un prefijo corto no recorra todo.
+        prefijo = " ".join(normalizar(prefijo).split())
+        inicio = bisect_left(self._claves, (prefijo,))
+        desde_inicio, otros = [], []
+        for clave, palabra, nombre in self._claves[inicio:inicio + limite * 50]:
+            if not clave.startswith(prefijo):
+                break
+            if palabra == 0:
+                desde_inicio.append(nombre)
+                if len(desde_inicio) >= limite:
+                    break
+            elif len(otros) < limite:
+                otros.append(nombre)
+        vistos = set(desde_inicio)
+        return (desde_inicio + [nombre for nombre in otros if not (nombre in vistos or vistos.add(nombre))])[:limite]
+
+
+class Catalogo:
+    def __init__(self, ruta=RUTA_POR_DEFECTO, predefinidas=()):
+        # predefinidas: descripciones que se usan si el archivo no existe
+        self.ruta = ruta
+        self._entradas = {tipo: {} for tipo in TIPOS}
+        self._indices = {tipo: IndicePrefijos() for tipo in TIPOS}
+        self._firma = None
+        self._predefinidas = {nombre: EntradaCatalogo("descripcion", nombre) for nombre in predefinidas}
+        self._del_almacen = {tipo: {} for tipo in TIPOS}
+        self._aplicar(self._combinar({tipo: {} for tipo in TIPOS}))
+
+    def _agregar(self, entrada):
+        entradas = self._entradas[entrada.tipo]
+        if entrada.nombre not in entradas:
+            self._indices[entrada.tipo].agregar(entrada.nombre)
+        entradas[entrada.nombre] = entrada
+
+    def _quitar(self, tipo, nombre):
+        if self._entradas[tipo].pop(nombre, None) is not None:
+            self._indices[tipo].quitar(nombre)
+
+    def leer_archivo(self):
+        entradas = []
+        with open(self.ruta, encoding="utf-8-sig", newline="") as archivo:
+            for fila in csv.DictReader(archivo):
+                tipo = (fila.get("tipo") or "detalle").strip().lower()
+                nombre = " ".join((fila.get("nombre") or "").split())
+                if tipo not in TIPOS or not nombre:
+                    continue
+                try:
+                    valor_m2 = a_pesos(fila["valor_m2"]) if (fila.get("valor_m2") or "").strip() else None
+                except ValueError:
+                    valor_m2 = None
+                entradas.append(EntradaCatalogo(tipo, nombre, valor_m2))
+        return entradas
+
+    def recargar_si_cambio(self):
+        # Devuelve True si el archivo cambió desde la última lectura
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return False
+        firma = (estado.st_mtime_ns, estado.st_size)
+        if firma == self._firma:
+            return False
+        self._firma = firma
+        nuevas = {tipo: {} for tipo in TIPOS}
+        for entrada in self.leer_archivo():
+            nuevas[entrada.tipo][entrada.nombre] = entrada
+        self._aplicar(self._combinar(nuevas))
+        return True
+
+    def _combinar(self, del_archivo):
+        # Archivo por sobre lo aprendido del almacén; las descripciones
+        # predefinidas solo si el archivo no trae ninguna
+        combinadas = {}
+        for tipo in TIPOS:
+            combinadas[tipo] = dict(self._del_almacen[tipo])
+            if tipo == "descripcion" and not del_archivo[tipo]:
+                combinadas[tipo].update(self._predefinidas)
+            combinadas[tipo].update(del_archivo[tipo])
+        return combinadas
+
+    def _aplicar(self, nuevas):
+        for tipo in TIPOS:
+            actuales = self._entradas[tipo]
+            quitados = actuales.keys() - nuevas[tipo].keys()
+            agregados = nuevas[tipo].keys() - actuales.keys()
+            if len(quitados) + len(agregados) > len(nuevas[tipo]) // 2:
+                # Cambió casi todo: sale más barato ordenar de nuevo
+                self._entradas[tipo] = nuevas[tipo]
+                self._indices[tipo].reconstruir(nuevas[tipo])
+                continue
+            for nombre in quitados:
+                self._quitar(tipo, nombre)
+            for entrada in nuevas[tipo].values():
+                self._agregar(entrada)
+
+    def agregar_desde_almacen(self, almacen):
+        # Detalles y descripciones ya cotizados; el catálogo manda si el
+        # nombre ya existe
+        for tipo, nombre, valor_m2 in almacen.nombres_cotizados():
+            nombre = " ".join(nombre.split())
+            if nombre:
+                self._del_almacen[tipo][nombre] = EntradaCatalogo(tipo, nombre, valor_m2)
+                if nombre not in self._entradas[tipo]:
+                    self._agregar(self._del_almacen[tipo][nombre])
+
+    def sugerir(self, tipo, texto, limite=SUGERENCIAS):
+        return self._indices[tipo].buscar(texto, limite)
+
+    def sugerir_detalles(self, texto, limite=SUGERENCIAS):
+        return self.sugerir("detalle", texto, limite)
+
+    def sugerir_descripciones(self, texto, limite=SUGERENCIAS):
+        return self.sugerir("descripcion", texto, limite)
+
+    def valor_m2(self, detalle):
+        entrada = self._entradas["detalle"].get(" ".join(detalle.split()))
+        return entrada.valor_m2 if entrada else None
@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+
+from metricas import METRICAS
+from motor_cotizacion import renderizar_pdf
+
+
+# Cola de generación de PDFs en segundo plano para CotizacionApp.
+# Un hilo trabajador renderiza y escribe las cotizaciones en orden de llegada
+# mientras la ventana sigue respondiendo. El hilo nunca toca widgets: deja
+# eventos en una cola que la interfaz lee con root.after (ver ColaGeneracion.
+# eventos_pendientes). Cancelar descarta los trabajos en espera y aborta el
+# que se está renderizando antes de escribir el archivo.
+
+
+class GeneracionCancelada(Exception):
+    pass
+
+
+@dataclass
+class TrabajoPDF:
+    id: int
+    cotizacion: object
+    ruta: str
+    encolado: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class EventoGeneracion:
+    # tipo: "inicio", "progreso", "listo", "error" o "cancelado"
+    tipo: str
+    trabajo: TrabajoPDF
+    pagina: int = 0
+    error: str = None
+
+
+class ColaGeneracion:
+    def __init__(self):
+        self._trabajos = queue.Queue()
+        self._eventos = queue.Queue()
+        self._ultimo_id = 0
+        self._cancelados = set()
+        self._candado = threading.Lock()
+        self._pendientes = 0
+        self._hilo = threading.Thread(target=self._trabajar, name="generacion-pdf", daemon=True)
+        self._hilo.start()
+
+    @property
+    def pendientes(self):
+        # Trabajos encolados más el que se está generando
+        with self._candado:
+            return self._pendientes
+
+    def encolar(self, cotizacion, ruta):
+        with self._candado:
+            self._ultimo_id += 1
+            self._pendientes += 1
+            trabajo = TrabajoPDF(self._ultimo_id, cotizacion, ruta)
+        self._trabajos.put(trabajo)
+        return trabajo
+
+    def cancelar_todo(self):
+        # Marca como cancelados todos los trabajos aún no terminados
+        with self._candado:
+            self._cancelados.update(range(1, self._ultimo_id + 1))
+
+    def detener(self):
+        self.cancelar_todo()
+        self._trabajos.put(None)
+
+    def eventos_pendientes(self):
+        # Para llamar desde el hilo de Tk: devuelve los eventos sin bloquear
+        eventos = []
+        while True:
+            try:
+                eventos.append(self._eventos.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    def _cancelado(self, trabajo):
+        with self._candado:
+            return trabajo.id in self._cancelados
+
+    def _trabajar(self):
+        while True:
+            trabajo = self._trabajos.get()
+            if trabajo is None:
+                return
+            evento = self._generar(trabajo)
+            # El contador baja antes de publicar el evento final, así la
+            # interfaz ve la cola ya actualizada al procesarlo
+            with self._candado:
+                self._pendientes -= 1
+                self._cancelados.discard(trabajo.id)
+            self._eventos.put(evento)
+
+    def _generar(self, trabajo):
+        if self._cancelado(trabajo):
+            return EventoGeneracion("cancelado", trabajo)
+        # Tiempo que el trabajo esperó detrás de otros en la cola
+        METRICAS.observar("cola.espera", time.perf_counter() - trabajo.encolado)
+        self._eventos.put(EventoGeneracion("inicio", trabajo))
+
+        def progreso(pagina):
+            if self._cancelado(trabajo):
+                raise GeneracionCancelada()
+            self._eventos.put(EventoGeneracion("progreso", trabajo, pagina=pagina))
+
+        try:
+            # Se renderiza en memoria y se escribe al final: un PDF cancelado o
+            # fallido no deja un archivo a medias en la carpeta compartida.
+            buffer = BytesIO()
+            renderizar_pdf(trabajo.cotizacion, buffer, progreso)
+            if self._cancelado(trabajo):
+                raise GeneracionCancelada()
+            with METRICAS.etapa("cola.escritura"):
+                temporal = trabajo.ruta + ".tmp"
+                with open(temporal, "wb") as archivo:
+                    archivo.write(buffer.getbuffer())
+                os.replace(temporal, trabajo.ruta)
+        except GeneracionCancelada:
+            return EventoGeneracion("cancelado", trabajo)
+        except Exception as error:
+            return EventoGeneracion("error", trabajo, error=f"{type(error).__name__}: {error}")
+        return EventoGeneracion("listo", trabajo)
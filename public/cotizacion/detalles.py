@@ -0,0 +1,295 @@
+import sys
+from array import array
+from dataclasses import dataclass
+from decimal import Decimal
+
+from metricas import METRICAS
+from precios import TASA_IVA, a_metros, a_pesos, calcular_iva, calcular_linea, recalcular_lote
+
+
+# Modelo de las líneas de detalle de una cotización.
+# Guarda valores numéricos (no los textos de los Entry) y mantiene el neto
+# acumulado al agregar, eliminar o editar, de modo que neto, IVA y bruto se
+# obtienen en tiempo constante tanto desde la app como desde el motor de PDF.
+# Las medidas son Decimal con 2 decimales y los montos pesos enteros; las
+# reglas de redondeo están en precios.py.
+#
+# TablaDetalles guarda las líneas por columnas: arreglos de enteros (medidas
+# en centésimos, montos en pesos) y el nombre del detalle como índice a la
+# lista de nombres de la propia tabla, porque en la práctica se repiten unos
+# pocos ("Carpa Árabe", "Escenario"...). Cada nombre lleva la cuenta de las
+# líneas que lo usan: el que queda sin uso al eliminar o reemplazar se suelta
+# y su posición se reutiliza. Los nombres se internan, así todas las tablas
+# comparten el mismo str, y se liberan junto con las tablas que los usan.
+# Cada línea ocupa ~44 bytes en vez de un objeto con tres Decimal; los
+# LineaDetalle se arman solo al leerlas.
+
+
+def formatear_numero(valor):
+    return f"{valor.normalize():f}"
+
+
+def _a_centesimos(valor):
+    return int(a_metros(valor).scaleb(2))
+
+
+def _desde_centesimos(valor):
+    return Decimal(valor).scaleb(-2)
+
+
+def _formatear_centesimos(valor):
+    # Igual que formatear_numero(_desde_centesimos(valor)) sin pasar por Decimal
+    enteros, centesimos = divmod(valor, 100)
+    if not centesimos:
+        return str(enteros)
+    return f"{enteros}.{centesimos:02d}".rstrip("0")
+
+
+@dataclass
+class LineaDetalle:
+    __slots__ = ("detalle", "largo", "alto", "total_mts", "valor_m2", "total")
+
+    detalle: str
+    largo: Decimal
+    alto: Decimal
+    total_mts: Decimal
+    valor_m2: int
+    total: int
+
+    @classmethod
+    def calcular(cls, detalle, largo, alto, valor_m2):
+        # Mismo cálculo que CotizacionApp.calcular_total_mts
+        total_mts, total = calcular_linea(largo, alto, valor_m2)
+        return cls(str(detalle), a_metros(largo), a_metros(alto), total_mts, a_pesos(valor_m2), total)
+
+    @classmethod
+    def desde_textos(cls, detalle, largo, alto, total_mts, valor_m2, total):
+        # Respeta total_mts y total escritos a mano en el formulario
+        if total_mts in (None, "") or total in (None, ""):
+            return cls.calcular(detalle, largo, alto, valor_m2)
+        return cls(str(detalle), a_metros(largo), a_metros(alto), a_metros(total_mts),
+                   a_pesos(valor_m2), a_pesos(total))
+
+    def como_textos(self):
+        return (self.detalle, formatear_numero(self.largo), formatear_numero(self.alto),
+                formatear_numero(self.total_mts), str(self.valor_m2), str(self.total))
+
+    def a_dict(self):
+        return {
+            "detalle": self.detalle, "largo": str(self.largo), "alto": str(self.alto),
+            "total_mts": str(self.total_mts), "valor_m2": self.valor_m2, "total": self.total,
+        }
+
+
+class TablaDetalles:
+    def __init__(self, lineas=(), tasa_iva=TASA_IVA):
+        self.tasa_iva = tasa_iva
+        if isinstance(lineas, TablaDetalles):
+            # Copia directa de las columnas
+            self._nombres = list(lineas._nombres)
+            self._indices_nombres = dict(lineas._indices_nombres)
+            self._usos = array("I", lineas._usos)
+            self._libres = list(lineas._libres)
+            self._detalles = array("I", lineas._detalles)
+            self._largos = array("q", lineas._largos)
+            self._altos = array("q", lineas._altos)
+            self._total_mts = array("q", lineas._total_mts)
+            self._valores_m2 = array("q", lineas._valores_m2)
+            self._totales = array("q", lineas._totales)
+            self.neto = lineas.neto
+            return
+        self._nombres = []              # índice -> nombre (None si está libre)
+        self._indices_nombres = {}      # nombre -> índice
+        self._usos = array("I")         # líneas que usan cada nombre
+        self._libres = []               # índices sin uso, para reutilizar
+        self._detalles = array("I")
+        self._largos = array("q")
+        self._altos = array("q")
+        self._total_mts = array("q")
+        self._valores_m2 = array("q")
+        self._totales = array("q")
+        self.neto = 0
+        for linea in lineas:
+            self.agregar(linea)
+
+    def _usar_nombre(self, detalle):
+        # Índice del nombre con un uso más
+        indice = self._indices_nombres.get(detalle)
+        if indice is None:
+            detalle = sys.intern(detalle) if type(detalle) is str else detalle
+            if self._libres:
+                indice = self._libres.pop()
+                self._nombres[indice] = detalle
+            else:
+                indice = len(self._nombres)
+                self._nombres.append(detalle)
+                self._usos.append(0)
+            self._indices_nombres[detalle] = indice
+        self._usos[indice] += 1
+        return indice
+
+    def _soltar_nombre(self, indice):
+        self._usos[indice] -= 1
+        if not self._usos[indice]:
+            del self._indices_nombres[self._nombres[indice]]
+            self._nombres[indice] = None
+            self._libres.append(indice)
+
+    def _columnas(self):
+        return (self._detalles, self._largos, self._altos, self._total_mts, self._valores_m2, self._totales)
+
+    def _linea(self, indice):
+        return LineaDetalle(
+            self._nombres[self._detalles[indice]],
+            _desde_centesimos(self._largos[indice]),
+            _desde_centesimos(self._altos[indice]),
+            _desde_centesimos(self._total_mts[indice]),
+            self._valores_m2[indice],
+            self._totales[indice],
+        )
+
+    def __len__(self):
+        return len(self._totales)
+
+    def __iter__(self):
+        nombres = self._nombres
+        for detalle, largo, alto, total_mts, valor_m2, total in zip(*self._columnas()):
+            yield LineaDetalle(nombres[detalle], _desde_centesimos(largo), _desde_centesimos(alto),
+                               _desde_centesimos(total_mts), valor_m2, total)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self._linea(i) for i in range(*indice.indices(len(self)))]
+        return self._linea(indice)
+
+    def como_textos(self, inicio=0, fin=None):
+        # Textos de las líneas [inicio:fin] como LineaDetalle.como_textos,
+        # formateados directo desde las columnas (para el PDF)
+        nombres = self._nombres
+        for detalle, largo, alto, total_mts, valor_m2, total in zip(*(columna[inicio:fin] for columna in self._columnas())):
+            yield (nombres[detalle], _formatear_centesimos(largo), _formatear_centesimos(alto),
+                   _formatear_centesimos(total_mts), str(valor_m2), str(total))
+
+    def __eq__(self, otra):
+        # Los índices de nombre dependen del orden en que cada tabla los vio
+        return (isinstance(otra, TablaDetalles) and self._columnas()[1:] == otra._columnas()[1:]
+                and [self._nombres[i] for i in self._detalles] == [otra._nombres[i] for i in otra._detalles])
+
+    def __repr__(self):
+        return f"TablaDetalles({list(self)!r})"
+
+    def __getstate__(self):
+        estado = dict(self.__dict__)
+        del estado["_indices_nombres"]
+        return estado
+
+    def __setstate__(self, estado):
+        # Al llegar a otro proceso (ProcessPoolExecutor) los nombres se
+        # vuelven a internar y el diccionario se rearma con ellos
+        nombres = estado["_nombres"] = [
+            sys.intern(nombre) if type(nombre) is str else nombre for nombre in estado["_nombres"]
+        ]
+        estado["_indices_nombres"] = {
+            nombre: indice for indice, nombre in enumerate(nombres) if estado["_usos"][indice]
+        }
+        self.__dict__.update(estado)
+
+    def __sizeof__(self):
+        return (object.__sizeof__(self) + self._nombres.__sizeof__() + self._indices_nombres.__sizeof__()
+                + self._usos.__sizeof__() + self._libres.__sizeof__()
+                + sum(columna.__sizeof__() for columna in self._columnas()))
+
+    def agregar(self, linea):
+        # Se convierte todo antes de tocar las columnas: un valor inválido no
+        # deja la tabla a medio agregar
+        medidas = _a_centesimos(linea.largo), _a_centesimos(linea.alto), _a_centesimos(linea.total_mts)
+        self._detalles.append(self._usar_nombre(linea.detalle))
+        self._largos.append(medidas[0])
+        self._altos.append(medidas[1])
+        self._total_mts.append(medidas[2])
+        self._valores_m2.append(linea.valor_m2)
+        self._totales.append(linea.total)
+        self.neto += linea.total
+
+    def eliminar(self, indice):
+        linea = self._linea(indice)
+        self._soltar_nombre(self._detalles[indice])
+        for columna in self._columnas():
+            del columna[indice]
+        self.neto -= linea.total
+        return linea
+
+    def reemplazar(self, indice, linea):
+        anterior = self._linea(indice)
+        medidas = _a_centesimos(linea.largo), _a_centesimos(linea.alto), _a_centesimos(linea.total_mts)
+        # El nombre nuevo se toma antes de soltar el anterior: si es el mismo
+        # no se libera y se vuelve a crear
+        nombre = self._usar_nombre(linea.detalle)
+        self._soltar_nombre(self._detalles[indice])
+        self._detalles[indice] = nombre
+        self._largos[indice], self._altos[indice], self._total_mts[indice] = medidas
+        self._valores_m2[indice] = linea.valor_m2
+        self._totales[indice] = linea.total
+        self.neto += linea.total - anterior.total
+        return anterior
+
+    def limpiar(self):
+        for columna in self._columnas():
+            del columna[:]
+        self._nombres = []
+        self._indices_nombres = {}
+        self._usos = array("I")
+        self._libres = []
+        self.neto = 0
+
+    @property
+    def iva(self):
+        return calcular_iva(self.neto, self.tasa_iva)
+
+    @property
+    def bruto(self):
+        return self.neto + self.iva
+
+    def totales(self):
+        neto = self.neto
+        iva = calcular_iva(neto, self.tasa_iva)
+        return neto, iva, neto + iva
+
+
+def recalcular_tablas(tablas, tasa_iva=TASA_IVA, valores_m2=None):
+    # Recalcula todas las líneas de varias cotizaciones en una pasada de
+    # NumPy (revisiones de IVA o de precios de fin de mes). valores_m2 es un
+    # diccionario opcional detalle -> nuevo valor por m². Los totales
+    # escritos a mano se reemplazan por el cálculo desde las medidas.
+    # Devuelve los arreglos de recalcular_lote.
+    with METRICAS.etapa("totales.recalcular_tablas"):
+        return _recalcular_tablas(list(tablas), tasa_iva, valores_m2)
+
+
+def _recalcular_tablas(tablas, tasa_iva, valores_m2):
+    largos, altos, valores, indices = array("q"), array("q"), array("q"), array("q")
+    for indice, tabla in enumerate(tablas):
+        # Las columnas ya están en centésimos y pesos: se copian sin convertir
+        largos.extend(tabla._largos)
+        altos.extend(tabla._altos)
+        if valores_m2:
+            valores.extend(valores_m2.get(tabla._nombres[detalle], valor)
+                           for detalle, valor in zip(tabla._detalles, tabla._valores_m2))
+        else:
+            valores.extend(tabla._valores_m2)
+        indices.extend([indice] * len(tabla))
+    resultado = recalcular_lote(largos, altos, valores, indices, len(tablas), tasa_iva)
+
+    total_mts = resultado["total_mts"]
+    totales = resultado["totales"]
+    neto = resultado["neto"].tolist()
+    inicio = 0
+    for indice, tabla in enumerate(tablas):
+        fin = inicio + len(tabla)
+        tabla._total_mts = array("q", total_mts[inicio:fin].tobytes())
+        tabla._valores_m2 = valores[inicio:fin]
+        tabla._totales = array("q", totales[inicio:fin].tobytes())
+        tabla.neto = neto[indice]
+        tabla.tasa_iva = tasa_iva
+        inicio = fin
+    return resultado
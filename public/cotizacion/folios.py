@@ -0,0 +1,266 @@
+import argparse
+import os
+import socket
+import sqlite3
+import sys
+from datetime import datetime
+
+from almacen import RUTA_POR_DEFECTO as RUTA_ALMACEN
+
+
+# Asignación de folios compartida entre puestos de trabajo.
+# El contador vive en una base SQLite (por defecto junto al almacén; con
+# COTIZACIONES_FOLIOS_DB se puede apuntar a una carpeta compartida). Cada
+# reserva es una transacción BEGIN IMMEDIATE que toma el bloqueo de escritura
+# del archivo, así dos puestos nunca reciben el mismo número. No usa WAL porque
+# WAL no funciona sobre carpetas de red.
+#
+# Los folios se reservan por bloques: la app pide de a uno, pero el modo por
+# lotes reserva cientos en una sola transacción y los reparte sin volver a la
+# base. Al emitir una cotización su folio se confirma en folio_emitido; un
+# folio ya emitido para otra empresa se rechaza (FolioDuplicado) y los
+# números reservados que nunca se emitieron (ni se devolvieron) aparecen en
+# huecos().
+
+RUTA_POR_DEFECTO = os.environ.get(
+    "COTIZACIONES_FOLIOS_DB", os.path.join(os.path.dirname(RUTA_ALMACEN), "folios.db")
+)
+TIEMPO_ESPERA = 30
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS secuencia (
+    nombre    TEXT PRIMARY KEY,
+    siguiente INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reserva (
+    id        INTEGER PRIMARY KEY,
+    inicio    INTEGER NOT NULL,
+    fin       INTEGER NOT NULL,
+    puesto    TEXT NOT NULL,
+    reservado TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS folio_emitido (
+    folio   INTEGER PRIMARY KEY,
+    empresa TEXT NOT NULL DEFAULT '',
+    puesto  TEXT NOT NULL,
+    emitido TEXT NOT NULL
+);
+"""
+
+
+class FolioDuplicado(ValueError):
+    pass
+
+
+class AsignadorFolios:
+    def __init__(self, ruta=RUTA_POR_DEFECTO, tamano_bloque=1, puesto=None, secuencia="cotizacion"):
+        if ruta != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self.ruta = ruta
+        self.tamano_bloque = tamano_bloque
+        self.puesto = puesto or f"{socket.gethostname()}:{os.getpid()}"
+        self.secuencia = secuencia
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        self.conexion = sqlite3.connect(ruta, timeout=TIEMPO_ESPERA, isolation_level=None)
+        self.conexion.executescript(ESQUEMA)
+        self._bloque = range(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def _transaccion(self, funcion, *args):
+        self.conexion.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = funcion(*args)
+        except BaseException:
+            self.conexion.execute("ROLLBACK")
+            raise
+        self.conexion.execute("COMMIT")
+        return resultado
+
+    def _siguiente_en_base(self):
+        fila = self.conexion.execute("SELECT siguiente FROM secuencia WHERE nombre = ?", (self.secuencia,)).fetchone()
+        if fila is not None:
+            return fila[0]
+        # Primera vez: continuar después del mayor folio numérico ya emitido
+        mayor = self.conexion.execute("SELECT max(folio) FROM folio_emitido").fetchone()[0] or 0
+        self.conexion.execute("INSERT INTO secuencia (nombre, siguiente) VALUES (?, ?)", (self.secuencia, mayor + 1))
+        return mayor + 1
+
+    def iniciar(self, siguiente):
+        # Fija el próximo folio (por ejemplo al migrar desde la numeración manual)
+        def iniciar():
+            self._siguiente_en_base()
+            self.conexion.execute("UPDATE secuencia SET siguiente = ? WHERE nombre = ?", (siguiente, self.secuencia))
+        self._transaccion(iniciar)
+        self._bloque = range(0)
+
+    def reservar_bloque(self, cantidad=None):
+        # Reserva atómicamente `cantidad` folios consecutivos y devuelve el range
+        cantidad = cantidad or self.tamano_bloque
+
+        def reservar():
+            inicio = self._siguiente_en_base()
+            self.conexion.execute(
+                "UPDATE secuencia SET siguiente = ? WHERE nombre = ?", (inicio + cantidad, self.secuencia)
+            )
+            self.conexion.execute(
+                "INSERT INTO reserva (inicio, fin, puesto, reservado) VALUES (?, ?, ?, ?)",
+                (inicio, inicio + cantidad, self.puesto, _ahora()),
+            )
+            return range(inicio, inicio + cantidad)
+
+        return self._transaccion(reservar)
+
+    def siguiente(self):
+        # Próximo folio del bloque local; reserva otro bloque cuando se agota
+        if not self._bloque:
+            self._bloque = self.reservar_bloque()
+        folio, self._bloque = self._bloque[0], self._bloque[1:]
+        return folio
+
+    def devolver_sobrantes(self):
+        # Devuelve lo que quedó sin usar del bloque local (al terminar un lote)
+        sobrantes, self._bloque = self._bloque, range(0)
+        return bool(sobrantes) and self._devolver(sobrantes.start, sobrantes.stop)
+
+    def liberar(self, folio):
+        # Devuelve un folio reservado que no se llegó a emitir
+        return self._devolver(folio, folio + 1)
+
+    def _devolver(self, inicio, fin):
+        # Los números dejan de contar como reservados. El contador solo
+        # retrocede si siguen siendo el final de la secuencia; si otro puesto
+        # ya reservó después, simplemente se saltan.
+        def devolver():
+            self.conexion.execute(
+                "UPDATE reserva SET fin = ? WHERE inicio <= ? AND fin = ? AND puesto = ?",
+                (inicio, inicio, fin, self.puesto),
+            )
+            self.conexion.execute("DELETE FROM reserva WHERE fin <= inicio")
+            cursor = self.conexion.execute(
+                "UPDATE secuencia SET siguiente = ? WHERE nombre = ? AND siguiente = ?",
+                (inicio, self.secuencia, fin),
+            )
+            return cursor.rowcount > 0
+
+        return self._transaccion(devolver)
+
+    def confirmar(self, folio, empresa=""):
+        self.confirmar_lote([(folio, empresa)])
+
+    def confirmar_lote(self, emitidos):
+        # emitidos: pares (folio, empresa). Reemitir un folio para la misma
+        # empresa es válido (una cotización corregida); para otra empresa es
+        # un duplicado y no se confirma ninguno del lote. Los folios escritos a
+        # mano por encima del contador lo adelantan.
+        emitidos = [(int(folio), (empresa or "").strip()) for folio, empresa in emitidos]
+
+        def confirmar():
+            self._comprobar(emitidos)
+            ahora = _ahora()
+            self.conexion.executemany(
+                "INSERT INTO folio_emitido (folio, empresa, puesto, emitido) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (folio) DO UPDATE SET emitido = excluded.emitido",
+                [(folio, empresa, self.puesto, ahora) for folio, empresa in emitidos],
+            )
+            if emitidos:
+                siguiente = self._siguiente_en_base()
+                mayor = max(folio for folio, _ in emitidos)
+                if mayor >= siguiente:
+                    self.conexion.execute(
+                        "UPDATE secuencia SET siguiente = ? WHERE nombre = ?", (mayor + 1, self.secuencia)
+                    )
+
+        self._transaccion(confirmar)
+
+    def verificar(self, folio, empresa=""):
+        # Lanza FolioDuplicado si confirmar lo rechazaría, sin registrar nada.
+        # Sirve para avisar antes de generar el PDF; la confirmación real se
+        # hace al terminar y vuelve a comprobar.
+        self._comprobar([(int(folio), (empresa or "").strip())])
+
+    def _comprobar(self, emitidos):
+        for folio, empresa in emitidos:
+            anterior = self.conexion.execute(
+                "SELECT empresa, puesto, emitido FROM folio_emitido WHERE folio = ?", (folio,)
+            ).fetchone()
+            if anterior is not None and anterior[0].casefold() != empresa.casefold():
+                raise FolioDuplicado(
+                    f"El folio {folio} ya fue emitido para {anterior[0] or '(sin empresa)'} "
+                    f"({anterior[1]}, {anterior[2]})"
+                )
+
+    def proximo(self):
+        # Próximo folio que entregaría la base, sin reservarlo
+        return self._transaccion(self._siguiente_en_base)
+
+    def huecos(self, desde=1):
+        # Folios reservados que nunca se emitieron (incluye los bloques que
+        # otros puestos aún tienen en uso)
+        reservas = self.conexion.execute(
+            "SELECT inicio, fin FROM reserva WHERE fin > ? ORDER BY inicio", (desde,)
+        ).fetchall()
+        if not reservas:
+            return []
+        emitidos = self.conexion.execute(
+            "SELECT folio FROM folio_emitido WHERE folio >= ? AND folio < ? ORDER BY folio",
+            (max(desde, reservas[0][0]), max(fin for _, fin in reservas)),
+        )
+        emitido = next(emitidos, (None,))[0]
+        huecos = []
+        for inicio, fin in reservas:
+            for folio in range(max(inicio, desde), fin):
+                while emitido is not None and emitido < folio:
+                    emitido = next(emitidos, (None,))[0]
+                if folio != emitido:
+                    huecos.append(folio)
+        return huecos
+
+
+def folio_numerico(texto):
+    # Los folios no numéricos (borradores, "S/N") quedan fuera del asignador
+    texto = (texto or "").strip().replace(".", "")
+    return int(texto) if texto.isdigit() else None
+
+
+def _ahora():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _rangos(numeros):
+    # [3, 4, 5, 9] -> "3-5, 9"
+    partes = []
+    for numero in numeros:
+        if partes and partes[-1][1] == numero - 1:
+            partes[-1][1] = numero
+        else:
+            partes.append([numero, numero])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in partes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Administra la numeración compartida de folios.")
+    parser.add_argument("--db", default=RUTA_POR_DEFECTO, help="Base SQLite de folios")
+    parser.add_argument("--iniciar", type=int, help="Fijar el próximo folio a entregar")
+    parser.add_argument("--huecos", action="store_true", help="Listar folios reservados que nunca se emitieron")
+    args = parser.parse_args(argv)
+
+    with AsignadorFolios(args.db) as asignador:
+        if args.iniciar is not None:
+            asignador.iniciar(args.iniciar)
+        if args.huecos:
+            huecos = asignador.huecos()
+            print(f"{len(huecos)} folios sin emitir: {_rangos(huecos)}" if huecos else "Sin huecos")
+        print(f"Próximo folio: {asignador.proximo()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
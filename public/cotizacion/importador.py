@@ -0,0 +1,167 @@
+import csv
+import os
+from datetime import date, datetime
+
+from detalles import LineaDetalle, TablaDetalles
+from motor_cotizacion import CAMPOS_CABECERA, Cotizacion, leer_fecha
+
+
+# Importación de solicitudes de cotización desde planillas (.csv o .xlsx).
+# Mismo formato que leer_csv: una fila por detalle y las filas consecutivas con
+# el mismo folio forman una cotización; columnas folio, atencion, empresa,
+# fecha_evento, fecha_montaje, fecha_desarme, lugar_evento, forma_pago, fecha,
+# detalle, largo, alto, valor_m2 (total_mts y total opcionales) y descripcion.
+#
+# Las filas se leen de a una (openpyxl en modo read_only para .xlsx) y solo se
+# mantiene en memoria la cotización en curso. Cada cotización se valida con
+# las reglas del formulario: folio obligatorio, largo/alto/valor_m2 numéricos
+# y fechas reconocibles por leer_fecha. Si alguna fila falla, la cotización
+# completa va al archivo de rechazos con el número de fila y el motivo.
+# Con exigir_folio=False (lote_cotizaciones --asignar-folios) se aceptan
+# cotizaciones sin folio; las filas consecutivas sin folio forman una sola.
+
+CAMPOS_DETALLE = ["detalle", "largo", "alto", "total_mts", "valor_m2", "total"]
+CAMPOS_FECHA = ["fecha_evento", "fecha_montaje", "fecha_desarme"]
+COLUMNAS_RECHAZO = ["fila", "motivo"] + CAMPOS_CABECERA + CAMPOS_DETALLE + ["descripcion"]
+
+
+def _normalizar_columna(nombre):
+    return str(nombre or "").strip().lower().replace(" ", "_")
+
+
+def _texto_celda(valor):
+    # Las celdas de Excel llegan como números o fechas; el resto del flujo
+    # trabaja con los mismos textos que se escribirían en el formulario
+    if valor is None:
+        return ""
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def leer_filas(ruta):
+    # Genera (número de fila, diccionario columna -> texto); la fila 1 es el encabezado
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".csv":
+        with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+            lector = csv.reader(archivo)
+            columnas = [_normalizar_columna(nombre) for nombre in next(lector, [])]
+            for numero, fila in enumerate(lector, start=2):
+                yield numero, {columna: valor.strip() for columna, valor in zip(columnas, fila)}
+    elif extension in (".xlsx", ".xlsm"):
+        try:
+            import openpyxl
+        except ImportError:
+            raise RuntimeError("Leer planillas .xlsx requiere openpyxl (pip install openpyxl)") from None
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = libro.worksheets[0].iter_rows(values_only=True)
+            columnas = [_normalizar_columna(nombre) for nombre in next(filas, ())]
+            for numero, fila in enumerate(filas, start=2):
+                yield numero, {columna: _texto_celda(valor) for columna, valor in zip(columnas, fila)}
+        finally:
+            libro.close()
+    else:
+        raise ValueError(f"Formato de planilla no soportado: {extension}")
+
+
+def _validar_cabecera(fila, exigir_folio=True):
+    # La cabecera de la cotización se toma de su primera fila
+    if exigir_folio and not fila.get("folio"):
+        raise ValueError("Falta el folio")
+    for campo in CAMPOS_FECHA:
+        if fila.get(campo) and leer_fecha(fila[campo]) is None:
+            raise ValueError(f"{campo} no es una fecha válida: {fila[campo]!r}")
+
+
+def _validar_detalle(fila):
+    # Devuelve la LineaDetalle de la fila (o None si no trae detalle); lanza
+    # ValueError con el motivo si la fila no pasaría las reglas del formulario
+    if not fila.get("detalle"):
+        return None
+    for campo in ("largo", "alto", "valor_m2"):
+        if not fila.get(campo):
+            raise ValueError(f"Falta {campo} en el detalle {fila['detalle']!r}")
+    try:
+        return LineaDetalle.desde_textos(*(fila.get(campo) for campo in CAMPOS_DETALLE))
+    except ValueError:
+        raise ValueError("Largo, alto, total mts, valor M2 y total deben ser números") from None
+
+
+class ImportadorCotizaciones:
+    # Iterable de Cotizacion válidas; rechazos es la ruta del CSV de rechazos
+    # (se crea solo si hay alguno)
+
+    def __init__(self, ruta, rechazos=None, exigir_folio=True):
+        self.ruta = ruta
+        self.rechazos = rechazos
+        self.exigir_folio = exigir_folio
+        self.aceptadas = 0
+        self.rechazadas = 0
+        self.filas_rechazadas = 0
+        self._archivo_rechazos = None
+        self._escritor_rechazos = None
+
+    def __iter__(self):
+        try:
+            grupo = []
+            for numero, fila in leer_filas(self.ruta):
+                if not any(fila.values()):
+                    continue
+                if grupo and fila.get("folio") != grupo[0][1].get("folio"):
+                    cotizacion = self._procesar(grupo)
+                    if cotizacion is not None:
+                        yield cotizacion
+                    grupo = []
+                grupo.append((numero, fila))
+            if grupo:
+                cotizacion = self._procesar(grupo)
+                if cotizacion is not None:
+                    yield cotizacion
+        finally:
+            if self._archivo_rechazos is not None:
+                self._archivo_rechazos.close()
+                self._archivo_rechazos = None
+
+    def _procesar(self, grupo):
+        lineas = []
+        errores = {}
+        try:
+            _validar_cabecera(grupo[0][1], self.exigir_folio)
+        except ValueError as error:
+            errores[grupo[0][0]] = str(error)
+        for numero, fila in grupo:
+            try:
+                linea = _validar_detalle(fila)
+            except ValueError as error:
+                errores[numero] = f"{errores[numero]}; {error}" if numero in errores else str(error)
+                continue
+            if linea is not None:
+                lineas.append(linea)
+        if errores:
+            self._rechazar(grupo, errores)
+            return None
+
+        primera = grupo[0][1]
+        self.aceptadas += 1
+        return Cotizacion(
+            tabla_datos=TablaDetalles(lineas),
+            descripcion_datos=[fila["descripcion"] for _, fila in grupo if fila.get("descripcion")],
+            **{campo: primera[campo] for campo in CAMPOS_CABECERA if primera.get(campo)},
+        )
+
+    def _rechazar(self, grupo, errores):
+        self.rechazadas += 1
+        self.filas_rechazadas += len(grupo)
+        if self.rechazos is None:
+            return
+        if self._escritor_rechazos is None:
+            self._archivo_rechazos = open(self.rechazos, "w", encoding="utf-8-sig", newline="")
+            self._escritor_rechazos = csv.DictWriter(self._archivo_rechazos, COLUMNAS_RECHAZO, extrasaction="ignore")
+            self._escritor_rechazos.writeheader()
+        primera_con_error = min(errores)
+        for numero, fila in grupo:
+            motivo = errores.get(numero) or f"Cotización rechazada por la fila {primera_con_error}"
+            self._escritor_rechazos.writerow({**fila, "fila": numero, "motivo": motivo})
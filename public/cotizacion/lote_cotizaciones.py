@@ -0,0 +1,353 @@
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+from dataclasses import dataclass
+from itertools import islice
+
+from cache_pdf import TAMANO_MAXIMO, CachePDF, clave_cotizacion
+from folios import AsignadorFolios, FolioDuplicado, folio_numerico
+from importador import ImportadorCotizaciones
+from metricas import METRICAS, resumir
+from motor_cotizacion import Cotizacion, leer_registros, nombre_archivo, renderizar_bytes, renderizar_combinado, renderizar_pdf
+from paquete_pdf import PaqueteZip
+
+
+# Generación de cotizaciones por lotes sin interfaz gráfica.
+# Uso: python lote_cotizaciones.py cotizaciones.jsonl -o salida/ --workers 16
+#
+# Los trabajos se envían al pool en bloques y como máximo hay
+# `workers * BLOQUES_EN_VUELO` bloques pendientes, así un archivo con miles de
+# cotizaciones no se carga completo en memoria. Los resultados se entregan en
+# el mismo orden de la entrada.
+#
+# Con --cache DIR las cotizaciones que no cambiaron desde la ejecución
+# anterior se copian desde la caché de PDFs en vez de renderizarse.
+#
+# Las planillas .csv y .xlsx pasan por ImportadorCotizaciones: se validan con
+# las reglas del formulario antes de renderizar (un alto vacío rechaza la
+# cotización en vez de tomarse como 0) y, con --rechazos ARCHIVO, las filas
+# inválidas se escriben en ese archivo con el motivo.
+#
+# Con --asignar-folios las cotizaciones sin folio reciben uno del asignador
+# compartido (folios.py). El proceso principal reserva bloques de
+# --bloque-folios números y los reparte antes de enviar los trabajos, así los
+# workers nunca consultan la base; los folios de los PDF generados se
+# confirman en grupos y lo que sobra del último bloque se devuelve.
+#
+# Con --metricas ARCHIVO (.json o .prom) se miden las etapas de cada PDF en
+# todos los workers y se vuelcan sumadas al terminar; --perfil DIR guarda un
+# perfil cProfile por cotización y --memoria mide el pico con tracemalloc.
+#
+# Para envíos masivos e impresión, --zip ARCHIVO (o "-" para la salida
+# estándar) junta un PDF por cotización en un solo zip y --combinado ARCHIVO
+# arma un único PDF con un marcador por folio. En ambos casos los PDF se
+# generan en memoria y se escribe un solo archivo, no miles en la carpeta
+# compartida. --combinado es un solo documento de reportlab: no usa el pool.
+
+BLOQUES_EN_VUELO = 2
+CONFIRMAR_CADA = 500
+
+# Una CachePDF por proceso, creada la primera vez que un trabajo la usa. Las
+# de los trabajos no tienen límite; el tamaño máximo lo hace cumplir el
+# proceso principal con el índice de renderizar_lote.
+_caches = {}
+
+
+@dataclass
+class ResultadoTrabajo:
+    indice: int
+    folio: str
+    empresa: str = ""
+    ruta: str = None
+    error: str = None
+    desde_cache: bool = False
+    contenido: bytes = None
+    # Entrada de la caché usada o creada, para el índice del proceso principal
+    clave: str = None
+    tamano: int = 0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _obtener_cache(configuracion):
+    if configuracion is None:
+        return None
+    if configuracion not in _caches:
+        _caches[configuracion] = CachePDF(*configuracion)
+    return _caches[configuracion]
+
+
+def renderizar_registro(indice, datos, directorio, cache=None):
+    # Un registro inválido o un fallo de reportlab se reporta en el resultado
+    # en vez de detener el lote completo. datos es un diccionario o una
+    # Cotizacion ya validada por el importador. Con directorio=None el PDF
+    # vuelve en resultado.contenido en vez de escribirse.
+    ya_validada = isinstance(datos, Cotizacion)
+    folio = datos.folio if ya_validada else str(datos.get("folio") or "")
+    try:
+        cotizacion = datos if ya_validada else Cotizacion.desde_dict(datos)
+        if directorio is None:
+            if cache is None:
+                return ResultadoTrabajo(indice, folio, cotizacion.empresa, ruta=nombre_archivo(cotizacion),
+                                        contenido=renderizar_bytes(cotizacion))
+            clave = clave_cotizacion(cotizacion)
+            contenido, desde_cache = cache.renderizar(cotizacion, clave)
+            return ResultadoTrabajo(indice, folio, cotizacion.empresa, ruta=nombre_archivo(cotizacion),
+                                    desde_cache=desde_cache, contenido=contenido,
+                                    clave=clave, tamano=len(contenido))
+        ruta = os.path.join(directorio, nombre_archivo(cotizacion))
+        if cache is None:
+            renderizar_pdf(cotizacion, ruta)
+            return ResultadoTrabajo(indice, folio, cotizacion.empresa, ruta=ruta)
+        clave = clave_cotizacion(cotizacion)
+        contenido, desde_cache = cache.renderizar(cotizacion, clave)
+        with open(ruta, "wb") as archivo:
+            archivo.write(contenido)
+        return ResultadoTrabajo(indice, folio, cotizacion.empresa, ruta=ruta, desde_cache=desde_cache,
+                                clave=clave, tamano=len(contenido))
+    except Exception as error:
+        return ResultadoTrabajo(indice, folio, error=f"{type(error).__name__}: {error}")
+
+
+def _renderizar_bloque(bloque, directorio, directorio_cache=None, configuracion_metricas=None):
+    # Devuelve los resultados y, si se pidieron métricas, lo que este proceso
+    # midió en el bloque (el proceso principal lo suma)
+    cache = _obtener_cache((directorio_cache, None) if directorio_cache else None)
+    if configuracion_metricas is not None:
+        METRICAS.configurar(*configuracion_metricas)
+    resultados = [renderizar_registro(indice, datos, directorio, cache) for indice, datos in bloque]
+    return resultados, METRICAS.extraer() if configuracion_metricas is not None else None
+
+
+def _bloques(registros, tamano_bloque):
+    numerados = enumerate(registros)
+    while True:
+        bloque = list(islice(numerados, tamano_bloque))
+        if not bloque:
+            return
+        yield bloque
+
+
+def renderizar_lote(registros, directorio, workers=None, tamano_bloque=20, progreso=None, cache=None):
+    # Genera los ResultadoTrabajo en orden de entrada. Con workers=1 se
+    # renderiza en el mismo proceso (útil para depurar). cache es una tupla
+    # (directorio, tamano_maximo) para CachePDF: los workers leen y escriben
+    # en el directorio y este proceso anota cada resultado en un solo índice,
+    # que desaloja lo menos usado al pasar el máximo.
+    # Con directorio=None los PDF vuelven en memoria (ver renderizar_registro).
+    if directorio is not None:
+        os.makedirs(directorio, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    metricas = METRICAS.configuracion() if METRICAS.activa else None
+    indice_cache = CachePDF(*cache) if cache else None
+    directorio_cache = cache[0] if cache else None
+    hechos = 0
+
+    if workers == 1:
+        for bloque in _bloques(registros, tamano_bloque):
+            resultados, medido = _renderizar_bloque(bloque, directorio, directorio_cache, metricas)
+            if medido is not None:
+                METRICAS.combinar(medido)
+            for resultado in resultados:
+                if indice_cache and resultado.clave:
+                    indice_cache.registrar(resultado.clave, resultado.tamano)
+                hechos += 1
+                if progreso:
+                    progreso(hechos, resultado)
+                yield resultado
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pendientes = deque()
+        bloques = _bloques(registros, tamano_bloque)
+        for bloque in islice(bloques, workers * BLOQUES_EN_VUELO):
+            pendientes.append(pool.submit(_renderizar_bloque, bloque, directorio, directorio_cache, metricas))
+        while pendientes:
+            resultados, medido = pendientes.popleft().result()
+            if medido is not None:
+                METRICAS.combinar(medido)
+            siguiente = next(bloques, None)
+            if siguiente is not None:
+                pendientes.append(pool.submit(_renderizar_bloque, siguiente, directorio, directorio_cache, metricas))
+            for resultado in resultados:
+                if indice_cache and resultado.clave:
+                    indice_cache.registrar(resultado.clave, resultado.tamano)
+                hechos += 1
+                if progreso:
+                    progreso(hechos, resultado)
+                yield resultado
+
+
+def empaquetar(resultados, paquete, progreso=None):
+    # Agrega al zip los PDF de los resultados a medida que llegan (en orden)
+    for hechos, resultado in enumerate(resultados, start=1):
+        if resultado.ok:
+            resultado.ruta = paquete.agregar(resultado.ruta, resultado.contenido)
+            resultado.contenido = None
+        if progreso:
+            progreso(hechos, resultado)
+        yield resultado
+
+
+def renderizar_lote_combinado(registros, destino, progreso=None):
+    # Valida los registros y genera un solo PDF con los válidos. Los
+    # resultados se entregan al final, cuando el documento está escrito.
+    resultados = []
+    cotizaciones = []
+    for indice, datos in enumerate(registros):
+        ya_validada = isinstance(datos, Cotizacion)
+        folio = datos.folio if ya_validada else str(datos.get("folio") or "")
+        try:
+            cotizacion = datos if ya_validada else Cotizacion.desde_dict(datos)
+            if not cotizacion.folio.strip():
+                raise ValueError("No se puede generar el PDF sin rellenar el folio.")
+        except ValueError as error:
+            resultados.append(ResultadoTrabajo(indice, folio, error=f"{type(error).__name__}: {error}"))
+            continue
+        cotizaciones.append(cotizacion)
+        resultados.append(ResultadoTrabajo(indice, folio, cotizacion.empresa, ruta=destino))
+    if cotizaciones:
+        try:
+            renderizar_combinado(cotizaciones, destino)
+        except Exception as error:
+            mensaje = f"{type(error).__name__}: {error}"
+            for resultado in resultados:
+                if resultado.ok:
+                    resultado.ruta, resultado.error = None, mensaje
+    for hechos, resultado in enumerate(resultados, start=1):
+        if progreso:
+            progreso(hechos, resultado)
+        yield resultado
+
+
+def asignar_folios(registros, asignador):
+    # Completa el folio de los registros que no lo traen
+    for datos in registros:
+        if isinstance(datos, Cotizacion):
+            if not datos.folio.strip():
+                datos.folio = str(asignador.siguiente())
+        elif not str(datos.get("folio") or "").strip() and not datos.get("_error"):
+            datos["folio"] = str(asignador.siguiente())
+        yield datos
+
+
+def _confirmar_folios(asignador, emitidos):
+    # Devuelve los mensajes de los folios duplicados (si los hay)
+    try:
+        with METRICAS.etapa("lote.confirmar_folios"):
+            asignador.confirmar_lote(emitidos)
+        return []
+    except FolioDuplicado:
+        pass
+    duplicados = []
+    for folio, empresa in emitidos:
+        try:
+            asignador.confirmar(folio, empresa)
+        except FolioDuplicado as error:
+            duplicados.append(str(error))
+    return duplicados
+
+
+def _mostrar_progreso(hechos, resultado):
+    if resultado.ok:
+        origen = " (desde caché)" if resultado.desde_cache else ""
+        print(f"[{hechos}] PDF generado correctamente en {resultado.ruta}{origen}")
+    else:
+        print(f"[{hechos}] Error en folio {resultado.folio or '(sin folio)'}: {resultado.error}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera cotizaciones PDF por lotes desde un archivo CSV o JSON-lines.")
+    parser.add_argument("entrada", help="Archivo .csv, .xlsx o .jsonl con las cotizaciones")
+    parser.add_argument("-o", "--salida", default="cotizaciones", help="Directorio donde se escriben los PDF")
+    parser.add_argument("--zip", help="Escribir todos los PDF en un solo .zip ('-' para la salida estándar)")
+    parser.add_argument("--combinado", help="Escribir un solo PDF con todas las cotizaciones y un marcador por folio")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos en paralelo (por defecto, uno por núcleo)")
+    parser.add_argument("--bloque", type=int, default=20, help="Cotizaciones por trabajo enviado al pool")
+    parser.add_argument("--cache", help="Directorio de la caché de PDFs (omite las cotizaciones sin cambios)")
+    parser.add_argument("--cache-max-mb", type=int, default=TAMANO_MAXIMO // (1024 * 1024), help="Tamaño máximo de la caché en MB")
+    parser.add_argument("--rechazos", help="CSV donde escribir las filas inválidas de la planilla (con el motivo)")
+    parser.add_argument("--asignar-folios", action="store_true", help="Asignar folio a las cotizaciones que no lo traen")
+    parser.add_argument("--bloque-folios", type=int, default=500, help="Folios reservados por cada acceso a la base de folios")
+    parser.add_argument("--folios-db", help="Base de folios (por defecto COTIZACIONES_FOLIOS_DB o junto al almacén)")
+    parser.add_argument("--metricas", help="Archivo .json o .prom donde volcar los tiempos por etapa")
+    parser.add_argument("--perfil", help="Directorio donde guardar un perfil cProfile por cotización")
+    parser.add_argument("--memoria", action="store_true", help="Medir el pico de memoria de cada cotización (lento)")
+    parser.add_argument("-q", "--silencioso", action="store_true", help="No mostrar cada PDF generado")
+    args = parser.parse_args(argv)
+    if args.zip and args.combinado:
+        parser.error("--zip y --combinado no se pueden usar juntos")
+
+    # Con --zip - el zip ocupa la salida estándar y los mensajes van a stderr
+    destino_zip = sys.stdout.buffer if args.zip == "-" else args.zip
+    with redirect_stdout(sys.stderr) if args.zip == "-" else nullcontext():
+        return _ejecutar(args, destino_zip)
+
+
+def _ejecutar(args, destino_zip):
+    cache = (args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    if args.metricas or args.perfil or args.memoria:
+        METRICAS.configurar(perfiles=args.perfil, memoria=args.memoria)
+    importador = None
+    if os.path.splitext(args.entrada)[1].lower() in (".csv", ".xlsx", ".xlsm"):
+        importador = registros = ImportadorCotizaciones(args.entrada, args.rechazos, exigir_folio=not args.asignar_folios)
+    else:
+        registros = leer_registros(args.entrada)
+    # Los folios se confirman (y se detectan duplicados) solo si se pidió el asignador
+    asignador = None
+    if args.asignar_folios:
+        opciones = {"ruta": args.folios_db} if args.folios_db else {}
+        asignador = AsignadorFolios(tamano_bloque=args.bloque_folios, **opciones)
+        registros = asignar_folios(registros, asignador)
+    por_confirmar = []
+    duplicados = []
+    generados = errores = desde_cache = 0
+    progreso = None if args.silencioso else _mostrar_progreso
+    paquete = None
+    if args.combinado:
+        resultados = renderizar_lote_combinado(registros, args.combinado, progreso)
+    elif args.zip:
+        paquete = PaqueteZip(destino_zip)
+        resultados = empaquetar(renderizar_lote(registros, None, args.workers, args.bloque, cache=cache), paquete, progreso)
+    else:
+        resultados = renderizar_lote(registros, args.salida, args.workers, args.bloque, progreso, cache)
+    for resultado in resultados:
+        if resultado.ok:
+            generados += 1
+            desde_cache += resultado.desde_cache
+            if asignador is not None and folio_numerico(resultado.folio) is not None:
+                por_confirmar.append((folio_numerico(resultado.folio), resultado.empresa))
+                if len(por_confirmar) >= CONFIRMAR_CADA:
+                    duplicados += _confirmar_folios(asignador, por_confirmar)
+                    por_confirmar = []
+        else:
+            errores += 1
+    if paquete is not None:
+        paquete.cerrar()
+    if asignador is not None:
+        duplicados += _confirmar_folios(asignador, por_confirmar)
+        asignador.devolver_sobrantes()
+        asignador.cerrar()
+        for mensaje in duplicados:
+            print(f"Folio duplicado: {mensaje}", file=sys.stderr)
+    salida = args.combinado or (args.zip if args.zip != "-" else "la salida estándar") or args.salida
+    print(f"{generados} cotizaciones generadas en {salida}, {errores} con errores")
+    if cache:
+        print(f"Caché: {desde_cache} aciertos, {generados - desde_cache} renderizadas")
+    if importador is not None and importador.rechazadas:
+        destino = f" (detalle en {args.rechazos})" if args.rechazos else " (usa --rechazos ARCHIVO para ver el motivo)"
+        print(f"{importador.rechazadas} cotizaciones rechazadas por validación, {importador.filas_rechazadas} filas{destino}")
+    if METRICAS.activa:
+        print(resumir(METRICAS.instantanea()))
+        if args.metricas:
+            METRICAS.volcar(args.metricas)
+    return 1 if errores or duplicados or (importador is not None and importador.rechazadas) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
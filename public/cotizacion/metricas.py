@@ -0,0 +1,319 @@
+import argparse
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+
+# Instrumentación opcional del flujo de cotizaciones.
+# METRICAS registra histogramas de duración por etapa y contadores; apagada
+# (lo normal) cada etapa cuesta una llamada que devuelve un nullcontext.
+#
+# Etapas de renderizar_pdf: pdf.datos (armar los elementos), pdf.tabla (armar
+# y maquetar las tablas de detalle), pdf.dibujo (build de reportlab),
+# pdf.serializacion (generar los bytes del PDF) y pdf.escritura (escribir al
+# destino). Si pdf.escritura domina, el cuello de botella es el disco o la
+# carpeta de red y no reportlab.
+#
+# Opcionalmente cada trabajo guarda un perfil cProfile (.prof, se lee con
+# pstats o snakeviz) y el pico de memoria medido con tracemalloc. tracemalloc
+# hace todo bastante más lento: sirve para comparar, no para medir tiempos.
+#
+# Se activa con metricas.METRICAS.configurar(...) o, para la app, con las
+# variables COTIZACIONES_METRICAS (archivo donde volcar al cerrar, .json o
+# .prom para el formato de texto de Prometheus), COTIZACIONES_PERFILES
+# (directorio de perfiles) y COTIZACIONES_MEMORIA=1.
+#
+# Uso: python metricas.py metricas.json   (resumen por etapa)
+
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_BYTES = tuple(2 ** potencia for potencia in range(16, 31, 2))
+PREFIJO_PROMETHEUS = "cotizaciones"
+
+_SIN_MEDIR = nullcontext()
+
+
+class Histograma:
+    # Cuentas por tramo (la última es "mayor que todos los límites")
+    __slots__ = ("limites", "cuentas", "suma", "cantidad", "maximo")
+
+    def __init__(self, limites=LIMITES_SEGUNDOS):
+        self.limites = tuple(limites)
+        self.cuentas = [0] * (len(self.limites) + 1)
+        self.suma = 0
+        self.cantidad = 0
+        self.maximo = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cantidad += 1
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, fraccion):
+        # Estimado por el límite superior del tramo (acotado por el máximo)
+        objetivo = fraccion * self.cantidad
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            if cuenta and acumulado >= objetivo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def a_dict(self):
+        return {
+            "limites": list(self.limites), "cuentas": list(self.cuentas),
+            "suma": self.suma, "cantidad": self.cantidad, "maximo": self.maximo,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        histograma = cls(datos["limites"])
+        histograma.cuentas = list(datos["cuentas"])
+        histograma.suma = datos["suma"]
+        histograma.cantidad = datos["cantidad"]
+        histograma.maximo = datos["maximo"]
+        return histograma
+
+    def combinar(self, otro):
+        if otro.limites != self.limites:
+            raise ValueError("No se pueden combinar histogramas con límites distintos")
+        self.cuentas = [a + b for a, b in zip(self.cuentas, otro.cuentas)]
+        self.suma += otro.suma
+        self.cantidad += otro.cantidad
+        self.maximo = max(self.maximo, otro.maximo)
+
+
+class Metricas:
+    def __init__(self):
+        self.activa = False
+        self.perfiles = None
+        self.memoria = False
+        self._candado = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._trabajos = 0
+
+    def configurar(self, activa=True, perfiles=None, memoria=False):
+        self.activa = activa
+        self.perfiles = perfiles
+        self.memoria = memoria
+        if perfiles:
+            os.makedirs(perfiles, exist_ok=True)
+
+    def configuracion(self):
+        # Para repetir la misma configuración en los procesos del pool
+        return self.activa, self.perfiles, self.memoria
+
+    def contar(self, nombre, cantidad=1):
+        if not self.activa:
+            return
+        with self._candado:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def observar(self, nombre, valor, limites=LIMITES_SEGUNDOS):
+        if not self.activa:
+            return
+        with self._candado:
+            histograma = self._histogramas.get(nombre)
+            if histograma is None:
+                histograma = self._histogramas[nombre] = Histograma(limites)
+            histograma.observar(valor)
+
+    def etapa(self, nombre):
+        # with METRICAS.etapa("pdf.dibujo"): ... registra la duración en segundos
+        if not self.activa:
+            return _SIN_MEDIR
+        return self._cronometrar(nombre)
+
+    @contextmanager
+    def _cronometrar(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio)
+
+    def trabajo(self, nombre, etiqueta=""):
+        # Un trabajo completo (por ejemplo un PDF): cuenta, cronometra y, si se
+        # pidió, perfila y mide memoria. Los errores se cuentan en nombre.errores.
+        if not self.activa:
+            return _SIN_MEDIR
+        return self._medir_trabajo(nombre, etiqueta)
+
+    @contextmanager
+    def _medir_trabajo(self, nombre, etiqueta):
+        perfil = None
+        if self.perfiles:
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Otro trabajo ya se está perfilando (hilos en paralelo)
+                perfil = None
+        # tracemalloc es global al proceso: solo mide quien lo inicia
+        medir_memoria = self.memoria and not tracemalloc.is_tracing()
+        if medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.contar(f"{nombre}.errores")
+            raise
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio)
+            if medir_memoria:
+                self.observar(f"{nombre}.memoria_pico", tracemalloc.get_traced_memory()[1], LIMITES_BYTES)
+                tracemalloc.stop()
+            if perfil is not None:
+                perfil.disable()
+                with self._candado:
+                    self._trabajos += 1
+                    numero = self._trabajos
+                seguro = re.sub(r"[^\w.-]+", "_", etiqueta.strip())
+                partes = [nombre, seguro, str(os.getpid()), str(numero)]
+                perfil.dump_stats(os.path.join(self.perfiles, "-".join(p for p in partes if p) + ".prof"))
+        self.contar(nombre)
+
+    def instantanea(self):
+        with self._candado:
+            return self._instantanea()
+
+    def _instantanea(self):
+        return {
+            "contadores": dict(self._contadores),
+            "histogramas": {nombre: h.a_dict() for nombre, h in self._histogramas.items()},
+        }
+
+    def extraer(self):
+        # Instantánea y reinicio en un solo paso (lo que acumuló un worker)
+        with self._candado:
+            instantanea = self._instantanea()
+            self._contadores = {}
+            self._histogramas = {}
+        return instantanea
+
+    def combinar(self, instantanea):
+        with self._candado:
+            for nombre, cantidad in instantanea["contadores"].items():
+                self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+            for nombre, datos in instantanea["histogramas"].items():
+                otro = Histograma.desde_dict(datos)
+                if nombre in self._histogramas:
+                    self._histogramas[nombre].combinar(otro)
+                else:
+                    self._histogramas[nombre] = otro
+
+    def reiniciar(self):
+        self.extraer()
+
+    def a_json(self):
+        return json.dumps(self.instantanea(), indent=2, ensure_ascii=False, sort_keys=True)
+
+    def a_prometheus(self):
+        return a_prometheus(self.instantanea())
+
+    def volcar(self, ruta):
+        # .prom o .txt: formato de texto de Prometheus; cualquier otra, JSON
+        formato = os.path.splitext(ruta)[1].lower()
+        texto = self.a_prometheus() if formato in (".prom", ".txt") else self.a_json() + "\n"
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.write(texto)
+        os.replace(temporal, ruta)
+
+
+def _nombre_prometheus(nombre):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", nombre)
+
+
+def a_prometheus(instantanea):
+    # Duraciones como un solo histograma con la etapa como etiqueta; los
+    # picos de memoria en bytes, cada uno con su nombre. El formato de texto
+    # exige que las líneas de una familia vayan juntas: primero todas las
+    # etapas y después los histogramas de bytes.
+    lineas = []
+    for nombre, cantidad in sorted(instantanea["contadores"].items()):
+        metrica = f"{PREFIJO_PROMETHEUS}_{_nombre_prometheus(nombre)}_total"
+        lineas += [f"# TYPE {metrica} counter", f"{metrica} {cantidad}"]
+    histogramas = sorted(instantanea["histogramas"].items())
+    etapas = [(nombre, datos) for nombre, datos in histogramas if tuple(datos["limites"]) == LIMITES_SEGUNDOS]
+    if etapas:
+        metrica = f"{PREFIJO_PROMETHEUS}_etapa_seconds"
+        lineas.append(f"# TYPE {metrica} histogram")
+        for nombre, datos in etapas:
+            _lineas_histograma(lineas, metrica, f'etapa="{nombre}"', datos)
+    for nombre, datos in histogramas:
+        if tuple(datos["limites"]) != LIMITES_SEGUNDOS:
+            metrica = f"{PREFIJO_PROMETHEUS}_{_nombre_prometheus(nombre)}_bytes"
+            lineas.append(f"# TYPE {metrica} histogram")
+            _lineas_histograma(lineas, metrica, "", datos)
+    return "\n".join(lineas) + "\n"
+
+
+def _lineas_histograma(lineas, metrica, etiqueta, datos):
+    acumulado = 0
+    for limite, cuenta in zip(datos["limites"] + ["+Inf"], datos["cuentas"]):
+        acumulado += cuenta
+        etiquetas = f'{etiqueta},le="{limite}"' if etiqueta else f'le="{limite}"'
+        lineas.append(f"{metrica}_bucket{{{etiquetas}}} {acumulado}")
+    etiqueta = f"{{{etiqueta}}}" if etiqueta else ""
+    lineas.append(f"{metrica}_sum{etiqueta} {datos['suma']}")
+    lineas.append(f"{metrica}_count{etiqueta} {datos['cantidad']}")
+
+
+def resumir(instantanea):
+    # Tabla legible: una línea por histograma y luego los contadores
+    lineas = [f"{'etapa':28} {'n':>7} {'total':>10} {'media':>10} {'p50':>10} {'p95':>10} {'máx':>10}"]
+    for nombre, datos in sorted(instantanea["histogramas"].items()):
+        histograma = Histograma.desde_dict(datos)
+        if histograma.limites == LIMITES_SEGUNDOS:
+            formato = lambda valor: f"{valor * 1000:8.2f}ms"
+        else:
+            formato = lambda valor: f"{valor / 1024 / 1024:8.2f}MB"
+        media = histograma.suma / histograma.cantidad if histograma.cantidad else 0
+        lineas.append(
+            f"{nombre:28} {histograma.cantidad:7} {formato(histograma.suma):>10} {formato(media):>10} "
+            f"{formato(histograma.percentil(0.5)):>10} {formato(histograma.percentil(0.95)):>10} "
+            f"{formato(histograma.maximo):>10}"
+        )
+    for nombre, cantidad in sorted(instantanea["contadores"].items()):
+        lineas.append(f"{nombre:28} {cantidad:7}")
+    return "\n".join(lineas)
+
+
+METRICAS = Metricas()
+if os.environ.get("COTIZACIONES_METRICAS") or os.environ.get("COTIZACIONES_PERFILES"):
+    METRICAS.configurar(
+        perfiles=os.environ.get("COTIZACIONES_PERFILES") or None,
+        memoria=os.environ.get("COTIZACIONES_MEMORIA") == "1",
+    )
+
+
+def volcar_al_cerrar():
+    # Para la app: vuelca en COTIZACIONES_METRICAS si está definida
+    ruta = os.environ.get("COTIZACIONES_METRICAS")
+    if ruta and METRICAS.activa:
+        METRICAS.volcar(ruta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Muestra un volcado JSON de métricas de cotizaciones.")
+    parser.add_argument("archivo", help="Archivo .json generado con --metricas o COTIZACIONES_METRICAS")
+    parser.add_argument("--prometheus", action="store_true", help="Convertir al formato de texto de Prometheus")
+    args = parser.parse_args(argv)
+    with open(args.archivo, encoding="utf-8") as archivo:
+        instantanea = json.load(archivo)
+    sys.stdout.write(a_prometheus(instantanea) if args.prometheus else resumir(instantanea) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
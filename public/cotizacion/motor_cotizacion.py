@@ -0,0 +1,253 @@
+import csv
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from detalles import LineaDetalle, TablaDetalles
+from metricas import METRICAS
+from precios import calcular_iva
+
+
+# Motor de cotizaciones independiente de la interfaz Tk.
+# Recibe registros planos (sin widgets) y escribe el PDF en una ruta o en
+# cualquier objeto tipo archivo, de modo que sirve tanto para CotizacionApp
+# como para el modo por lotes sin pantalla.
+
+CAMPOS_CABECERA = [
+    "folio", "atencion", "empresa", "fecha_evento", "fecha_montaje",
+    "fecha_desarme", "lugar_evento", "forma_pago", "fecha",
+]
+
+
+def formatear_dinero(valor):
+    return "{:,}".format(int(valor)).replace(",", ".")
+
+
+def formatear_folio(folio):
+    # Los folios numéricos se muestran con separador de miles; el resto tal cual
+    try:
+        return formatear_dinero(folio)
+    except ValueError:
+        return folio
+
+
+FORMATOS_FECHA = ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%y"]
+
+
+@lru_cache(maxsize=4096)
+def leer_fecha(texto):
+    # Fechas escritas a mano en el formulario ("15/12/2026", "15-12-2026",
+    # "2026-12-15", "15 / 12 / 2026"...). Devuelve None si no se reconoce.
+    texto = re.sub(r"\s*([/.-])\s*", r"\1", (texto or "").strip())
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def calcular_totales(tabla_datos):
+    # Recalcula neto, IVA y bruto recorriendo todas las líneas. TablaDetalles
+    # ya los mantiene al día; esto queda como referencia y para listas sueltas.
+    with METRICAS.etapa("totales.calcular"):
+        neto = sum(linea.total for linea in tabla_datos)
+        iva = calcular_iva(neto)
+    return neto, iva, neto + iva
+
+
+@dataclass
+class Cotizacion:
+    folio: str = ""
+    atencion: str = ""
+    empresa: str = ""
+    tabla_datos: TablaDetalles = field(default_factory=TablaDetalles)
+    descripcion_datos: list = field(default_factory=list)
+    fecha_evento: str = ""
+    fecha_montaje: str = ""
+    fecha_desarme: str = ""
+    lugar_evento: str = ""
+    forma_pago: str = ""
+    fecha: str = field(default_factory=lambda: datetime.now().strftime("%d / %m / %Y"))
+
+    @classmethod
+    def desde_dict(cls, datos):
+        if datos.get("_error"):
+            raise ValueError(datos["_error"])
+        # Acepta los detalles como tuplas de 6 valores (igual que tabla_datos en la
+        # app) o como diccionarios; si faltan total_mts o total se calculan.
+        tabla_datos = TablaDetalles(_normalizar_detalle(detalle) for detalle in datos.get("tabla_datos") or [])
+        valores = {
+            campo: str(datos[campo]) for campo in CAMPOS_CABECERA
+            if datos.get(campo) not in (None, "")
+        }
+        return cls(
+            tabla_datos=tabla_datos,
+            descripcion_datos=[str(d) for d in datos.get("descripcion_datos") or []],
+            **valores,
+        )
+
+    def a_dict(self):
+        datos = {campo: getattr(self, campo) for campo in CAMPOS_CABECERA}
+        datos["tabla_datos"] = [linea.a_dict() for linea in self.tabla_datos]
+        datos["descripcion_datos"] = list(self.descripcion_datos)
+        return datos
+
+    def totales(self):
+        return self.tabla_datos.totales()
+
+
+def _normalizar_detalle(detalle):
+    if isinstance(detalle, LineaDetalle):
+        return detalle
+    if isinstance(detalle, dict):
+        largo = detalle.get("largo", "")
+        alto = detalle.get("alto", "")
+        valor_m2 = detalle.get("valor_m2", "")
+        total_mts = detalle.get("total_mts")
+        total = detalle.get("total")
+        detalle = (detalle.get("detalle", ""), largo, alto, total_mts, valor_m2, total)
+    detalle = list(detalle)
+    if len(detalle) == 4:
+        # detalle, largo, alto, valor_m2
+        detalle = [detalle[0], detalle[1], detalle[2], None, detalle[3], None]
+    if len(detalle) != 6:
+        raise ValueError(f"Detalle inválido: {detalle!r}")
+    return LineaDetalle.desde_textos(*detalle)
+
+
+def nombre_archivo(cotizacion):
+    # Nombre de archivo seguro a partir del folio
+    folio = re.sub(r"[^\w.-]+", "_", cotizacion.folio.strip()) or "sin_folio"
+    return f"cotizacion_{folio}.pdf"
+
+
+# El dibujo del PDF vive en plantilla_pdf, que importa reportlab. Se carga
+# recién al primer renderizado (o con precargar desde un hilo) para no pagar
+# ese import al abrir la app. Cambiar cualquier dibujo de la plantilla implica
+# subir VERSION_PLANTILLA (es parte de la clave de cache_pdf).
+
+VERSION_PLANTILLA = 2
+
+
+def precargar():
+    import plantilla_pdf  # noqa: F401
+
+
+def renderizar_pdf(cotizacion, destino, progreso=None):
+    # destino puede ser una ruta o un objeto tipo archivo (por ejemplo BytesIO).
+    # progreso(pagina) se llama tras cada elemento dibujado.
+    if not cotizacion.folio.strip():
+        raise ValueError("No se puede generar el PDF sin rellenar el folio.")
+
+    with METRICAS.trabajo("pdf", cotizacion.folio):
+        from plantilla_pdf import DocumentoCotizacion, flowables_cotizacion
+        with METRICAS.etapa("pdf.datos"):
+            documento = DocumentoCotizacion(destino, cotizacion, progreso)
+            flowables = list(flowables_cotizacion(cotizacion))
+        _construir(documento, flowables, destino)
+
+
+def renderizar_combinado(cotizaciones, destino, progreso=None):
+    # Un solo PDF con todas las cotizaciones, cada una desde una página nueva
+    # y con un marcador por folio (para imprimir o enviar en un solo archivo).
+    # Las partes fijas de la plantilla se incrustan una sola vez.
+    cotizaciones = list(cotizaciones)
+    if not cotizaciones:
+        raise ValueError("No hay cotizaciones para combinar.")
+    for cotizacion in cotizaciones:
+        if not cotizacion.folio.strip():
+            raise ValueError("No se puede generar el PDF sin rellenar el folio.")
+
+    with METRICAS.trabajo("pdf_combinado"):
+        from plantilla_pdf import DocumentoCotizacion, flowables_combinadas
+        with METRICAS.etapa("pdf.datos"):
+            documento = DocumentoCotizacion(destino, cotizaciones[0], progreso, combinado=True)
+            flowables = list(flowables_combinadas(cotizaciones))
+        _construir(documento, flowables, destino)
+
+
+def renderizar_bytes(cotizacion):
+    # El PDF completo en memoria, sin pasar por un archivo
+    buffer = BytesIO()
+    renderizar_pdf(cotizacion, buffer)
+    return buffer.getvalue()
+
+
+def _construir(documento, flowables, destino):
+    # build sin guardar: los bytes se generan y escriben aparte para
+    # separar el tiempo de reportlab del de disco
+    documento._doSave = 0
+    with METRICAS.etapa("pdf.dibujo"):
+        documento.build(flowables)
+    with METRICAS.etapa("pdf.serializacion"):
+        contenido = documento.pdf()
+    with METRICAS.etapa("pdf.escritura"):
+        if hasattr(destino, "write"):
+            destino.write(contenido)
+        else:
+            with open(destino, "wb") as archivo:
+                archivo.write(contenido)
+    METRICAS.contar("pdf.paginas", documento.page)
+    METRICAS.contar("pdf.bytes", len(contenido))
+
+
+# Lectura de cotizaciones para el modo por lotes
+
+def leer_cotizaciones(ruta):
+    for datos in leer_registros(ruta):
+        yield Cotizacion.desde_dict(datos)
+
+
+def leer_registros(ruta):
+    # Devuelve diccionarios sin validar para que cada trabajo del lote pueda
+    # convertirlos y reportar su propio error.
+    # .jsonl: una cotización por línea. .csv: una fila por detalle; las filas
+    # consecutivas con el mismo folio forman una sola cotización.
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in (".jsonl", ".json", ".ndjson"):
+        return leer_jsonl(ruta)
+    if extension == ".csv":
+        return leer_csv(ruta)
+    raise ValueError(f"Formato de entrada no soportado: {extension}")
+
+
+def leer_jsonl(ruta):
+    with open(ruta, encoding="utf-8") as archivo:
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+            except json.JSONDecodeError as error:
+                yield {"_error": f"Línea {numero}: JSON inválido ({error.msg})"}
+                continue
+            # Un número o una lista es JSON válido pero no una cotización
+            if not isinstance(datos, dict):
+                yield {"_error": f"Línea {numero}: se esperaba un objeto JSON, no {type(datos).__name__}"}
+                continue
+            yield datos
+
+
+def leer_csv(ruta):
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        actual = None
+        for fila in csv.DictReader(archivo):
+            folio = (fila.get("folio") or "").strip()
+            if actual is None or folio != actual["folio"]:
+                if actual is not None:
+                    yield actual
+                actual = {campo: fila.get(campo) for campo in CAMPOS_CABECERA}
+                actual["folio"] = folio
+                actual["tabla_datos"] = []
+                actual["descripcion_datos"] = []
+            if (fila.get("detalle") or "").strip():
+                actual["tabla_datos"].append(fila)
+            if (fila.get("descripcion") or "").strip():
+                actual["descripcion_datos"].append(fila["descripcion"].strip())
+        if actual is not None:
+            yield actual
@@ -0,0 +1,383 @@
+import threading
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import (
+    ActionFlowable, BaseDocTemplate, Flowable, Frame, KeepTogether, NextPageTemplate, PageBreak, PageTemplate,
+    Paragraph, Spacer, Table, TableStyle,
+)
+
+from metricas import METRICAS
+from motor_cotizacion import formatear_dinero, formatear_folio
+from recursos_pdf import ALTO_LOGO, ANCHO_LOGO, cargar_fuentes, cargar_logo
+
+
+# Dibujo del PDF con reportlab. Todo lo que usa reportlab está aquí;
+# motor_cotizacion lo carga recién al primer renderizado para que
+# la app y las herramientas que no generan PDFs arranquen rápido.
+
+# Plantilla de página: las partes fijas de la cotización (membrete, título,
+# rótulos del cliente, firma y pie de página) se compilan una sola vez por
+# documento como form XObject y cada página solo las referencia con doForm.
+# Los campos variables (fecha, folio, cliente) se dibujan encima.
+#
+# Las fuentes (Times o la TTF de la empresa) y el logo vienen de recursos_pdf,
+# que los carga una vez por proceso al importar este módulo.
+
+FUENTES = cargar_fuentes()
+LOGO = cargar_logo()
+
+# Flujos comprimidos en binario, sin la capa ASCII85 que reportlab agrega por
+# defecto: ~25 % menos bytes por flujo y sin codificarlos en Python puro (lo
+# que más pesa al incrustar el logo). Los PDF siguen siendo válidos para
+# cualquier visor; solo dejan de ser texto ASCII.
+#
+# reportlab no tiene esta opción por documento: lee rl_config.useA85 al
+# dibujar imágenes y al serializar. Por eso se apaga solo mientras
+# DocumentoCotizacion construye o serializa y se restaura al terminar (con
+# varios documentos en paralelo, al terminar el último). Otro documento de
+# reportlab que se genere en ese mismo momento en otro hilo también sale sin
+# ASCII85, lo que no cambia su contenido.
+_candado_a85 = threading.Lock()
+_documentos_sin_a85 = 0
+_a85_anterior = None
+
+
+@contextmanager
+def sin_ascii85():
+    global _documentos_sin_a85, _a85_anterior
+    with _candado_a85:
+        if not _documentos_sin_a85:
+            _a85_anterior = rl_config.useA85
+            rl_config.useA85 = 0
+        _documentos_sin_a85 += 1
+    try:
+        yield
+    finally:
+        with _candado_a85:
+            _documentos_sin_a85 -= 1
+            if not _documentos_sin_a85:
+                rl_config.useA85 = _a85_anterior
+
+FORM_MEMBRETE = "membrete"
+FORM_FIRMA = "firma"
+FORM_PIE = "pie"
+FIRMA_Y = 150
+PIE_Y = 50
+
+# Geometría del cuerpo paginado
+MARGEN_X = 70
+MARGEN_INFERIOR = 70
+TOPE_PRIMERA_PAGINA = 550
+TOPE_PAGINAS_SIGUIENTES = 720
+ALTO_FIRMA = FIRMA_Y + 20 - MARGEN_INFERIOR
+ALTO_FILA = 18
+ANCHOS_COLUMNAS = [70, 40, 40, 50, 50, 70]
+ENCABEZADO_TABLA = ["Detalle", "Largo", "Alto", "Total Mts", "Valor M2", "Total"]
+
+
+def _dibujar_membrete(c):
+    c.setFont(FUENTES.normal, 20)
+
+    # Encabezado
+    c.drawString(70, 750, "CARPAS GUAJARDO PROD. SPA")
+    c.setFont(FUENTES.normal, 11)
+    c.drawString(70, 735, "Rut: 77.011.105-6")
+    c.drawString(70, 720, "Isla Deceit N°8774")
+    c.drawString(70, 705, "Pudahuel")
+    c.drawString(70, 690, "cel: +569 45121257")
+
+    # Título
+    c.setFont(FUENTES.normal, 18)
+    c.drawString(250, 650, "COTIZACIÓN")
+    c.setLineWidth(0.3)
+    c.line(250, 645, 360, 645)  # Subrayar el título
+
+    # Rótulos del cliente
+    c.setFont(FUENTES.normal, 12)
+    c.drawString(70, 630, "CLIENTE:")
+    c.line(70, 628, 125, 628)  # Subrayar la palabra CLIENTE
+    c.drawString(70, 615, "ATENCION:")
+    c.line(170, 613, 360, 613)  # Subrayar la palabra ATENCION
+    c.drawString(70, 600, "EMPRESA:")
+    c.line(170, 598, 360, 598)  # Subrayar la palabra EMPRESA
+
+    # Título de la tabla
+    c.setFont(FUENTES.negrita, 12)
+    c.drawString(70, 570, "CUADRO DETALLE ARRIENDO CARPA ESCENARIO:")
+    c.line(70, 568, 370, 568)  # Subrayar el título
+
+    # Logo (opcional) en la esquina superior derecha
+    if LOGO is not None:
+        c.drawImage(LOGO, 542 - ANCHO_LOGO, 705, width=ANCHO_LOGO, height=ALTO_LOGO,
+                    preserveAspectRatio=True, anchor="ne", mask="auto")
+
+
+def _dibujar_firma(c):
+    c.setLineWidth(0.3)
+    c.setFont(FUENTES.normal, 12)
+    c.drawCentredString(300, FIRMA_Y, "Ariel Guajardo V.")
+    c.line(255, FIRMA_Y - 2, 343, FIRMA_Y - 2)  # Subrayar el nombre
+    c.setFont(FUENTES.cursiva, 12)
+    c.drawCentredString(300, FIRMA_Y - 15, "Carpas Guajardo Prod. Spa")
+    c.drawCentredString(300, FIRMA_Y - 30, "Fono: +56963436322 - +56945121257")
+
+
+def _dibujar_pie(c):
+    c.setFont(FUENTES.normal, 10)
+    c.drawCentredString(300, PIE_Y, "Carpas Guajardo")
+    c.drawCentredString(300, PIE_Y - 15, "Fono: +56945121257 - Cel. +56963436322")
+
+
+def compilar_plantilla(c):
+    # Define los forms en el documento del lienzo; es idempotente
+    if c.hasForm(FORM_MEMBRETE):
+        return
+    for nombre, dibujar in ((FORM_MEMBRETE, _dibujar_membrete), (FORM_FIRMA, _dibujar_firma), (FORM_PIE, _dibujar_pie)):
+        c.beginForm(nombre)
+        dibujar(c)
+        c.endForm()
+
+
+# Flowables del cuerpo
+
+ESTILO_TABLA = [
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),              # Alinear los números a la derecha
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),            # Centrar verticalmente dentro de las celdas
+    ('FONTNAME', (0, 0), (-1, 0), FUENTES.negrita),    # Fuente en negrita para el encabezado
+    ('FONTNAME', (0, 1), (-1, -1), FUENTES.normal),    # Fuente normal para los datos
+]
+
+ESTILO_TOTALES = [
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, -1), FUENTES.negrita),   # Fuente en negrita para Neto, IVA y Bruto
+    ('SPAN', (0, 0), (-2, 0)),                         # Combinar celdas de Neto
+    ('SPAN', (0, 1), (-2, 1)),                         # Combinar celdas de IVA
+    ('SPAN', (0, 2), (-2, 2)),                         # Combinar celdas de Bruto
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),                # Alinear títulos Neto, IVA, Bruto a la izquierda
+    ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),             # Mantener los valores del Total a la derecha
+]
+
+ESTILO_TEXTO = ParagraphStyle("texto", fontName=FUENTES.normal, fontSize=12, leading=15)
+ESTILO_TITULO = ParagraphStyle("titulo", parent=ESTILO_TEXTO, fontName=FUENTES.negrita)
+ESTILO_VINETA = ParagraphStyle("vineta", parent=ESTILO_TEXTO, leftIndent=10)
+
+
+def _formatear_fila(textos):
+    detalle, largo, alto, total_mts, valor_m2, total = textos
+    return [detalle, largo, alto, total_mts, f"${formatear_dinero(valor_m2)}", f"${formatear_dinero(total)}"]
+
+
+class TablaDetalle(Flowable):
+    # Tabla de detalles paginada con encabezado repetido. Todas las filas
+    # tienen alto fijo, así cada página toma exactamente las filas que caben y
+    # solo esas se formatean y dibujan: el costo es lineal en el número de
+    # filas y nunca se arma una Table con el detalle completo.
+
+    def __init__(self, filas, inicio=0):
+        Flowable.__init__(self)
+        self.filas = filas
+        self.inicio = inicio
+
+    def _tabla(self, fin):
+        with METRICAS.etapa("pdf.tabla"):
+            datos = [ENCABEZADO_TABLA] + [_formatear_fila(textos) for textos in self.filas.como_textos(self.inicio, fin)]
+            tabla = Table(datos, colWidths=ANCHOS_COLUMNAS, rowHeights=[ALTO_FILA] * len(datos), hAlign="LEFT")
+            tabla.setStyle(TableStyle(ESTILO_TABLA))
+            return tabla
+
+    def wrap(self, availWidth, availHeight):
+        self.width = sum(ANCHOS_COLUMNAS)
+        self.height = (len(self.filas) - self.inicio + 1) * ALTO_FILA
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        cabe = int(availHeight // ALTO_FILA) - 1
+        if cabe < 1:
+            return []
+        fin = self.inicio + cabe
+        return [self._tabla(fin), TablaDetalle(self.filas, fin)]
+
+    def draw(self):
+        tabla = self._tabla(len(self.filas))
+        with METRICAS.etapa("pdf.tabla"):
+            tabla.wrapOn(self.canv, self.width, self.height)
+        tabla.drawOn(self.canv, 0, 0)
+
+
+class BloqueFirma(Flowable):
+    # Ocupa el resto del marco de la última página y dibuja la firma en su
+    # posición fija; si no queda espacio suficiente fuerza una página nueva.
+
+    def wrap(self, availWidth, availHeight):
+        return availWidth, max(availHeight, ALTO_FIRMA)
+
+    def split(self, availWidth, availHeight):
+        return []
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        canvas.doForm(FORM_FIRMA)
+
+
+def _tabla_totales(neto, iva, bruto):
+    tabla = Table([
+        ["Total Neto", "", "", "", "", f"${formatear_dinero(neto)}"],
+        ["IVA", "", "", "", "", f"${formatear_dinero(iva)}"],
+        ["Total Bruto", "", "", "", "", f"${formatear_dinero(bruto)}"]
+    ], colWidths=ANCHOS_COLUMNAS, rowHeights=[ALTO_FILA] * 3, hAlign="LEFT")
+    tabla.setStyle(TableStyle(ESTILO_TOTALES))
+    return tabla
+
+
+def flowables_cotizacion(cotizacion):
+    neto, iva, bruto = cotizacion.totales()
+
+    yield TablaDetalle(cotizacion.tabla_datos)
+    # Neto, IVA y Bruto siempre juntos en la última página de la tabla
+    yield KeepTogether([_tabla_totales(neto, iva, bruto)])
+
+    # Descripción de la carpa
+    yield Spacer(0, 10)
+    yield Paragraph("Descripción Carpa:", ESTILO_TITULO)
+    for descripcion in cotizacion.descripcion_datos:
+        yield Paragraph(f"• {escape(descripcion)}", ESTILO_VINETA)
+
+    # Fechas y lugar
+    fechas = Table([
+        ["Fecha Evento:", cotizacion.fecha_evento],
+        ["Fecha Montaje:", cotizacion.fecha_montaje],
+        ["Fecha Desarme:", cotizacion.fecha_desarme],
+        ["Lugar Evento:", cotizacion.lugar_evento],
+        ["Forma de Pago:", cotizacion.forma_pago],
+    ], colWidths=[100, None], rowHeights=[15] * 5, hAlign="LEFT")
+    fechas.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FUENTES.normal),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ]))
+    yield Spacer(0, 5)
+    yield KeepTogether([fechas])
+
+    yield Spacer(0, 5)
+    yield Paragraph("Esperando que este servicio sea de su interés, le saluda atentamente,", ESTILO_TEXTO)
+    yield BloqueFirma()
+
+
+class CambioCotizacion(ActionFlowable):
+    # En un documento combinado, la página que sigue pertenece a otra cotización
+    def __init__(self, cotizacion):
+        ActionFlowable.__init__(self, ("cambioCotizacion", cotizacion))
+
+
+def flowables_combinadas(cotizaciones):
+    # Varias cotizaciones en un solo documento, cada una desde una página
+    # nueva con el membrete completo
+    for numero, cotizacion in enumerate(cotizaciones):
+        if numero:
+            yield CambioCotizacion(cotizacion)
+            yield NextPageTemplate("primera")
+            yield PageBreak()
+        yield from flowables_cotizacion(cotizacion)
+
+
+class DocumentoCotizacion(BaseDocTemplate):
+    # Primera página con membrete completo; las siguientes con un encabezado
+    # reducido para que la tabla de detalles use casi toda la hoja.
+    # Con combinado=True el documento lleva varias cotizaciones (ver
+    # flowables_combinadas): cada una numera sus páginas desde 1 y tiene un
+    # marcador con su folio en el panel de marcadores del visor.
+
+    def __init__(self, destino, cotizacion, progreso=None, combinado=False, **kwargs):
+        titulo = "Cotizaciones" if combinado else f"Cotización {cotizacion.folio}"
+        kwargs.setdefault("pageCompression", 1)
+        BaseDocTemplate.__init__(self, destino, pagesize=letter, title=titulo, **kwargs)
+        self.cotizacion = cotizacion
+        self.progreso = progreso
+        self.combinado = combinado
+        self._siguiente = cotizacion if combinado else None
+        self._primera_pagina = 1
+        self._marcadores = 0
+        ancho = letter[0] - 2 * MARGEN_X
+        primera = Frame(MARGEN_X, MARGEN_INFERIOR, ancho, TOPE_PRIMERA_PAGINA - MARGEN_INFERIOR,
+                        leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, id="primera")
+        siguientes = Frame(MARGEN_X, MARGEN_INFERIOR, ancho, TOPE_PAGINAS_SIGUIENTES - MARGEN_INFERIOR,
+                           leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, id="siguientes")
+        self.addPageTemplates([
+            PageTemplate(id="primera", frames=[primera], onPage=self._pagina_primera, autoNextPageTemplate="siguientes"),
+            PageTemplate(id="siguientes", frames=[siguientes], onPage=self._pagina_siguiente),
+        ])
+
+    def build(self, flowables, **kwargs):
+        with sin_ascii85():
+            BaseDocTemplate.build(self, flowables, **kwargs)
+
+    def pdf(self):
+        # Bytes del documento construido con _doSave = 0
+        with sin_ascii85():
+            return self.canv.getpdfdata()
+
+    def beforeDocument(self):
+        compilar_plantilla(self.canv)
+
+    def handle_cambioCotizacion(self, cotizacion):
+        self._siguiente = cotizacion
+
+    def handle_pageBegin(self):
+        if self._siguiente is not None:
+            self.cotizacion, self._siguiente = self._siguiente, None
+            self._primera_pagina = self.page + 1
+            self._marcar(self.cotizacion)
+        BaseDocTemplate.handle_pageBegin(self)
+
+    def _marcar(self, cotizacion):
+        self._marcadores += 1
+        clave = f"cotizacion-{self._marcadores}"
+        titulo = f"Folio {formatear_folio(cotizacion.folio)}"
+        if cotizacion.empresa:
+            titulo += f" - {cotizacion.empresa}"
+        self.canv.bookmarkPage(clave)
+        self.canv.addOutlineEntry(titulo, clave, level=0)
+        if self._marcadores == 1:
+            self.canv.showOutline()
+
+    def afterFlowable(self, flowable):
+        # Si progreso lanza una excepción el documento se aborta (cancelación)
+        if self.progreso is not None:
+            self.progreso(self.page)
+
+    def _pagina_primera(self, c, doc):
+        cotizacion = self.cotizacion
+        c.doForm(FORM_MEMBRETE)
+
+        # Fecha y Folio
+        c.setFont(FUENTES.normal, 11)
+        c.drawString(460, 690, f"FECHA: {cotizacion.fecha}")
+        c.drawString(460, 675, f"FOLIO : N° {formatear_folio(cotizacion.folio)}")
+
+        # Información del cliente
+        c.setFont(FUENTES.normal, 12)
+        c.drawString(170, 615, cotizacion.atencion)
+        c.drawString(170, 600, cotizacion.empresa)
+        self._pie(c)
+
+    def _pagina_siguiente(self, c, doc):
+        c.setFont(FUENTES.normal, 14)
+        c.drawString(70, 750, "CARPAS GUAJARDO PROD. SPA")
+        c.setFont(FUENTES.normal, 11)
+        c.drawRightString(542, 750, f"COTIZACIÓN FOLIO N° {formatear_folio(self.cotizacion.folio)} (continuación)")
+        c.setLineWidth(0.3)
+        c.line(70, 742, 542, 742)
+        self._pie(c)
+
+    def _pie(self, c):
+        c.doForm(FORM_PIE)
+        c.setFont(FUENTES.normal, 10)
+        c.drawRightString(542, PIE_Y - 15, f"Página {c.getPageNumber() - self._primera_pagina + 1}")
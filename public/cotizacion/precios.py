@@ -0,0 +1,123 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+# Aritmética de dinero exacta para las cotizaciones.
+#
+# Reglas (las mismas columnas Decimal de CotizacionDetalle en prisma):
+# - largo y alto se guardan con 2 decimales (centímetros), redondeo half-up.
+# - total_mts = largo * alto redondeado a 2 decimales, half-up.
+# - valor_m2, total, neto, IVA y bruto son pesos enteros (CLP no tiene
+#   decimales); total = total_mts * valor_m2 e IVA = neto * tasa, ambos
+#   redondeados al peso más cercano, half-up.
+# - No se aceptan valores negativos.
+#
+# recalcular_lote aplica exactamente las mismas reglas con enteros de NumPy
+# (medidas en centímetros), así el resultado por lotes coincide peso a peso
+# con el de la app.
+
+TASA_IVA = Decimal("0.19")
+CENTESIMOS = Decimal("0.01")
+UNIDAD = Decimal("1")
+# "12.000", "1.234.567" o "1.500,5": puntos como separador de miles
+MILES = re.compile(r"\d{1,3}(\.\d{3})+(,\d+)?")
+
+
+def a_decimal(valor):
+    # Acepta "4.5" o "4,5" como decimal
+    if isinstance(valor, Decimal):
+        numero = valor
+    elif isinstance(valor, float):
+        numero = Decimal(repr(valor))
+    else:
+        texto = str(valor).strip().replace(",", ".") or "0"
+        try:
+            numero = Decimal(texto)
+        except InvalidOperation:
+            raise ValueError(f"Número inválido: {valor!r}") from None
+    if not numero.is_finite():
+        raise ValueError(f"Número inválido: {valor!r}")
+    if numero < 0:
+        raise ValueError(f"No se aceptan valores negativos: {valor!r}")
+    return numero
+
+
+def a_metros(valor):
+    return a_decimal(valor).quantize(CENTESIMOS, ROUND_HALF_UP)
+
+
+def a_pesos(valor):
+    # Montos en pesos: "$12.000", "12000" o "1500.5". Los puntos se toman
+    # como separador de miles solo si forman grupos de tres dígitos; si no,
+    # el texto es un decimal como cualquier otro y se redondea al peso.
+    if isinstance(valor, str):
+        valor = valor.strip().replace("$", "").strip()
+        if MILES.fullmatch(valor):
+            valor = valor.replace(".", "")
+    return int(a_decimal(valor).quantize(UNIDAD, ROUND_HALF_UP))
+
+
+def calcular_total_mts(largo, alto):
+    return (a_metros(largo) * a_metros(alto)).quantize(CENTESIMOS, ROUND_HALF_UP)
+
+
+def calcular_total(total_mts, valor_m2):
+    return int((a_metros(total_mts) * a_pesos(valor_m2)).quantize(UNIDAD, ROUND_HALF_UP))
+
+
+def calcular_linea(largo, alto, valor_m2):
+    total_mts = calcular_total_mts(largo, alto)
+    return total_mts, calcular_total(total_mts, valor_m2)
+
+
+def calcular_iva(neto, tasa_iva=TASA_IVA):
+    return int((Decimal(neto) * tasa_iva).quantize(UNIDAD, ROUND_HALF_UP))
+
+
+def _en_centesimos(valor):
+    # Decimal con 2 decimales -> entero exacto en centésimos
+    return int(a_metros(valor) * 100)
+
+
+def _tasa_en_puntos_base(tasa_iva):
+    puntos = tasa_iva * 10000
+    if puntos != puntos.to_integral_value():
+        raise ValueError(f"La tasa de IVA admite como máximo 4 decimales: {tasa_iva}")
+    return int(puntos)
+
+
+def importar_numpy():
+    # NumPy es opcional y tarda en importarse; solo lo usa el recálculo por
+    # lotes, así que se carga la primera vez que se necesita. None si falta.
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def recalcular_lote(largos_cm, altos_cm, valores_m2, indices, cantidad_cotizaciones, tasa_iva=TASA_IVA):
+    # Recalcula en una sola pasada vectorizada todas las líneas de un conjunto
+    # de cotizaciones. largos_cm/altos_cm son medidas en centímetros,
+    # valores_m2 pesos enteros e indices la cotización a la que pertenece
+    # cada línea. Devuelve los arreglos total_mts (en centésimos de m²),
+    # totales por línea y neto/IVA/bruto por cotización.
+    np = importar_numpy()
+    if np is None:
+        raise RuntimeError("El recálculo por lotes requiere NumPy (pip install numpy)")
+    largos_cm = np.asarray(largos_cm, dtype=np.int64)
+    altos_cm = np.asarray(altos_cm, dtype=np.int64)
+    valores_m2 = np.asarray(valores_m2, dtype=np.int64)
+    indices = np.asarray(indices, dtype=np.intp)
+    if (largos_cm < 0).any() or (altos_cm < 0).any() or (valores_m2 < 0).any():
+        raise ValueError("No se aceptan valores negativos")
+
+    # Redondeo half-up con enteros no negativos: (a + d // 2) // d
+    area_cm2 = largos_cm * altos_cm                      # diezmilésimos de m²
+    total_mts = (area_cm2 + 50) // 100                   # centésimos de m²
+    totales = (total_mts * valores_m2 + 50) // 100       # pesos
+
+    neto = np.zeros(cantidad_cotizaciones, dtype=np.int64)
+    np.add.at(neto, indices, totales)
+    iva = (neto * _tasa_en_puntos_base(tasa_iva) + 5000) // 10000
+    return {"total_mts": total_mts, "totales": totales, "neto": neto, "iva": iva, "bruto": neto + iva}
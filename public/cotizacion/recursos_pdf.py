@@ -0,0 +1,105 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+# Fuentes y logo de la plantilla, cargados una sola vez por proceso.
+# Sin configuración se usan las fuentes base de PDF (Times), que no se
+# incrustan. Con COTIZACIONES_FUENTE apuntando al .ttf de la empresa (y
+# opcionalmente COTIZACIONES_FUENTE_NEGRITA y COTIZACIONES_FUENTE_CURSIVA) la
+# plantilla usa esa tipografía: reportlab incrusta en cada PDF solo el
+# subconjunto de glifos usados, unos KB, no el archivo completo.
+# COTIZACIONES_LOGO es una imagen PNG o JPEG que se dibuja en el membrete; se
+# lee y decodifica una vez y el mismo ImageReader sirve a todos los documentos.
+#
+# reportlab se importa recién al cargar los recursos, así cache_pdf puede
+# usar firma_recursos sin cargarlo.
+
+FAMILIA = "Empresa"
+# Caja del logo en el membrete (puntos) y resolución máxima con que se incrusta
+ANCHO_LOGO = 100
+ALTO_LOGO = 60
+PPP_LOGO = 300
+
+
+@dataclass(frozen=True)
+class Fuentes:
+    normal: str = "Times-Roman"
+    negrita: str = "Times-Bold"
+    cursiva: str = "Times-Italic"
+
+
+def _rutas_fuentes():
+    normal = os.environ.get("COTIZACIONES_FUENTE")
+    if not normal:
+        return None
+    negrita = os.environ.get("COTIZACIONES_FUENTE_NEGRITA") or normal
+    cursiva = os.environ.get("COTIZACIONES_FUENTE_CURSIVA") or normal
+    return normal, negrita, cursiva
+
+
+@lru_cache(maxsize=None)
+def cargar_fuentes():
+    # Registra las fuentes TTF configuradas (una vez) y devuelve sus nombres
+    rutas = _rutas_fuentes()
+    if rutas is None:
+        return Fuentes()
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFError, TTFont
+
+    fuentes = Fuentes(FAMILIA, f"{FAMILIA}-Negrita", f"{FAMILIA}-Cursiva")
+    for nombre, ruta in zip((fuentes.normal, fuentes.negrita, fuentes.cursiva), rutas):
+        try:
+            pdfmetrics.registerFont(TTFont(nombre, ruta))
+        except (OSError, TTFError) as error:
+            raise RuntimeError(f"No se pudo cargar la fuente {ruta}: {error}") from None
+    # Para que <b> e <i> dentro de un Paragraph usen las variantes de la familia
+    pdfmetrics.registerFontFamily(
+        fuentes.normal, normal=fuentes.normal, bold=fuentes.negrita,
+        italic=fuentes.cursiva, boldItalic=fuentes.negrita,
+    )
+    return fuentes
+
+
+@lru_cache(maxsize=None)
+def cargar_logo():
+    # ImageReader del logo configurado, o None. Un logo más grande de lo que
+    # se ve impreso se reduce a PPP_LOGO: pesa menos en cada PDF y se
+    # comprime más rápido.
+    ruta = os.environ.get("COTIZACIONES_LOGO")
+    if not ruta:
+        return None
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+
+    maximo = (ANCHO_LOGO * PPP_LOGO // 72, ALTO_LOGO * PPP_LOGO // 72)
+    try:
+        with Image.open(ruta) as imagen:
+            if imagen.format == "JPEG" and imagen.width <= maximo[0] and imagen.height <= maximo[1]:
+                # Los JPEG se incrustan tal cual, sin decodificar
+                return ImageReader(ruta)
+            imagen = imagen.convert("RGBA" if "A" in imagen.getbands() or "transparency" in imagen.info else "RGB")
+            imagen.thumbnail(maximo, Image.LANCZOS)
+        logo = ImageReader(imagen)
+        # Decodifica ahora: ImageReader guarda los píxeles y cada documento
+        # los reutiliza
+        logo.getRGBData()
+    except OSError as error:
+        raise RuntimeError(f"No se pudo cargar el logo {ruta}: {error}") from None
+    return logo
+
+
+def firma_recursos():
+    # Archivos en uso con su tamaño y fecha: parte de la clave de cache_pdf,
+    # así un cambio de fuente o de logo no devuelve PDFs viejos
+    rutas = list(_rutas_fuentes() or ())
+    if os.environ.get("COTIZACIONES_LOGO"):
+        rutas.append(os.environ["COTIZACIONES_LOGO"])
+    firma = []
+    for ruta in rutas:
+        try:
+            estado = os.stat(ruta)
+            firma.append([os.path.abspath(ruta), estado.st_size, estado.st_mtime_ns])
+        except OSError:
+            firma.append([os.path.abspath(ruta), None, None])
+    return firma
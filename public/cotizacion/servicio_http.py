@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from io import BytesIO
+from urllib.parse import parse_qs
+
+from metricas import METRICAS
+from motor_cotizacion import Cotizacion, nombre_archivo, renderizar_combinado, renderizar_pdf
+from paquete_pdf import renderizar_zip
+
+
+# Servicio HTTP local que genera cotizaciones en PDF.
+#
+#   POST /cotizaciones   cuerpo JSON con los campos de Cotizacion.desde_dict
+#                        (folio, atencion, empresa, tabla_datos, ...) -> PDF
+#   POST /cotizaciones/lote?formato=zip|pdf
+#                        lista JSON de cotizaciones -> un .zip con un PDF por
+#                        cotización o un solo PDF combinado con marcadores
+#   GET  /salud          estado del pool en JSON
+#   GET  /metricas       tiempos por etapa en formato Prometheus (con --metricas)
+#
+# El event loop solo atiende conexiones; el renderizado corre en un pool
+# acotado de procesos (o hilos con --hilos). Como máximo se aceptan
+# workers + cola solicitudes a la vez: las que exceden ese límite reciben 429
+# con Retry-After en vez de esperar sin fin. La respuesta se envía por tramos
+# respetando el ritmo del cliente (drain).
+#
+# Uso: python servicio_http.py --puerto 8765 --workers 4 --cola 16
+
+TAMANO_MAXIMO_CUERPO = 5 * 1024 * 1024
+TAMANO_TRAMO = 64 * 1024
+TIEMPO_LECTURA = 30
+TIPOS_LOTE = {"zip": "application/zip", "pdf": "application/pdf"}
+
+
+def _renderizar(datos, configuracion_metricas=None):
+    # Corre en el pool: devuelve (nombre de archivo, bytes del PDF, métricas
+    # medidas en este proceso o None)
+    if configuracion_metricas is not None:
+        METRICAS.configurar(*configuracion_metricas)
+    cotizacion = Cotizacion.desde_dict(datos)
+    buffer = BytesIO()
+    renderizar_pdf(cotizacion, buffer)
+    medido = METRICAS.extraer() if configuracion_metricas is not None else None
+    return nombre_archivo(cotizacion), buffer.getvalue(), medido
+
+
+def _renderizar_lote(lista, formato, configuracion_metricas=None):
+    # Igual que _renderizar, para una lista: todo en memoria, sin temporales
+    if configuracion_metricas is not None:
+        METRICAS.configurar(*configuracion_metricas)
+    cotizaciones = [Cotizacion.desde_dict(datos) for datos in lista]
+    buffer = BytesIO()
+    if formato == "zip":
+        renderizar_zip(cotizaciones, buffer)
+    else:
+        renderizar_combinado(cotizaciones, buffer)
+    medido = METRICAS.extraer() if configuracion_metricas is not None else None
+    return f"cotizaciones.{formato}", buffer.getvalue(), medido
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje, cabeceras=None):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+        self.cabeceras = cabeceras or {}
+
+
+class ServicioCotizaciones:
+    def __init__(self, workers=None, cola=16, usar_hilos=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.capacidad = self.workers + cola
+        self.en_curso = 0
+        self.atendidas = 0
+        self.rechazadas = 0
+        self.usar_hilos = usar_hilos
+        pool = ThreadPoolExecutor if usar_hilos else ProcessPoolExecutor
+        self.pool = pool(max_workers=self.workers)
+
+    def cerrar(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def atender(self, reader, writer):
+        try:
+            try:
+                metodo, ruta, cabeceras, cuerpo = await asyncio.wait_for(self._leer_solicitud(reader), TIEMPO_LECTURA)
+                estado, tipo, contenido, extra = await self._despachar(metodo, ruta, cabeceras, cuerpo)
+            except ErrorHTTP as error:
+                estado, tipo, extra = error.estado, "application/json", error.cabeceras
+                contenido = json.dumps({"error": error.mensaje}, ensure_ascii=False).encode("utf-8")
+            except asyncio.TimeoutError:
+                return
+            await self._responder(writer, estado, tipo, contenido, extra)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _leer_solicitud(self, reader):
+        try:
+            encabezado = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise ErrorHTTP(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Encabezados demasiado grandes") from None
+        lineas = encabezado.decode("latin-1").split("\r\n")
+        try:
+            metodo, ruta, _ = lineas[0].split(" ", 2)
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Solicitud mal formada") from None
+        cabeceras = {}
+        for linea in lineas[1:]:
+            if ":" in linea:
+                nombre, valor = linea.split(":", 1)
+                cabeceras[nombre.strip().lower()] = valor.strip()
+        try:
+            largo = int(cabeceras.get("content-length", 0))
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Content-Length inválido") from None
+        if largo < 0:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if largo > TAMANO_MAXIMO_CUERPO:
+            raise ErrorHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")
+        cuerpo = await reader.readexactly(largo) if largo else b""
+        return metodo, ruta, cabeceras, cuerpo
+
+    async def _despachar(self, metodo, ruta, cabeceras, cuerpo):
+        ruta, _, consulta = ruta.partition("?")
+        if ruta == "/salud":
+            if metodo != "GET":
+                raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Usa GET", {"Allow": "GET"})
+            estado = {
+                "workers": self.workers, "capacidad": self.capacidad, "en_curso": self.en_curso,
+                "atendidas": self.atendidas, "rechazadas": self.rechazadas,
+            }
+            return HTTPStatus.OK, "application/json", json.dumps(estado).encode("utf-8"), {}
+        if ruta == "/metricas":
+            if not METRICAS.activa:
+                raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Métricas desactivadas (inicia el servicio con --metricas)")
+            return HTTPStatus.OK, "text/plain; version=0.0.4", METRICAS.a_prometheus().encode("utf-8"), {}
+        if ruta not in ("/cotizaciones", "/cotizaciones/lote"):
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Ruta no encontrada")
+        if metodo != "POST":
+            raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Usa POST", {"Allow": "POST"})
+
+        try:
+            datos = json.loads(cuerpo)
+        except (UnicodeDecodeError, json.JSONDecodeError) as error:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"JSON inválido: {error}") from None
+        if ruta == "/cotizaciones/lote":
+            formato = parse_qs(consulta).get("formato", ["zip"])[0]
+            if formato not in ("zip", "pdf"):
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "formato debe ser zip o pdf")
+            if not isinstance(datos, list) or not all(isinstance(d, dict) for d in datos):
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Se esperaba una lista de objetos JSON")
+            trabajo, argumentos, tipo = _renderizar_lote, (datos, formato), TIPOS_LOTE[formato]
+        elif not isinstance(datos, dict):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Se esperaba un objeto JSON")
+        else:
+            trabajo, argumentos, tipo = _renderizar, (datos,), "application/pdf"
+
+        # Contrapresión: si el pool y la cola están llenos se rechaza de inmediato
+        if self.en_curso >= self.capacidad:
+            self.rechazadas += 1
+            raise ErrorHTTP(HTTPStatus.TOO_MANY_REQUESTS, "Servicio saturado, reintenta en unos segundos", {"Retry-After": "2"})
+        self.en_curso += 1
+        inicio = time.perf_counter()
+        # Los procesos del pool miden en su propia copia de METRICAS y la
+        # devuelven; los hilos ya escriben en la del servicio, que no se debe
+        # vaciar con extraer mientras otras solicitudes están midiendo
+        metricas = METRICAS.configuracion() if METRICAS.activa and not self.usar_hilos else None
+        try:
+            nombre, contenido, medido = await asyncio.get_running_loop().run_in_executor(
+                self.pool, trabajo, *argumentos, metricas)
+        except ValueError as error:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, str(error)) from None
+        except Exception as error:
+            raise ErrorHTTP(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(error).__name__}: {error}") from None
+        finally:
+            self.en_curso -= 1
+        if medido is not None:
+            METRICAS.combinar(medido)
+        # Incluye la espera en la cola del pool, a diferencia de la etapa "pdf"
+        METRICAS.observar("servicio.solicitud", time.perf_counter() - inicio)
+        self.atendidas += 1
+        return HTTPStatus.OK, tipo, contenido, {"Content-Disposition": f'inline; filename="{nombre}"'}
+
+    async def _responder(self, writer, estado, tipo, contenido, extra):
+        cabeceras = {
+            "Content-Type": tipo,
+            "Content-Length": str(len(contenido)),
+            "Connection": "close",
+            **extra,
+        }
+        encabezado = f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+        encabezado += "".join(f"{nombre}: {valor}\r\n" for nombre, valor in cabeceras.items())
+        writer.write((encabezado + "\r\n").encode("latin-1"))
+        vista = memoryview(contenido)
+        for inicio in range(0, len(vista), TAMANO_TRAMO):
+            writer.write(vista[inicio:inicio + TAMANO_TRAMO])
+            await writer.drain()
+        await writer.drain()
+
+
+async def servir(host, puerto, workers, cola, usar_hilos):
+    servicio = ServicioCotizaciones(workers, cola, usar_hilos)
+    servidor = await asyncio.start_server(servicio.atender, host, puerto)
+    print(f"Servicio de cotizaciones en http://{host}:{puerto} ({servicio.workers} workers, capacidad {servicio.capacidad})")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servicio.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local para generar cotizaciones en PDF.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección de escucha")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto de escucha")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Renderizados en paralelo (por defecto, uno por núcleo)")
+    parser.add_argument("--cola", type=int, default=16, help="Solicitudes en espera antes de responder 429")
+    parser.add_argument("--hilos", action="store_true", help="Usar un pool de hilos en vez de procesos")
+    parser.add_argument("--metricas", action="store_true", help="Medir los tiempos por etapa y publicarlos en GET /metricas")
+    args = parser.parse_args(argv)
+    if args.metricas:
+        METRICAS.configurar()
+    try:
+        asyncio.run(servir(args.host, args.puerto, args.workers, args.cola, args.hilos))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
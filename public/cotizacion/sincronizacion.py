@@ -0,0 +1,337 @@
+import argparse
+import os
+import queue
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from almacen import AlmacenCotizaciones
+from motor_cotizacion import Cotizacion, leer_fecha, leer_registros
+
+
+# Sincronización de cotizaciones generadas localmente hacia las tablas
+# "Cotizacion", "CotizacionDetalle" y "CotizacionDescripcion" del sistema web
+# (prisma/schema.prisma).
+#
+# Las cotizaciones se envían por lotes con INSERT de varias filas dentro de
+# una transacción por lote. El folio es único en el esquema, así que volver a
+# sincronizar es idempotente: los folios que ya existen se omiten, o se
+# reemplazan con --actualizar. Un lote que falla por un error de conexión se
+# reintenta completo. Con --simular todo se ejecuta y al final se hace
+# ROLLBACK. Los registros del archivo que no se pueden convertir se omiten,
+# se listan al terminar y el código de salida es 1.
+#
+# Uso:
+#   python sincronizacion.py --dsn postgresql://usuario@host/base --usuario <id User> [--desde-almacen | archivo.jsonl]
+#   python sincronizacion.py --dsn sqlite:///prueba.db ...   (réplica SQLite del esquema, para pruebas)
+
+TAMANO_LOTE = 200
+FILAS_POR_INSERT = 500
+REINTENTOS = 3
+
+COLUMNAS_COTIZACION = [
+    "folio", "atencion", "empresa", "fechaEvento", "fechaMontaje", "fechaDesarme",
+    "lugarEvento", "formaPago", "neto", "iva", "bruto", "createdById", "updatedAt",
+]
+COLUMNAS_DETALLE = ["cotizacionId", "detalle", "largo", "alto", "totalMts", "valorM2", "total", "orden"]
+COLUMNAS_DESCRIPCION = ["cotizacionId", "descripcion", "orden"]
+
+# Réplica mínima del esquema de prisma para probar contra SQLite
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS "Cotizacion" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "folio" TEXT NOT NULL UNIQUE,
+    "atencion" TEXT NOT NULL,
+    "empresa" TEXT,
+    "clienteId" INTEGER,
+    "fechaEvento" TEXT,
+    "fechaMontaje" TEXT,
+    "fechaDesarme" TEXT,
+    "lugarEvento" TEXT,
+    "formaPago" TEXT,
+    "neto" TEXT NOT NULL,
+    "iva" TEXT NOT NULL,
+    "bruto" TEXT NOT NULL,
+    "estado" TEXT NOT NULL DEFAULT 'BORRADOR',
+    "pdfUrl" TEXT,
+    "notas" TEXT,
+    "createdAt" TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TEXT NOT NULL,
+    "createdById" TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "CotizacionDetalle" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "cotizacionId" INTEGER NOT NULL REFERENCES "Cotizacion" ("id") ON DELETE CASCADE,
+    "detalle" TEXT NOT NULL,
+    "largo" TEXT NOT NULL,
+    "alto" TEXT NOT NULL,
+    "totalMts" TEXT NOT NULL,
+    "valorM2" TEXT NOT NULL,
+    "total" TEXT NOT NULL,
+    "orden" INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "CotizacionDescripcion" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "cotizacionId" INTEGER NOT NULL REFERENCES "Cotizacion" ("id") ON DELETE CASCADE,
+    "descripcion" TEXT NOT NULL,
+    "orden" INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class Dialecto:
+    # Diferencias entre PostgreSQL y la réplica SQLite
+    def __init__(self, nombre, marcador, errores_reintentables, convertir=None):
+        self.nombre = nombre
+        self.marcador = marcador
+        self.errores_reintentables = errores_reintentables
+        self.convertir = convertir or (lambda valor: valor)
+
+
+def _convertir_sqlite(valor):
+    # sqlite3 no sabe guardar Decimal ni datetime
+    if valor is None or isinstance(valor, (int, str)):
+        return valor
+    return str(valor)
+
+
+class PoolConexiones:
+    # Pool simple de conexiones DB-API; una conexión que falla se descarta
+    def __init__(self, fabrica, maximo=4):
+        self.fabrica = fabrica
+        self.libres = queue.LifoQueue(maxsize=maximo)
+
+    def tomar(self):
+        try:
+            return self.libres.get_nowait()
+        except queue.Empty:
+            return self.fabrica()
+
+    def devolver(self, conexion, rota=False):
+        if rota:
+            _cerrar(conexion)
+            return
+        try:
+            self.libres.put_nowait(conexion)
+        except queue.Full:
+            _cerrar(conexion)
+
+    def cerrar(self):
+        while True:
+            try:
+                _cerrar(self.libres.get_nowait())
+            except queue.Empty:
+                return
+
+
+def _cerrar(conexion):
+    try:
+        conexion.close()
+    except Exception:
+        pass
+
+
+def conectar(dsn, maximo=4):
+    # Devuelve (pool, dialecto) según el DSN: postgresql://... o sqlite:///ruta
+    # (también acepta el "file:./db.sqlite" de prisma).
+    if dsn.startswith("sqlite:///") or dsn.startswith("file:"):
+        ruta = dsn[len("sqlite:///"):] if dsn.startswith("sqlite:///") else dsn[len("file:"):]
+
+        def fabrica():
+            conexion = sqlite3.connect(ruta)
+            conexion.execute("PRAGMA foreign_keys=ON")
+            conexion.executescript(ESQUEMA_SQLITE)
+            return conexion
+
+        return PoolConexiones(fabrica, maximo), Dialecto("sqlite", "?", (sqlite3.OperationalError,), _convertir_sqlite)
+
+    # prisma agrega parámetros propios (?schema=public) que libpq no entiende
+    partes = urlsplit(dsn)
+    parametros = [(clave, valor) for clave, valor in parse_qsl(partes.query) if clave != "schema"]
+    dsn = urlunsplit(partes._replace(query=urlencode(parametros)))
+    try:
+        import psycopg
+        return PoolConexiones(lambda: psycopg.connect(dsn), maximo), Dialecto(
+            "postgresql", "%s", (psycopg.OperationalError,))
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("Se necesita psycopg o psycopg2 para sincronizar con PostgreSQL") from None
+    return PoolConexiones(lambda: psycopg2.connect(dsn), maximo), Dialecto(
+        "postgresql", "%s", (psycopg2.OperationalError,))
+
+
+def _insert_multiple(cursor, dialecto, tabla, columnas, filas, sufijo=""):
+    # INSERT de varias filas por sentencia, en tramos de FILAS_POR_INSERT
+    resultado = []
+    columnas_sql = ", ".join(f'"{columna}"' for columna in columnas)
+    fila_sql = "(" + ", ".join([dialecto.marcador] * len(columnas)) + ")"
+    filas = iter(filas)
+    while True:
+        tramo = list(islice(filas, FILAS_POR_INSERT))
+        if not tramo:
+            return resultado
+        cursor.execute(
+            f'INSERT INTO "{tabla}" ({columnas_sql}) VALUES {", ".join([fila_sql] * len(tramo))} {sufijo}',
+            [dialecto.convertir(valor) for fila in tramo for valor in fila],
+        )
+        if sufijo:
+            resultado.extend(cursor.fetchall())
+
+
+def _fecha(texto):
+    fecha = leer_fecha(texto)
+    return datetime.combine(fecha, datetime.min.time()) if fecha else None
+
+
+def _fila_cotizacion(cotizacion, usuario, ahora):
+    neto, iva, bruto = cotizacion.totales()
+    return [
+        cotizacion.folio.strip(), cotizacion.atencion, cotizacion.empresa or None,
+        _fecha(cotizacion.fecha_evento), _fecha(cotizacion.fecha_montaje), _fecha(cotizacion.fecha_desarme),
+        cotizacion.lugar_evento or None, cotizacion.forma_pago or None,
+        neto, iva, bruto, usuario, ahora,
+    ]
+
+
+def _enviar_lote(cursor, dialecto, cotizaciones, usuario, actualizar):
+    # Devuelve la cantidad de cotizaciones insertadas o actualizadas
+    ahora = datetime.now()
+    por_folio = {cotizacion.folio.strip(): cotizacion for cotizacion in cotizaciones}
+    if actualizar:
+        asignaciones = ", ".join(f'"{c}" = excluded."{c}"' for c in COLUMNAS_COTIZACION if c != "folio")
+        sufijo = f'ON CONFLICT ("folio") DO UPDATE SET {asignaciones} RETURNING "id", "folio"'
+    else:
+        sufijo = 'ON CONFLICT ("folio") DO NOTHING RETURNING "id", "folio"'
+    ids = _insert_multiple(
+        cursor, dialecto, "Cotizacion", COLUMNAS_COTIZACION,
+        (_fila_cotizacion(cotizacion, usuario, ahora) for cotizacion in por_folio.values()), sufijo,
+    )
+    if not ids:
+        return 0
+
+    if actualizar:
+        marcadores = ", ".join([dialecto.marcador] * len(ids))
+        for tabla in ("CotizacionDetalle", "CotizacionDescripcion"):
+            cursor.execute(f'DELETE FROM "{tabla}" WHERE "cotizacionId" IN ({marcadores})', [i for i, _ in ids])
+
+    _insert_multiple(cursor, dialecto, "CotizacionDetalle", COLUMNAS_DETALLE, (
+        [cotizacion_id, linea.detalle, linea.largo, linea.alto, linea.total_mts, linea.valor_m2, linea.total, orden]
+        for cotizacion_id, folio in ids
+        for orden, linea in enumerate(por_folio[folio].tabla_datos)
+    ))
+    _insert_multiple(cursor, dialecto, "CotizacionDescripcion", COLUMNAS_DESCRIPCION, (
+        [cotizacion_id, descripcion, orden]
+        for cotizacion_id, folio in ids
+        for orden, descripcion in enumerate(por_folio[folio].descripcion_datos)
+    ))
+    return len(ids)
+
+
+def convertir_registros(registros, errores):
+    # Convierte los registros de a uno: uno inválido se anota en errores como
+    # (número de registro, folio, mensaje) y se omite, en vez de detener la
+    # sincronización de todos los demás
+    for numero, datos in enumerate(registros, start=1):
+        folio = ""
+        try:
+            if not isinstance(datos, dict):
+                raise ValueError(f"Se esperaba un objeto, no {type(datos).__name__}")
+            folio = str(datos.get("folio") or "").strip()
+            cotizacion = Cotizacion.desde_dict(datos)
+            if not folio:
+                raise ValueError("Falta el folio")
+        except Exception as error:
+            errores.append((numero, folio, f"{type(error).__name__}: {error}"))
+            continue
+        yield cotizacion
+
+
+def sincronizar(cotizaciones, pool, dialecto, usuario, tamano_lote=TAMANO_LOTE, actualizar=False,
+                simular=False, reintentos=REINTENTOS, progreso=None):
+    # Envía las cotizaciones por lotes; devuelve (enviadas, escritas). Con
+    # simular=True cada lote se revierte al final.
+    enviadas = escritas = 0
+    cotizaciones = iter(cotizaciones)
+    while True:
+        lote = list(islice(cotizaciones, tamano_lote))
+        if not lote:
+            return enviadas, escritas
+        for intento in range(reintentos + 1):
+            conexion = pool.tomar()
+            try:
+                cursor = conexion.cursor()
+                escritas_lote = _enviar_lote(cursor, dialecto, lote, usuario, actualizar)
+                if simular:
+                    conexion.rollback()
+                else:
+                    conexion.commit()
+            except dialecto.errores_reintentables:
+                pool.devolver(conexion, rota=True)
+                if intento == reintentos:
+                    raise
+                time.sleep(0.5 * 2 ** intento)
+                continue
+            except Exception:
+                conexion.rollback()
+                pool.devolver(conexion)
+                raise
+            pool.devolver(conexion)
+            break
+        enviadas += len(lote)
+        escritas += escritas_lote
+        if progreso:
+            progreso(enviadas, escritas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sincroniza cotizaciones locales con las tablas Cotizacion del sistema web.")
+    parser.add_argument("entrada", nargs="?", help="Archivo .csv o .jsonl con cotizaciones (si no se usa --desde-almacen)")
+    parser.add_argument("--desde-almacen", action="store_true", help="Enviar todas las cotizaciones del almacén local")
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="postgresql://... o sqlite:///ruta (por defecto DATABASE_URL)")
+    parser.add_argument("--usuario", required=True, help="id del User que figura como creador (createdById)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Cotizaciones por transacción")
+    parser.add_argument("--actualizar", action="store_true", help="Reemplazar las cotizaciones cuyo folio ya existe")
+    parser.add_argument("--simular", action="store_true", help="Ejecutar todo y revertir (no escribe nada)")
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error("Falta --dsn o la variable DATABASE_URL")
+    if args.desde_almacen == bool(args.entrada):
+        parser.error("Indica un archivo de entrada o --desde-almacen")
+
+    almacen = None
+    errores = []
+    if args.desde_almacen:
+        almacen = AlmacenCotizaciones()
+        cotizaciones = almacen.iterar()
+    else:
+        cotizaciones = convertir_registros(leer_registros(args.entrada), errores)
+
+    pool, dialecto = conectar(args.dsn)
+    inicio = time.perf_counter()
+    try:
+        enviadas, escritas = sincronizar(
+            cotizaciones, pool, dialecto, args.usuario, args.lote, args.actualizar, args.simular,
+            progreso=lambda enviadas, escritas: print(f"{enviadas} enviadas, {escritas} escritas"),
+        )
+    finally:
+        pool.cerrar()
+        if almacen is not None:
+            almacen.cerrar()
+    modo = " (simulación, sin cambios)" if args.simular else ""
+    print(f"{escritas} de {enviadas} cotizaciones escritas en {time.perf_counter() - inicio:.2f} s{modo}")
+    for numero, folio, mensaje in errores:
+        print(f"Registro {numero} (folio {folio or 'sin folio'}): {mensaje}", file=sys.stderr)
+    if errores:
+        print(f"{len(errores)} registros inválidos omitidos", file=sys.stderr)
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
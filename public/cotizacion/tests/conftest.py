@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Los módulos de la app se importan por nombre (from precios import ...),
+# igual que al ejecutarlos desde public/cotizacion
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
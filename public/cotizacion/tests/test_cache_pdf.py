@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+import cache_pdf
+from cache_pdf import CachePDF, clave_cotizacion
+from lote_cotizaciones import renderizar_lote
+from motor_cotizacion import Cotizacion
+
+
+def _datos(folio="101", **cambios):
+    datos = {
+        "folio": folio, "atencion": "Contacto", "empresa": "Eventos SpA", "fecha": "01 / 10 / 2026",
+        "fecha_evento": "15/12/2026", "lugar_evento": "Santiago", "forma_pago": "Transferencia",
+        "tabla_datos": [{"detalle": "Carpa", "largo": "2", "alto": "3", "valor_m2": 1000}],
+        "descripcion_datos": ["Montaje incluido"],
+    }
+    datos.update(cambios)
+    return datos
+
+
+def _cotizacion(folio="101", **cambios):
+    return Cotizacion.desde_dict(_datos(folio, **cambios))
+
+
+def _bytes_en_disco(directorio):
+    return sum(
+        os.path.getsize(os.path.join(carpeta, nombre))
+        for carpeta, _, nombres in os.walk(directorio) for nombre in nombres if nombre.endswith(".pdf")
+    )
+
+
+def test_cotizacion_sin_cambios_sale_de_la_cache(tmp_path):
+    cache = CachePDF(str(tmp_path))
+    datos, desde_cache = cache.renderizar(_cotizacion())
+    assert not desde_cache and datos.startswith(b"%PDF")
+    assert cache.renderizar(_cotizacion()) == (datos, True)
+    # También desde otra instancia sobre el mismo directorio
+    assert CachePDF(str(tmp_path)).renderizar(_cotizacion()) == (datos, True)
+
+
+@pytest.mark.parametrize("cambios", [
+    {"folio": "102"},
+    {"atencion": "Otra persona"},
+    {"empresa": "Otra Ltda"},
+    {"fecha": "02 / 10 / 2026"},
+    {"fecha_evento": "16/12/2026"},
+    {"descripcion_datos": ["Montaje no incluido"]},
+    {"tabla_datos": [{"detalle": "Carpa", "largo": "2", "alto": "3", "valor_m2": 1001}]},
+    {"tabla_datos": [{"detalle": "Toldo", "largo": "2", "alto": "3", "valor_m2": 1000}]},
+])
+def test_cualquier_campo_cambia_la_clave(tmp_path, cambios):
+    cache = CachePDF(str(tmp_path))
+    cache.renderizar(_cotizacion())
+    assert clave_cotizacion(_cotizacion(**cambios)) != clave_cotizacion(_cotizacion())
+    assert cache.renderizar(_cotizacion(**cambios))[1] is False
+
+
+def test_tasa_iva_y_version_de_plantilla_cambian_la_clave(monkeypatch):
+    clave = clave_cotizacion(_cotizacion())
+    otra_tasa = _cotizacion()
+    otra_tasa.tabla_datos.tasa_iva = otra_tasa.tabla_datos.tasa_iva + 1
+    assert clave_cotizacion(otra_tasa) != clave
+    monkeypatch.setattr(cache_pdf, "VERSION_PLANTILLA", cache_pdf.VERSION_PLANTILLA + 1)
+    assert clave_cotizacion(_cotizacion()) != clave
+
+
+def test_desaloja_la_menos_usada_al_pasar_el_maximo(tmp_path):
+    directorio = str(tmp_path / "cache")
+    medir = CachePDF(str(tmp_path / "medir"))
+    tamanos = [len(medir.renderizar(_cotizacion(folio))[0]) for folio in ("1", "2", "3")]
+    cache = CachePDF(directorio, tamano_maximo=sum(tamanos) - 1)
+    cache.renderizar(_cotizacion("1"))
+    cache.renderizar(_cotizacion("2"))
+    assert cache.renderizar(_cotizacion("1"))[1]        # 1 pasa a ser la más usada
+    cache.renderizar(_cotizacion("3"))
+    assert cache.desalojos == 1
+    assert _bytes_en_disco(directorio) == cache.tamano <= cache.tamano_maximo
+    assert cache.renderizar(_cotizacion("1"))[1]
+    assert cache.renderizar(_cotizacion("3"))[1]
+    assert not cache.renderizar(_cotizacion("2"))[1]
+
+
+def test_sin_maximo_no_indexa_ni_desaloja(tmp_path):
+    CachePDF(str(tmp_path)).renderizar(_cotizacion("1"))
+    cache = CachePDF(str(tmp_path), tamano_maximo=None)
+    assert cache.estadisticas()["entradas"] == 0
+    cache.renderizar(_cotizacion("2"))
+    assert cache.desalojos == 0
+
+
+def test_registrar_aplica_el_maximo_a_lo_escrito_por_otros(tmp_path):
+    # Como en renderizar_lote: el worker escribe sin límite y el proceso
+    # principal anota cada resultado en el único índice con máximo
+    directorio = str(tmp_path / "cache")
+    medir = CachePDF(str(tmp_path / "medir"))
+    tamanos = [len(medir.renderizar(_cotizacion(folio))[0]) for folio in ("1", "2", "3")]
+    principal = CachePDF(directorio, tamano_maximo=tamanos[1] + tamanos[2])
+    trabajador = CachePDF(directorio, tamano_maximo=None)
+    for folio in ("1", "2", "3"):
+        cotizacion = _cotizacion(folio)
+        principal.registrar(clave_cotizacion(cotizacion), len(trabajador.renderizar(cotizacion)[0]))
+    assert principal.desalojos == 1
+    assert _bytes_en_disco(directorio) == principal.tamano <= principal.tamano_maximo
+    assert not trabajador.renderizar(_cotizacion("1"))[1]
+    # Un índice nuevo sobre el directorio aplica el máximo al abrirse
+    assert CachePDF(directorio, tamano_maximo=tamanos[2]).tamano <= tamanos[2]
+
+
+def test_lote_con_workers_respeta_el_maximo(tmp_path):
+    directorio = str(tmp_path / "cache")
+    tamano = len(CachePDF(str(tmp_path / "medir")).renderizar(_cotizacion("1"))[0])
+    maximo = tamano * 8
+    registros = [_datos(str(folio)) for folio in range(1, 41)]
+    resultados = list(renderizar_lote(registros, str(tmp_path / "salida"), workers=2, tamano_bloque=4,
+                                      cache=(directorio, maximo)))
+    assert all(resultado.ok for resultado in resultados)
+    assert 0 < _bytes_en_disco(directorio) <= maximo
+    # Una segunda pasada reutiliza lo que quedó
+    resultados = list(renderizar_lote(registros[-4:], str(tmp_path / "salida"), workers=2, tamano_bloque=2,
+                                      cache=(directorio, maximo)))
+    assert all(resultado.desde_cache for resultado in resultados)
@@ -0,0 +1,106 @@
+import os
+
+from almacen import AlmacenCotizaciones
+from catalogo import Catalogo, normalizar
+from motor_cotizacion import Cotizacion
+
+
+def _escribir(ruta, filas, version):
+    with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+        archivo.write("tipo,nombre,valor_m2\n")
+        archivo.writelines(f"{tipo},{nombre},{valor}\n" for tipo, nombre, valor in filas)
+    # La fecha cambia aunque dos escrituras caigan en el mismo instante
+    os.utime(ruta, ns=(version * 10**9, version * 10**9))
+
+
+def _catalogo(tmp_path, filas, **opciones):
+    ruta = tmp_path / "catalogo.csv"
+    _escribir(ruta, filas, 1)
+    catalogo = Catalogo(str(ruta), **opciones)
+    assert catalogo.recargar_si_cambio()
+    return catalogo, ruta
+
+
+def test_normalizar_quita_tildes_y_mayusculas():
+    assert normalizar("  Carpa ÁRABE Ñandú ") == "carpa arabe nandu"
+
+
+def test_prefijos_sin_tildes_ni_mayusculas(tmp_path):
+    catalogo, _ = _catalogo(tmp_path, [
+        ("detalle", "Carpa Árabe", 4500), ("detalle", "Escenario", 9000), ("detalle", "Techo Blanco", 3000),
+    ])
+    assert catalogo.sugerir_detalles("ARA") == ["Carpa Árabe"]
+    assert catalogo.sugerir_detalles("carpa ara") == ["Carpa Árabe"]
+    assert catalogo.sugerir_detalles("  CARPA   árabe") == ["Carpa Árabe"]
+    assert catalogo.sugerir_detalles("blan") == ["Techo Blanco"]
+    assert catalogo.sugerir_detalles("xyz") == []
+    assert catalogo.valor_m2(" Carpa  Árabe ") == 4500
+
+
+def test_primero_los_que_empiezan_con_el_texto(tmp_path):
+    catalogo, _ = _catalogo(tmp_path, [
+        ("detalle", "Piso Flotante", 1), ("detalle", "Carpa Piso", 2), ("detalle", "Piso", 3),
+        ("detalle", "Alfombra Piso Rojo", 4), ("detalle", "Pista de Baile", 5),
+    ])
+    sugerencias = catalogo.sugerir_detalles("pis")
+    assert sugerencias[:3] == ["Piso", "Piso Flotante", "Pista de Baile"]
+    assert sorted(sugerencias[3:]) == ["Alfombra Piso Rojo", "Carpa Piso"]
+    assert len(catalogo.sugerir_detalles("p", limite=2)) == 2
+
+
+def test_predefinidas_solo_sin_descripciones_en_el_archivo(tmp_path):
+    catalogo, ruta = _catalogo(tmp_path, [("detalle", "Carpa", 1)], predefinidas=["Montaje incluido"])
+    assert catalogo.sugerir_descripciones("mon") == ["Montaje incluido"]
+    _escribir(ruta, [("detalle", "Carpa", 1), ("descripcion", "Traslado incluido", "")], 2)
+    assert catalogo.recargar_si_cambio()
+    assert catalogo.sugerir_descripciones("") == ["Traslado incluido"]
+
+
+def _guardar(almacen, folio, detalle, valor_m2):
+    almacen.guardar(Cotizacion.desde_dict({
+        "folio": folio, "atencion": "Ana",
+        "tabla_datos": [{"detalle": detalle, "largo": "1", "alto": "1", "valor_m2": valor_m2}],
+        "descripcion_datos": ["Montaje incluido"],
+    }))
+
+
+def test_del_almacen_gana_el_precio_mas_reciente_y_el_archivo_manda(tmp_path):
+    almacen = AlmacenCotizaciones(str(tmp_path / "almacen.db"))
+    try:
+        _guardar(almacen, "1", "Toldo", 1000)
+        _guardar(almacen, "2", "Toldo", 1200)
+        _guardar(almacen, "3", "Carpa", 500)
+        catalogo, _ = _catalogo(tmp_path, [("detalle", "Carpa", 4500)])
+        catalogo.agregar_desde_almacen(almacen)
+    finally:
+        almacen.cerrar()
+    assert catalogo.valor_m2("Toldo") == 1200
+    assert catalogo.valor_m2("Carpa") == 4500
+    assert catalogo.sugerir_descripciones("mon") == ["Montaje incluido"]
+    assert catalogo.sugerir_detalles("") == ["Carpa", "Toldo"]
+
+
+def test_recargar_aplica_altas_bajas_y_precios(tmp_path):
+    filas = [("detalle", f"Detalle {i:02d}", 1000 + i) for i in range(20)]
+    catalogo, ruta = _catalogo(tmp_path, filas)
+    assert not catalogo.recargar_si_cambio()             # sin cambios no se relee
+    indice = catalogo._indices["detalle"]
+    filas = filas[1:] + [("detalle", "Escenario Móvil", 7000)]
+    filas[0] = ("detalle", "Detalle 01", 5555)
+    _escribir(ruta, filas, 2)
+    assert catalogo.recargar_si_cambio()
+    assert catalogo._indices["detalle"] is indice
+    assert catalogo.sugerir_detalles("detalle 00") == []
+    assert catalogo.valor_m2("Detalle 01") == 5555
+    assert catalogo.sugerir_detalles("movil") == ["Escenario Móvil"]
+    assert len(catalogo.sugerir_detalles("detalle", limite=100)) == 19
+    # Un cambio casi total reconstruye el índice y da el mismo resultado
+    _escribir(ruta, [("detalle", "Otro", 1)], 3)
+    assert catalogo.recargar_si_cambio()
+    assert catalogo.sugerir_detalles("", limite=100) == ["Otro"]
+
+
+def test_recargar_sin_archivo_no_falla(tmp_path):
+    catalogo = Catalogo(str(tmp_path / "no_existe.csv"), predefinidas=["Montaje incluido"])
+    assert not catalogo.recargar_si_cambio()
+    assert catalogo.sugerir_descripciones("m") == ["Montaje incluido"]
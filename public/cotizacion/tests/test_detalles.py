@@ -0,0 +1,48 @@
+import pickle
+
+from detalles import LineaDetalle, TablaDetalles
+
+
+def _linea(nombre, valor_m2=1000):
+    return LineaDetalle.calcular(nombre, "2", "3", valor_m2)
+
+
+def test_nombres_sin_uso_se_sueltan_y_reutilizan():
+    tabla = TablaDetalles([_linea("Carpa"), _linea("Escenario"), _linea("Carpa")])
+    tabla.reemplazar(1, _linea("Toldo"))
+    assert "Escenario" not in tabla._indices_nombres
+    tabla.eliminar(0)
+    assert "Carpa" in tabla._indices_nombres      # todavía la usa la última línea
+    tabla.eliminar(1)
+    assert set(tabla._indices_nombres) == {"Toldo"}
+    tabla.agregar(_linea("Piso"))
+    tabla.agregar(_linea("Luces"))
+    assert len(tabla._nombres) == 3                # se reutilizaron los índices libres
+    assert [linea.detalle for linea in tabla] == ["Toldo", "Piso", "Luces"]
+    assert tabla.neto == 3 * 6000
+
+
+def test_reemplazar_con_el_mismo_nombre_no_lo_suelta():
+    tabla = TablaDetalles([_linea("Carpa")])
+    tabla.reemplazar(0, _linea("Carpa", 2000))
+    assert tabla[0].detalle == "Carpa"
+    assert tabla.totales()[0] == 12000
+
+
+def test_copia_y_pickle_conservan_las_lineas():
+    tabla = TablaDetalles([_linea("Carpa"), _linea("Escenario"), _linea("Carpa")])
+    tabla.eliminar(1)
+    for otra in (TablaDetalles(tabla), pickle.loads(pickle.dumps(tabla))):
+        assert otra == tabla
+        otra.agregar(_linea("Carpa"))
+        otra.reemplazar(0, _linea("Escenario"))
+        assert [linea.detalle for linea in otra] == ["Escenario", "Carpa", "Carpa"]
+    assert [linea.detalle for linea in tabla] == ["Carpa", "Carpa"]
+
+
+def test_tablas_iguales_con_nombres_en_otro_orden():
+    una = TablaDetalles([_linea("A"), _linea("B")])
+    una.eliminar(0)
+    una.agregar(_linea("A"))
+    otra = TablaDetalles([_linea("B"), _linea("A")])
+    assert una == otra
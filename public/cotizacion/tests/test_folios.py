@@ -0,0 +1,102 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from folios import AsignadorFolios, FolioDuplicado
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "folios.db")
+
+
+def _reservar(ruta, puesto, bloques, tamano):
+    with AsignadorFolios(ruta, tamano_bloque=tamano, puesto=puesto) as asignador:
+        return [list(asignador.reservar_bloque()) for _ in range(bloques)]
+
+
+def test_reservas_concurrentes_no_se_superponen(ruta):
+    AsignadorFolios(ruta).cerrar()  # crea el esquema antes de competir
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        trabajos = [pool.submit(_reservar, ruta, f"puesto{i}", 25, 7) for i in range(4)]
+        bloques = [bloque for trabajo in trabajos for bloque in trabajo.result()]
+    folios = [folio for bloque in bloques for folio in bloque]
+    assert len(folios) == 4 * 25 * 7
+    assert sorted(folios) == list(range(1, len(folios) + 1))
+    for bloque in bloques:
+        assert bloque == list(range(bloque[0], bloque[0] + 7))
+
+
+def test_siguiente_reparte_el_bloque_local(ruta):
+    with AsignadorFolios(ruta, tamano_bloque=3) as uno, AsignadorFolios(ruta, tamano_bloque=3) as otro:
+        assert [uno.siguiente(), otro.siguiente(), uno.siguiente(), otro.siguiente()] == [1, 4, 2, 5]
+        assert uno.proximo() == 7
+
+
+def test_devolver_sobrantes_retrocede_el_contador(ruta):
+    with AsignadorFolios(ruta, tamano_bloque=10) as asignador:
+        assert [asignador.siguiente() for _ in range(3)] == [1, 2, 3]
+        asignador.confirmar_lote([(1, "A"), (2, "A"), (3, "A")])
+        assert asignador.devolver_sobrantes()
+        assert asignador.proximo() == 4
+        assert asignador.huecos() == []
+        assert not asignador.devolver_sobrantes()
+
+
+def test_devolver_sobrantes_con_otra_reserva_posterior(ruta):
+    with AsignadorFolios(ruta, tamano_bloque=10, puesto="a") as a, AsignadorFolios(ruta, tamano_bloque=10, puesto="b") as b:
+        a.siguiente()
+        a.confirmar(1, "A")
+        b.siguiente()
+        # El bloque de b está después: el contador no retrocede, los sobrantes
+        # de a solo dejan de contar como reservados
+        assert not a.devolver_sobrantes()
+        assert a.proximo() == 21
+        assert a.huecos() == list(range(11, 21))
+
+
+def test_liberar_un_folio(ruta):
+    with AsignadorFolios(ruta) as asignador:
+        uno, dos = asignador.siguiente(), asignador.siguiente()
+        assert asignador.liberar(dos)
+        assert asignador.proximo() == dos
+        # Un folio intermedio no retrocede el contador y queda fuera de huecos
+        tres = asignador.siguiente()
+        asignador.confirmar(tres, "A")
+        assert not asignador.liberar(uno)
+        assert asignador.proximo() == tres + 1
+        assert asignador.huecos() == []
+
+
+def test_huecos_lista_los_reservados_sin_emitir(ruta):
+    with AsignadorFolios(ruta, tamano_bloque=5) as asignador:
+        asignador.reservar_bloque()
+        asignador.confirmar_lote([(1, "A"), (3, "B"), (5, "C")])
+        assert asignador.huecos() == [2, 4]
+        assert asignador.huecos(desde=3) == [4]
+
+
+def test_confirmar_misma_empresa_es_reemision(ruta):
+    with AsignadorFolios(ruta) as asignador:
+        folio = asignador.siguiente()
+        asignador.confirmar(folio, "Eventos SpA")
+        asignador.confirmar(folio, " eventos spa ")
+        asignador.verificar(folio, "EVENTOS SPA")
+
+
+def test_confirmar_otra_empresa_es_duplicado(ruta):
+    with AsignadorFolios(ruta) as asignador:
+        asignador.confirmar(1, "Eventos SpA")
+        with pytest.raises(FolioDuplicado):
+            asignador.verificar(1, "Otra Ltda")
+        # Un lote con un duplicado no confirma ninguno de sus folios
+        with pytest.raises(FolioDuplicado):
+            asignador.confirmar_lote([(2, "Otra Ltda"), (1, "Otra Ltda")])
+        asignador.verificar(2, "Cualquiera")
+        assert asignador.proximo() == 2
+
+
+def test_confirmar_folio_manual_adelanta_el_contador(ruta):
+    with AsignadorFolios(ruta) as asignador:
+        asignador.confirmar(500, "A")
+        assert asignador.siguiente() == 501
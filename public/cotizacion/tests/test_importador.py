@@ -0,0 +1,94 @@
+import csv
+
+import pytest
+
+import lote_cotizaciones
+from importador import ImportadorCotizaciones
+
+COLUMNAS = ["folio", "atencion", "empresa", "fecha_evento", "detalle", "largo", "alto", "valor_m2", "descripcion"]
+
+
+def _planilla(ruta, filas):
+    with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS)
+        escritor.writerows(filas)
+    return str(ruta)
+
+
+def _rechazos(ruta):
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        return [(fila["fila"], fila["folio"], fila["motivo"]) for fila in csv.DictReader(archivo)]
+
+
+def test_agrupa_filas_consecutivas_por_folio(tmp_path):
+    ruta = _planilla(tmp_path / "entrada.csv", [
+        ["101", "Ana", "Eventos SpA", "15/12/2026", "Carpa", "2", "3", "1000", "Montaje incluido"],
+        ["101", "", "", "", "Piso", "1,5", "2", "500", ""],
+        ["", "", "", "", "", "", "", "", ""],
+        ["102", "Luis", "Otra Ltda", "", "Toldo", "4", "4", "800", "Traslado"],
+    ])
+    importador = ImportadorCotizaciones(ruta)
+    cotizaciones = list(importador)
+    assert [c.folio for c in cotizaciones] == ["101", "102"]
+    primera = cotizaciones[0]
+    assert (primera.atencion, primera.empresa, primera.fecha_evento) == ("Ana", "Eventos SpA", "15/12/2026")
+    assert [linea.detalle for linea in primera.tabla_datos] == ["Carpa", "Piso"]
+    assert primera.totales()[0] == 6000 + 1500
+    assert primera.descripcion_datos == ["Montaje incluido"]
+    assert (importador.aceptadas, importador.rechazadas) == (2, 0)
+
+
+def test_una_fila_mala_rechaza_la_cotizacion_completa(tmp_path):
+    ruta = _planilla(tmp_path / "entrada.csv", [
+        ["101", "Ana", "", "", "Carpa", "2", "3", "1000", ""],
+        ["101", "", "", "", "Piso", "2", "", "500", ""],
+        ["101", "", "", "", "Luces", "dos", "1", "500", ""],
+        ["102", "Luis", "", "31/02/2026", "Toldo", "4", "4", "800", ""],
+        ["", "Sin folio", "", "", "Toldo", "4", "4", "800", ""],
+        ["103", "Eva", "", "", "Toldo", "4", "4", "800", ""],
+    ])
+    rechazos = tmp_path / "rechazos.csv"
+    importador = ImportadorCotizaciones(ruta, str(rechazos))
+    assert [c.folio for c in importador] == ["103"]
+    assert (importador.aceptadas, importador.rechazadas, importador.filas_rechazadas) == (1, 3, 5)
+    # Los números de fila son los de la planilla (la 1 es el encabezado)
+    assert _rechazos(rechazos) == [
+        ("2", "101", "Cotización rechazada por la fila 3"),
+        ("3", "101", "Falta alto en el detalle 'Piso'"),
+        ("4", "101", "Largo, alto, total mts, valor M2 y total deben ser números"),
+        ("5", "102", "fecha_evento no es una fecha válida: '31/02/2026'"),
+        ("6", "", "Falta el folio"),
+    ]
+
+
+def test_sin_rechazos_no_se_crea_el_archivo(tmp_path):
+    ruta = _planilla(tmp_path / "entrada.csv", [["101", "Ana", "", "", "Carpa", "2", "3", "1000", ""]])
+    rechazos = tmp_path / "rechazos.csv"
+    assert len(list(ImportadorCotizaciones(ruta, str(rechazos)))) == 1
+    assert not rechazos.exists()
+
+
+def test_sin_exigir_folio_acepta_cotizaciones_sin_folio(tmp_path):
+    ruta = _planilla(tmp_path / "entrada.csv", [["", "Ana", "", "", "Carpa", "2", "3", "1000", ""]])
+    assert [c.folio for c in ImportadorCotizaciones(ruta, exigir_folio=False)] == [""]
+    assert list(ImportadorCotizaciones(ruta)) == []
+
+
+@pytest.mark.parametrize("rechazos", [False, True])
+def test_lote_valida_los_csv_con_y_sin_rechazos(tmp_path, capsys, rechazos):
+    # Un alto vacío rechaza la cotización también sin --rechazos, en vez de
+    # tomarse como 0
+    ruta = _planilla(tmp_path / "entrada.csv", [
+        ["101", "Ana", "", "", "Carpa", "2", "", "1000", ""],
+        ["102", "Luis", "", "", "Toldo", "4", "4", "800", ""],
+    ])
+    argumentos = [ruta, "-o", str(tmp_path / "salida"), "-w", "1", "-q"]
+    if rechazos:
+        argumentos += ["--rechazos", str(tmp_path / "rechazos.csv")]
+    assert lote_cotizaciones.main(argumentos) == 1
+    generados = [archivo.name for archivo in (tmp_path / "salida").iterdir()]
+    assert len(generados) == 1 and "102" in generados[0]
+    assert "1 cotizaciones rechazadas por validación" in capsys.readouterr().out
+    if rechazos:
+        assert _rechazos(tmp_path / "rechazos.csv")[0][2] == "Falta alto en el detalle 'Carpa'"
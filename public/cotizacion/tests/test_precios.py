@@ -0,0 +1,115 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from detalles import LineaDetalle, TablaDetalles, recalcular_tablas
+from precios import a_metros, a_pesos, calcular_iva, calcular_linea, calcular_total, calcular_total_mts, recalcular_lote
+
+
+# Redondeo half-up en el límite del medio centímetro y del medio peso
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("2.345", Decimal("2.35")),
+    ("2.3449", Decimal("2.34")),
+    ("0.005", Decimal("0.01")),
+    ("0.0049", Decimal("0.00")),
+    ("2,345", Decimal("2.35")),
+    (2.345, Decimal("2.35")),
+])
+def test_a_metros_redondea_medio_centimetro_hacia_arriba(valor, esperado):
+    assert a_metros(valor) == esperado
+
+
+def test_total_mts_redondea_medio_centimetro_hacia_arriba():
+    assert calcular_total_mts("1.5", "1.01") == Decimal("1.52")   # 1.515
+    assert calcular_total_mts("1.5", "1.03") == Decimal("1.55")   # 1.545
+    assert calcular_total_mts("0.1", "0.05") == Decimal("0.01")   # 0.005
+    assert calcular_total_mts("0.1", "0.04") == Decimal("0.00")   # 0.004
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("12.5", 13),
+    ("12.4999", 12),
+    ("0.5", 1),
+    (Decimal("0.5"), 1),
+    (2.5, 3),
+    ("1.500,5", 1501),
+])
+def test_a_pesos_redondea_medio_peso_hacia_arriba(valor, esperado):
+    assert a_pesos(valor) == esperado
+
+
+def test_total_e_iva_redondean_medio_peso_hacia_arriba():
+    assert calcular_total("1.5", 3) == 5        # 4.5
+    assert calcular_total("0.5", 1) == 1        # 0.5
+    assert calcular_total("0.49", 1) == 0
+    assert calcular_iva(50) == 10               # 9.5
+    assert calcular_iva(2) == 0                 # 0.38
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("$12.000", 12000),
+    ("1.234.567", 1234567),
+    ("12.000", 12000),
+    ("75000.0", 75000),
+    ("12.5", 13),
+    ("12000", 12000),
+    (" $ 4500 ", 4500),
+    ("", 0),
+])
+def test_a_pesos_separador_de_miles(valor, esperado):
+    assert a_pesos(valor) == esperado
+
+
+@pytest.mark.parametrize("valor", ["abc", "12.00.0", "-5", "NaN"])
+def test_a_pesos_rechaza_valores_invalidos(valor):
+    with pytest.raises(ValueError):
+        a_pesos(valor)
+
+
+def test_calcular_linea_igual_con_texto_o_numero():
+    assert calcular_linea("10", "5", "12.5") == calcular_linea("10", "5", 12.5) == (Decimal("50.00"), 650)
+
+
+# El recálculo vectorizado coincide peso a peso con el cálculo de la app
+
+def _lineas_de_prueba():
+    azar = random.Random(7)
+    lineas = [(azar.randint(0, 3000), azar.randint(0, 3000), azar.randint(0, 90000)) for _ in range(2000)]
+    # Casos justo en el medio: total_mts x.xx5 y total x.5
+    lineas += [(150, 101, 3), (150, 103, 1), (10, 5, 1), (50, 100, 1), (150, 100, 3)]
+    return lineas
+
+
+def test_recalcular_lote_coincide_con_calcular_linea():
+    pytest.importorskip("numpy")
+    lineas = _lineas_de_prueba()
+    indices = [i % 7 for i in range(len(lineas))]
+    resultado = recalcular_lote(
+        [largo for largo, _, _ in lineas], [alto for _, alto, _ in lineas],
+        [valor for _, _, valor in lineas], indices, 7,
+    )
+    netos = [0] * 7
+    for i, (largo, alto, valor) in enumerate(lineas):
+        total_mts, total = calcular_linea(Decimal(largo).scaleb(-2), Decimal(alto).scaleb(-2), valor)
+        assert int(resultado["total_mts"][i]) == int(total_mts.scaleb(2))
+        assert int(resultado["totales"][i]) == total
+        netos[indices[i]] += total
+    assert resultado["neto"].tolist() == netos
+    assert resultado["iva"].tolist() == [calcular_iva(neto) for neto in netos]
+
+
+def test_recalcular_tablas_coincide_con_las_tablas():
+    pytest.importorskip("numpy")
+    lineas = _lineas_de_prueba()
+    tablas = [
+        TablaDetalles(
+            LineaDetalle.calcular(f"Detalle {j % 3}", Decimal(largo).scaleb(-2), Decimal(alto).scaleb(-2), valor)
+            for j, (largo, alto, valor) in enumerate(lineas[i::10])
+        )
+        for i in range(10)
+    ]
+    esperadas = [(list(tabla), tabla.totales()) for tabla in tablas]
+    recalcular_tablas(tablas)
+    assert [(list(tabla), tabla.totales()) for tabla in tablas] == esperadas
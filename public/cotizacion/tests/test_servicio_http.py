@@ -0,0 +1,137 @@
+import asyncio
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+import zipfile
+
+import pytest
+
+import servicio_http
+from servicio_http import TAMANO_MAXIMO_CUERPO, ServicioCotizaciones
+
+
+def _datos(folio="101"):
+    return {
+        "folio": folio, "atencion": "Contacto", "empresa": "Eventos SpA",
+        "tabla_datos": [{"detalle": "Carpa", "largo": "2", "alto": "3", "valor_m2": 1000}],
+    }
+
+
+@pytest.fixture
+def servidor():
+    # Servicio real en un puerto libre, con el event loop en otro hilo. Un
+    # worker de hilos y sin cola: capacidad 1, para probar la saturación.
+    servicio = ServicioCotizaciones(workers=1, cola=0, usar_hilos=True)
+    loop = asyncio.new_event_loop()
+    servidor = loop.run_until_complete(asyncio.start_server(servicio.atender, "127.0.0.1", 0))
+    hilo = threading.Thread(target=loop.run_forever, daemon=True)
+    hilo.start()
+    yield servicio, servidor.sockets[0].getsockname()[1]
+    loop.call_soon_threadsafe(loop.stop)
+    hilo.join()
+    servidor.close()
+    loop.run_until_complete(servidor.wait_closed())
+    loop.close()
+    servicio.cerrar()
+
+
+def _post(puerto, ruta, cuerpo):
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+    try:
+        conexion.request("POST", ruta, body=cuerpo, headers={"Content-Type": "application/json"})
+        respuesta = conexion.getresponse()
+        return respuesta.status, dict(respuesta.getheaders()), respuesta.read()
+    finally:
+        conexion.close()
+
+
+def _crudo(puerto, solicitud):
+    # Para cabeceras que http.client no deja enviar
+    with socket.create_connection(("127.0.0.1", puerto), timeout=30) as conexion:
+        conexion.sendall(solicitud)
+        respuesta = conexion.makefile("rb").read()
+    linea, _, resto = respuesta.partition(b"\r\n")
+    return int(linea.split()[1]), resto.partition(b"\r\n\r\n")[2]
+
+
+def test_cotizacion_devuelve_pdf(servidor):
+    _, puerto = servidor
+    estado, cabeceras, cuerpo = _post(puerto, "/cotizaciones", json.dumps(_datos()))
+    assert estado == 200
+    assert cabeceras["Content-Type"] == "application/pdf"
+    assert "101" in cabeceras["Content-Disposition"]
+    assert cuerpo.startswith(b"%PDF") and int(cabeceras["Content-Length"]) == len(cuerpo)
+
+
+def test_lote_devuelve_zip_o_pdf_combinado(servidor):
+    _, puerto = servidor
+    lista = json.dumps([_datos("101"), _datos("102")])
+    estado, cabeceras, cuerpo = _post(puerto, "/cotizaciones/lote?formato=zip", lista)
+    assert estado == 200 and cabeceras["Content-Type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(cuerpo)) as paquete:
+        nombres = paquete.namelist()
+        assert len(nombres) == 2
+        assert all(paquete.read(nombre).startswith(b"%PDF") for nombre in nombres)
+    estado, cabeceras, cuerpo = _post(puerto, "/cotizaciones/lote?formato=pdf", lista)
+    assert estado == 200 and cabeceras["Content-Type"] == "application/pdf"
+    assert cuerpo.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("ruta, cuerpo", [
+    ("/cotizaciones", "{no es json"),
+    ("/cotizaciones", "[1, 2]"),
+    ("/cotizaciones", json.dumps(_datos(""))),
+    ("/cotizaciones/lote", json.dumps(_datos())),
+    ("/cotizaciones/lote?formato=rar", json.dumps([_datos()])),
+])
+def test_solicitudes_invalidas_responden_400(servidor, ruta, cuerpo):
+    _, puerto = servidor
+    estado, cabeceras, respuesta = _post(puerto, ruta, cuerpo)
+    assert estado == 400
+    assert cabeceras["Content-Type"] == "application/json"
+    assert json.loads(respuesta)["error"]
+
+
+@pytest.mark.parametrize("largo", ["-5", "abc"])
+def test_content_length_invalido_responde_400(servidor, largo):
+    _, puerto = servidor
+    estado, cuerpo = _crudo(puerto, f"POST /cotizaciones HTTP/1.1\r\nContent-Length: {largo}\r\n\r\n".encode())
+    assert estado == 400
+    assert json.loads(cuerpo)["error"] == "Content-Length inválido"
+
+
+def test_cuerpo_demasiado_grande_responde_413(servidor):
+    _, puerto = servidor
+    solicitud = f"POST /cotizaciones HTTP/1.1\r\nContent-Length: {TAMANO_MAXIMO_CUERPO + 1}\r\n\r\n"
+    estado, _ = _crudo(puerto, solicitud.encode())
+    assert estado == 413
+
+
+def test_saturado_responde_429(servidor, monkeypatch):
+    servicio, puerto = servidor
+    liberar = threading.Event()
+    original = servicio_http._renderizar
+
+    def renderizar_lento(datos, configuracion_metricas=None):
+        liberar.wait(30)
+        return original(datos, configuracion_metricas)
+
+    monkeypatch.setattr(servicio_http, "_renderizar", renderizar_lento)
+    primera = {}
+    hilo = threading.Thread(target=lambda: primera.update(resultado=_post(puerto, "/cotizaciones", json.dumps(_datos()))))
+    hilo.start()
+    try:
+        limite = time.monotonic() + 10
+        while servicio.en_curso < servicio.capacidad and time.monotonic() < limite:
+            time.sleep(0.01)
+        estado, cabeceras, _ = _post(puerto, "/cotizaciones", json.dumps(_datos("102")))
+        assert estado == 429
+        assert cabeceras["Retry-After"] == "2"
+        assert servicio.rechazadas == 1
+    finally:
+        liberar.set()
+        hilo.join()
+    assert primera["resultado"][0] == 200
@@ -0,0 +1,125 @@
+import json
+import sqlite3
+
+import pytest
+
+import sincronizacion
+from motor_cotizacion import Cotizacion
+from sincronizacion import conectar, convertir_registros, sincronizar
+
+
+def _datos(folio, atencion="Contacto", valor_m2=1000, detalles=("Carpa",)):
+    return {
+        "folio": str(folio), "atencion": atencion, "empresa": "Eventos SpA", "fecha_evento": "15/12/2026",
+        "tabla_datos": [{"detalle": d, "largo": "2", "alto": "3", "valor_m2": valor_m2} for d in detalles],
+        "descripcion_datos": ["Montaje incluido"],
+    }
+
+
+@pytest.fixture
+def base(tmp_path):
+    ruta = tmp_path / "web.db"
+    pool, dialecto = conectar(f"sqlite:///{ruta}")
+    yield ruta, pool, dialecto
+    pool.cerrar()
+
+
+def _filas(ruta, sql):
+    with sqlite3.connect(ruta) as conexion:
+        return conexion.execute(sql).fetchall()
+
+
+def test_envia_por_lotes(base):
+    ruta, pool, dialecto = base
+    avances = []
+    cotizaciones = [Cotizacion.desde_dict(_datos(i)) for i in range(1, 6)]
+    resultado = sincronizar(cotizaciones, pool, dialecto, "u1", tamano_lote=2,
+                            progreso=lambda enviadas, escritas: avances.append((enviadas, escritas)))
+    assert resultado == (5, 5)
+    assert avances == [(2, 2), (4, 4), (5, 5)]
+    assert _filas(ruta, 'SELECT folio, neto, iva, bruto, "createdById" FROM "Cotizacion" ORDER BY id')[0] == (
+        "1", "6000", "1140", "7140", "u1")
+    assert _filas(ruta, 'SELECT count(*) FROM "CotizacionDetalle"') == [(5,)]
+    assert _filas(ruta, 'SELECT count(*) FROM "CotizacionDescripcion"') == [(5,)]
+
+
+def test_folios_existentes_se_omiten(base):
+    ruta, pool, dialecto = base
+    sincronizar([Cotizacion.desde_dict(_datos(1))], pool, dialecto, "u1")
+    cambiada = Cotizacion.desde_dict(_datos(1, atencion="Otra persona"))
+    assert sincronizar([cambiada, Cotizacion.desde_dict(_datos(2))], pool, dialecto, "u1") == (2, 1)
+    assert _filas(ruta, 'SELECT folio, atencion FROM "Cotizacion" ORDER BY folio') == [("1", "Contacto"), ("2", "Contacto")]
+    assert _filas(ruta, 'SELECT count(*) FROM "CotizacionDetalle"') == [(2,)]
+
+
+def test_actualizar_reemplaza_cabecera_y_detalles(base):
+    ruta, pool, dialecto = base
+    sincronizar([Cotizacion.desde_dict(_datos(1))], pool, dialecto, "u1")
+    cambiada = Cotizacion.desde_dict(_datos(1, atencion="Otra persona", valor_m2=2000, detalles=("Carpa", "Piso")))
+    assert sincronizar([cambiada], pool, dialecto, "u1", actualizar=True) == (1, 1)
+    assert _filas(ruta, 'SELECT atencion, neto FROM "Cotizacion"') == [("Otra persona", "24000")]
+    assert _filas(ruta, 'SELECT detalle, total, orden FROM "CotizacionDetalle" ORDER BY orden') == [
+        ("Carpa", "12000", 0), ("Piso", "12000", 1)]
+    assert _filas(ruta, 'SELECT count(*) FROM "CotizacionDescripcion"') == [(1,)]
+
+
+def test_simular_no_deja_cambios(base):
+    ruta, pool, dialecto = base
+    assert sincronizar([Cotizacion.desde_dict(_datos(1))], pool, dialecto, "u1", simular=True) == (1, 1)
+    assert _filas(ruta, 'SELECT count(*) FROM "Cotizacion"') == [(0,)]
+
+
+class _ConexionCaida:
+    def __init__(self):
+        self.cerrada = False
+
+    def cursor(self):
+        raise sqlite3.OperationalError("database is locked")
+
+    def close(self):
+        self.cerrada = True
+
+
+def test_reintenta_el_lote_con_una_conexion_nueva(base, monkeypatch):
+    ruta, pool, dialecto = base
+    monkeypatch.setattr(sincronizacion.time, "sleep", lambda segundos: None)
+    caida = _ConexionCaida()
+    pool.devolver(caida)
+    assert sincronizar([Cotizacion.desde_dict(_datos(1))], pool, dialecto, "u1") == (1, 1)
+    assert caida.cerrada
+    assert _filas(ruta, 'SELECT count(*) FROM "Cotizacion"') == [(1,)]
+
+
+def test_sin_reintentos_se_propaga_el_error(base, monkeypatch):
+    _, pool, dialecto = base
+    monkeypatch.setattr(sincronizacion.time, "sleep", lambda segundos: None)
+    fabrica = pool.fabrica
+    pool.fabrica = _ConexionCaida
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            sincronizar([Cotizacion.desde_dict(_datos(1))], pool, dialecto, "u1", reintentos=2)
+    finally:
+        pool.fabrica = fabrica
+
+
+def test_convertir_registros_anota_los_invalidos():
+    errores = []
+    registros = [_datos(1), 5, [1, 2], {"_error": "Línea 4: JSON inválido"}, {"atencion": "sin folio"},
+                 {"folio": "6", "tabla_datos": [["a", "b", "c"]]}, _datos(7)]
+    cotizaciones = list(convertir_registros(registros, errores))
+    assert [c.folio for c in cotizaciones] == ["1", "7"]
+    assert [(numero, folio) for numero, folio, _ in errores] == [(2, ""), (3, ""), (4, ""), (5, ""), (6, "6")]
+    assert "Falta el folio" in errores[3][2]
+
+
+def test_main_informa_los_registros_invalidos(tmp_path, capsys):
+    entrada = tmp_path / "cotizaciones.jsonl"
+    entrada.write_text("\n".join([json.dumps(_datos(1)), "5", "no es json", json.dumps(_datos(2))]) + "\n",
+                       encoding="utf-8")
+    ruta = tmp_path / "web.db"
+    codigo = sincronizacion.main([str(entrada), "--dsn", f"sqlite:///{ruta}", "--usuario", "u1"])
+    salida = capsys.readouterr()
+    assert codigo == 1
+    assert _filas(ruta, 'SELECT folio FROM "Cotizacion" ORDER BY folio') == [("1",), ("2",)]
+    assert "Registro 2" in salida.err and "Registro 3" in salida.err
+    assert "2 registros inválidos omitidos" in salida.err